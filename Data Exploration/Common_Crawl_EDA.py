@@ -1,69 +1,49 @@
-import pandas as pd
-from urllib.parse import urlparse
-from collections import Counter
-from langdetect import detect, DetectorFactory
+import os
+import sys
+import argparse
+from langdetect import DetectorFactory
 
-DetectorFactory.seed = 0  # For consistent language detection
+# Shared profiling helpers live with the modelling code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data Modelling"))
+from profiling import profiler, add_profile_argument, start_from_args
+
+from ch_ingest import expand_paths
+from crawl_eda_engine import scan, CHUNK_ROWS, WORKERS
 
 # Path to your CSV
 csv_file = "/Users/mm25873/Documents/Practice Project 1/Common Crawl Data/df2024.csv" 
 
-# Load the CSV
-df = pd.read_csv(csv_file)
-
-print("\nColumns in this dataset:")
-print(df.columns.tolist())
-
-# Drop rows without URL or content
-df = df.dropna(subset=['url', 'content'])
-
-# Basic counts
-total_pages = len(df)
-total_words = df['content'].apply(lambda x: len(str(x).split())).sum()
-total_chars = df['content'].apply(lambda x: len(str(x))).sum()
-average_words = total_words / total_pages if total_pages else 0
-average_chars = total_chars / total_pages if total_pages else 0
 
-# Domain analysis
-df['domain'] = df['url'].apply(lambda x: urlparse(str(x)).netloc)
-top_domains = df['domain'].value_counts().head(10).to_dict()
+def main():
+    parser = argparse.ArgumentParser(description="Summary statistics for the Common Crawl extract.")
+    parser.add_argument("csv", nargs="*", default=[csv_file], help="CSV files or globs, e.g. 'Common Crawl Data/df2024-*.csv'")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows per chunk, bounds memory")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes aggregating chunks, 1 = single process")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_from_args(args, "Common_Crawl_EDA")
 
-# Duplicate analysis
-duplicate_pages = df.duplicated(subset=['url']).sum()  # duplicates based on URL
+    DetectorFactory.seed = 0  # For consistent language detection
 
-# Unique websites
-unique_websites = df['parent_url'].nunique()
+    # One streaming pass over every file: word/char counts, domains, duplicates, info/short pages and
+    # pages per parent_url are all aggregated chunk by chunk, so the extract never has to fit in RAM.
+    profiler.checkpoint("scan")
+    paths = expand_paths(args.csv)
+    print(f"Scanning {len(paths)} file(s) in chunks of {args.chunk_rows:,} rows with {args.workers} worker(s)...")
+    aggregate = scan(paths, args.chunk_rows, args.workers,
+                     progress=lambda total: print(f"  {total.rows_read:,} rows scanned", end="\r"))
 
-# Pages flagged as info pages
-info_pages_count = df['is_info_page'].sum()
+    # Summary output
+    profiler.checkpoint("summary")
+    summary = aggregate.summary()
 
-# Pages with very short content (<50 words)
-short_pages_count = df['content'].apply(lambda x: len(str(x).split()) < 50).sum()
+    print("\nCommon Crawl CSV Summary:")
+    for k, v in summary.items():
+        print(f"{k}: {v}")
 
-# Distribution of pages per website (parent_url)
-pages_per_website = df.groupby('parent_url').size()
-website_distribution_summary = {
-    'max_pages_per_site': pages_per_website.max(),
-    'min_pages_per_site': pages_per_website.min(),
-    'median_pages_per_site': pages_per_website.median(),
-    'mean_pages_per_site': pages_per_website.mean()
-}
+    profiler.stop()
 
-# Summary output
-summary = {
-    'total_pages': total_pages,
-    'total_words': total_words,
-    'total_characters': total_chars,
-    'average_words_per_page': average_words,
-    'average_chars_per_page': average_chars,
-    'top_domains': top_domains,
-    'duplicate_pages': duplicate_pages,
-    'unique_websites': unique_websites,
-    'info_pages_count': info_pages_count,
-    'short_pages_count': short_pages_count,
-    'website_distribution_summary': website_distribution_summary
-}
 
-print("Common Crawl CSV Summary:")
-for k, v in summary.items():
-    print(f"{k}: {v}")
+# The guard matters: worker processes re-import this file on platforms that spawn them (macOS, Windows)
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,90 @@
+import os
+import sys
+import argparse
 import pandas as pd
 
-# # Load your CSV file
+# Shared profiling helpers live with the modelling code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data Modelling"))
+from profiling import profiler, add_profile_argument, start_from_args
+from ch_ingest import zip_members, iter_member_chunks, read_companies, WORKERS
+
+# # Load your CSV file (or the zip download itself, it is read without extracting)
 file_path = "/Users/mm25873/Documents/Practice Project 1/Companies House data/BasicCompanyDataAsOneFile-2025-10-01.csv"
 
-# Read only first few rows to inspect structure (fast)
-preview = pd.read_csv(file_path, nrows=5)
-print("\n Preview of CSV structure:")
-print(preview)
 
-# Read the full file
-print("\n Loading full dataset (this may take a minute)...")
-df = pd.read_csv(file_path)
+def main():
+    parser = argparse.ArgumentParser(description="Summary statistics and active/trading filter for the Companies House snapshot.")
+    parser.add_argument("ch", nargs="*", default=[file_path],
+                        help="CH CSV or zip download(s), one-file or parts, globs allowed (zips are streamed, not extracted)")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes parsing zip parts in parallel")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_from_args(args, "Companies_House_EDA")
+
+    members = zip_members(args.ch)
+    if not members:
+        print("Error: no CSV files or zip members found.", file=sys.stderr)
+        sys.exit(1)
+
+    # Read only first few rows to inspect structure (fast)
+    preview = next(iter_member_chunks(members[0], chunk_rows=5))
+    print("\n Preview of CSV structure:")
+    print(preview)
+
+    # Read the full file
+    profiler.checkpoint("load_csv")
+    print(f"\n Loading full dataset from {len(members)} file(s) (this may take a minute)...")
+    df = read_companies(args.ch, workers=args.workers)
+
+    # Basic summary
+    print("\n Dataset loaded successfully!")
+    print(f"Rows: {df.shape[0]:,}")
+    print(f"Columns: {df.shape[1]}")
+
+    # Column info
+    print("\n Column names and types:")
+    print(df.dtypes)
+
+    # Peek at the first few rows
+    print("\n First 5 rows:")
+    print(df.head(200))
 
-# Basic summary
-print("\n Dataset loaded successfully!")
-print(f"Rows: {df.shape[0]:,}")
-print(f"Columns: {df.shape[1]}")
+    # Missing data summary
+    profiler.checkpoint("inspect")
+    print("\n Missing values per column:")
+    print(df.isnull().sum())
 
-# Column info
-print("\n Column names and types:")
-print(df.dtypes)
+    with pd.option_context('display.max_rows', None, 'display.max_colwidth', None):
+        print(df.head(10))  # prints 10 rows fully, no truncation
 
-# Peek at the first few rows
-print("\n First 5 rows:")
-print(df.head(200))
 
-# Missing data summary
-print("\n Missing values per column:")
-print(df.isnull().sum())
+    # --- Convert dates ---
+    profiler.checkpoint("convert_dates")
+    df['Accounts.LastMadeUpDate'] = pd.to_datetime(df['Accounts.LastMadeUpDate'], errors='coerce')
+    df['IncorporationDate'] = pd.to_datetime(df['IncorporationDate'], errors='coerce')
 
-with pd.option_context('display.max_rows', None, 'display.max_colwidth', None):
-    print(df.head(10))  # prints 10 rows fully, no truncation
+    # --- Filter: active companies ---
+    profiler.checkpoint("filter")
+    df_active = df[df['CompanyStatus'] == "Active"].copy()
 
+    # --- Filter: accounts filed within last 12 months (proxy for actively trading) ---
+    one_year_ago = pd.Timestamp.today() - pd.DateOffset(years=1)
+    df_trading = df_active[df_active['Accounts.LastMadeUpDate'] >= one_year_ago].copy()
 
-# --- Convert dates ---
-df['Accounts.LastMadeUpDate'] = pd.to_datetime(df['Accounts.LastMadeUpDate'], errors='coerce')
-df['IncorporationDate'] = pd.to_datetime(df['IncorporationDate'], errors='coerce')
+    two_years_ago = pd.Timestamp.today() - pd.DateOffset(years=2)
+    df_trading_two = df_active[df_active['Accounts.LastMadeUpDate'] >= two_years_ago].copy()
 
-# --- Filter: active companies ---
-df_active = df[df['CompanyStatus'] == "Active"].copy()
+    print(f"Active companies: {len(df_active):,}")
+    print(f"Estimated actively trading: {len(df_trading):,}")
+    print(f"Estimated actively trading2: {len(df_trading_two):,}")
 
-# --- Filter: accounts filed within last 12 months (proxy for actively trading) ---
-one_year_ago = pd.Timestamp.today() - pd.DateOffset(years=1)
-df_trading = df_active[df_active['Accounts.LastMadeUpDate'] >= one_year_ago].copy()
+    # Save for modelling
+    profiler.checkpoint("save_parquet")
+    df_trading.to_parquet("companies_house_active_trading.parquet", index=False)
 
-two_years_ago = pd.Timestamp.today() - pd.DateOffset(years=2)
-df_trading_two = df_active[df_active['Accounts.LastMadeUpDate'] >= two_years_ago].copy()
+    profiler.stop()
 
-print(f"Active companies: {len(df_active):,}")
-print(f"Estimated actively trading: {len(df_trading):,}")
-print(f"Estimated actively trading2: {len(df_trading_two):,}")
 
-# Save for modelling
-df_trading.to_parquet("companies_house_active_trading.parquet", index=False)
+# The guard matters: worker processes re-import this file on platforms that spawn them (macOS, Windows)
+if __name__ == "__main__":
+    main()
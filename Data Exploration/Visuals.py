@@ -1,27 +1,42 @@
+import sys
+import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 import seaborn as sns
 from pathlib import Path
 
+from aggregate_cube import AggregateCube, build, latest_cube, CUBE_DIR, WORD_BIN_WIDTH
+
 # ==========================
-# Load datasets from CSV
+# Load the aggregate cube
 # ==========================
+# The charts are drawn from a precomputed aggregate cube (aggregate_cube.py), so re-rendering never
+# reloads the CSVs. Pass --build to (re)build the cube for a new snapshot first.
 
 ch_path = "/Users/mm25873/Documents/Practice Project 1/Companies House data/BasicCompanyDataAsOneFile-2025-10-01.csv"
-crawl_path = "/Users/mm25873/Documents/Practice Project 1/Common Crawl Data/df2024.csv"       
+crawl_path = "/Users/mm25873/Documents/Practice Project 1/Common Crawl Data/df2024.csv"
+
+parser = argparse.ArgumentParser(description="Dataset charts, rendered from the aggregate cube.")
+parser.add_argument("--cube", help=f"cube JSON to render, defaults to the newest in {CUBE_DIR}/")
+parser.add_argument("--build", action="store_true", help="build the cube from the CSVs below first")
+parser.add_argument("--ch", default=ch_path)
+parser.add_argument("--crawl", nargs="*", default=[crawl_path])
+parser.add_argument("--output-dir", default="/Users/mm25873/Documents/Practice Project 1/dataset_visuals")
+args = parser.parse_args()
 
-print("Loading Companies House data...")
-df_ch = pd.read_csv(ch_path)
+cube_path = build(args.ch, args.crawl) if args.build else (args.cube or latest_cube())
+if not cube_path:
+    print(f"Error: no aggregate cube in {CUBE_DIR}/, run with --build (or aggregate_cube.py) first.", file=sys.stderr)
+    sys.exit(1)
 
-print("Loading Common Crawl data...")
-df_crawl = pd.read_csv(crawl_path)
+print(f"Loading aggregate cube {cube_path}...")
+cube = AggregateCube.load(cube_path)
 
-output_dir = Path("/Users/mm25873/Documents/Practice Project 1/dataset_visuals")
+output_dir = Path(args.output_dir)
 output_dir.mkdir(exist_ok=True)
 
-print("\nDatasets loaded.")
-print("\nCompanies House columns:", df_ch.columns.tolist())
-print("\nCommon Crawl columns:", df_crawl.columns.tolist())
+print(f"\nCube for snapshot {cube.meta['snapshot']} built {cube.meta.get('built')}, rows: {cube.meta['rows']}")
+print("Dimensions:", sorted(cube.counts))
 
 
 # ==========================
@@ -34,75 +49,67 @@ def savefig(name):
     plt.close()
 
 
+def numeric_series(dimension):
+    """A cube dimension with numeric keys, sorted by key."""
+    counts = cube.series(dimension)
+    counts.index = pd.to_numeric(counts.index)
+    return counts.sort_index()
+
+
 # ==========================
 # Companies House Visuals
 # ==========================
 
 print("\nGenerating Companies House visuals...")
 
-# Convert dates
-date_cols = [
-    "IncorporationDate",
-    "Accounts.LastMadeUpDate",
-    "Returns.LastMadeUpDate"
-]
-
-for col in date_cols:
-    if col in df_ch.columns:
-        df_ch[col] = pd.to_datetime(df_ch[col], errors="coerce")
-
 # --- 1. Company age distribution ---
-if "IncorporationDate" in df_ch.columns:
-    df_ch["company_age_years"] = (
-        (pd.Timestamp.today() - df_ch["IncorporationDate"]).dt.days / 365
-    )
+incorporation_months = cube.series("ch.incorporation_month")
+if not incorporation_months.empty:
+    month_starts = pd.to_datetime(incorporation_months.index, format="%Y-%m")
+    company_age_years = (pd.Timestamp.today() - month_starts).days / 365
 
     plt.figure(figsize=(8, 5))
-    sns.histplot(df_ch["company_age_years"].dropna(), bins=50)
+    sns.histplot(x=company_age_years, weights=incorporation_months.values, bins=50)
     plt.title("Company Age Distribution (Years)")
     plt.xlabel("Years")
     plt.ylabel("Count")
     savefig("ch_company_age_distribution")
 
 # --- 2. Top SIC codes ---
-sic_col = "SICCode.SicText_1"
-if sic_col in df_ch.columns:
-    df_ch["primary_sic"] = df_ch[sic_col].astype(str).str.extract(r'(^\d{4})')
-
+sic_codes = cube.series("ch.sic_code")
+if not sic_codes.empty:
     plt.figure(figsize=(10, 6))
-    df_ch["primary_sic"].value_counts().head(20).plot(kind="bar")
+    sic_codes.head(20).plot(kind="bar")
     plt.title("Top 20 SIC Codes")
     plt.xlabel("SIC Code")
     plt.ylabel("Number of Companies")
     savefig("ch_top_sic_codes")
 
 # --- 3. Incorporation year ---
-if "IncorporationDate" in df_ch.columns:
-    df_ch["inc_year"] = df_ch["IncorporationDate"].dt.year
-
+incorporation_years = numeric_series("ch.incorporation_year")
+if not incorporation_years.empty:
     plt.figure(figsize=(10, 5))
-    df_ch["inc_year"].value_counts().sort_index().plot()
+    incorporation_years.plot()
     plt.title("Incorporation Year Distribution")
     plt.xlabel("Year")
     plt.ylabel("Count")
     savefig("ch_incorporation_years")
 
 # --- 4. Last accounts year ---
-if "Accounts.LastMadeUpDate" in df_ch.columns:
-    df_ch["last_accounts_year"] = df_ch["Accounts.LastMadeUpDate"].dt.year
-
+last_accounts_years = numeric_series("ch.last_accounts_year")
+if not last_accounts_years.empty:
     plt.figure(figsize=(10, 5))
-    df_ch["last_accounts_year"].value_counts().sort_index().plot(kind="bar")
+    last_accounts_years.plot(kind="bar")
     plt.title("Last Accounts Filed by Year")
     plt.xlabel("Year")
     plt.ylabel("Count")
     savefig("ch_last_accounts_year")
 
 # --- 5. Postcode hotspots ---
-postcode_col = "RegAddress.PostCode"
-if postcode_col in df_ch.columns:
+postcode_areas = cube.series("ch.postcode_area")
+if not postcode_areas.empty:
     plt.figure(figsize=(8, 5))
-    df_ch[postcode_col].astype(str).str[:3].value_counts().head(20).plot(kind="bar")
+    postcode_areas.head(20).plot(kind="bar")
     plt.title("Top 20 Postcode Areas (First 3 Chars)")
     plt.xlabel("Postcode Area")
     plt.ylabel("Number of Companies")
@@ -116,46 +123,44 @@ if postcode_col in df_ch.columns:
 print("\nGenerating Common Crawl visuals...")
 
 # --- 1. Word counts ---
-if "content" in df_crawl.columns:
-    df_crawl["word_count"] = df_crawl["content"].fillna("").apply(lambda x: len(str(x).split()))
-
+word_count_bins = numeric_series("crawl.word_count_bin")
+if not word_count_bins.empty:
     plt.figure(figsize=(8, 5))
-    sns.histplot(df_crawl["word_count"], bins=50)
+    sns.histplot(x=word_count_bins.index + WORD_BIN_WIDTH / 2, weights=word_count_bins.values, bins=50)
     plt.title("Crawl Dataset: Word Count Distribution")
     plt.xlabel("Words per page")
     plt.ylabel("Frequency")
     savefig("crawl_word_count_distribution")
 
 # --- 2. Short page counts ---
-if "word_count" in df_crawl.columns:
-    df_crawl["short_page"] = df_crawl["word_count"] < 50
-
+short_pages = cube.series("crawl.short_page")
+if not short_pages.empty:
     plt.figure(figsize=(6, 4))
-    df_crawl["short_page"].value_counts().plot(kind="bar")
+    short_pages.reindex(["False", "True"], fill_value=0).plot(kind="bar")
     plt.title("Short Pages (<50 words)")
     plt.xticks([0, 1], ["Long", "Short"])
     plt.ylabel("Count")
     savefig("crawl_short_pages")
 
 # --- 3. Domain extensions ---
-if "url" in df_crawl.columns:
-    df_crawl["domain_ext"] = df_crawl["url"].astype(str).str.extract(r"\.([a-z]{2,5})/?$")
-
+domain_exts = cube.series("crawl.tld")
+if not domain_exts.empty:
     plt.figure(figsize=(8, 5))
-    df_crawl["domain_ext"].value_counts().head(15).plot(kind="bar")
+    domain_exts.head(15).plot(kind="bar")
     plt.title("Crawl Dataset: Top Domain Extensions")
     plt.xlabel("Domain")
     plt.ylabel("Count")
     savefig("crawl_domain_extensions")
 
 # --- 4. Parent website distribution ---
-if "parent_url" in df_crawl.columns:
+parent_urls = cube.series("crawl.parent_url")
+if not parent_urls.empty:
     plt.figure(figsize=(10, 6))
-    df_crawl["parent_url"].value_counts().head(20).plot(kind="bar")
+    parent_urls.head(20).plot(kind="bar")
     plt.title("Top 20 Parent URLs")
     plt.xlabel("Website")
     plt.ylabel("Page Count")
     savefig("crawl_top_parent_urls")
 
 
-print("\nAll visuals generated and saved to: dataset_visuals/")
+print(f"\nAll visuals generated and saved to: {output_dir}/")
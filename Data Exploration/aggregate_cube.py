@@ -0,0 +1,183 @@
+import os
+import re
+import sys
+import glob
+import json
+import time
+import argparse
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Path expansion is shared with the Companies House loader in the modelling code
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data Modelling"))
+from ch_ingest import expand_paths
+
+# --- Configuration ---
+CUBE_DIR = "aggregate_cubes"        # one <snapshot>.json per data snapshot
+CHUNK_ROWS = 200_000
+WORD_BIN_WIDTH = 25                 # word count histogram bin width (words)
+SHORT_PAGE_WORDS = 50
+TOP_PARENT_URLS = 1000              # parent_url counts kept (the chart shows the top 20)
+CH_COLUMNS = ["IncorporationDate", "Accounts.LastMadeUpDate", "SICCode.SicText_1", "RegAddress.PostCode"]
+CRAWL_COLUMNS = ["url", "content", "parent_url"]
+# ---------------------
+
+
+class AggregateCube:
+    """
+    Counts by every dimension the dataset charts use, built in one chunked pass per dataset and saved
+    as a small JSON file per data snapshot. Visuals.py renders from it instead of the multi-GB CSVs.
+
+    Dimensions:
+        ch.sic_code, ch.postcode_area, ch.incorporation_month, ch.incorporation_year, ch.last_accounts_year
+        crawl.tld, crawl.word_count_bin (left edge, WORD_BIN_WIDTH wide), crawl.short_page, crawl.parent_url
+
+    Example:
+        cube = AggregateCube("2025-10-01")
+        cube.add_companies_house("BasicCompanyDataAsOneFile-2025-10-01.csv")
+        cube.add_crawl(["df2024.csv"])
+        cube.save()                       # aggregate_cubes/2025-10-01.json
+        cube = AggregateCube.load("aggregate_cubes/2025-10-01.json")
+        cube.series("ch.sic_code").head(20)
+    """
+
+    def __init__(self, snapshot: str):
+        self.snapshot = snapshot
+        self.counts: Dict[str, Counter] = {}
+        self.meta: Dict[str, Any] = {"snapshot": snapshot, "sources": [], "rows": {}}
+        self._parent_counts = pd.Series(dtype='int64')  # parent_url hash -> pages
+        self._parent_names: Dict[np.uint64, str] = {}    # hash -> parent_url, for the current top ones only
+
+    def _add(self, dimension: str, values: pd.Series) -> None:
+        counts = values.value_counts(dropna=True)
+        self.counts.setdefault(dimension, Counter()).update(
+            {str(key): int(n) for key, n in counts.items()})
+
+    def _add_parent_urls(self, parents: pd.Series) -> None:
+        # Counted by 64-bit hash like crawl_eda_engine, so the running counts don't hold every URL string;
+        # only the TOP_PARENT_URLS leaders keep theirs. Counts only grow, so a URL can only join the leaders
+        # in a chunk it appears in, and its string is at hand then.
+        parents = parents.dropna().astype(str)
+        if parents.empty:
+            return
+        hashes = pd.util.hash_pandas_object(parents, index=False).to_numpy()
+        self._parent_counts = self._parent_counts.add(pd.Series(hashes).value_counts(), fill_value=0).astype('int64')
+        chunk_names = dict(zip(hashes, parents))
+        top = self._parent_counts.nlargest(TOP_PARENT_URLS, keep='first')
+        self._parent_names = {h: self._parent_names.get(h) or chunk_names[h] for h in top.index
+                              if h in self._parent_names or h in chunk_names}
+        self.counts["crawl.parent_url"] = Counter({self._parent_names[h]: int(n) for h, n in top.items()
+                                                   if h in self._parent_names})
+
+    def add_companies_house(self, path: str, chunk_rows: int = CHUNK_ROWS) -> None:
+        # CH headers come with stray leading spaces (' CompanyNumber'), match on the stripped names
+        reader = pd.read_csv(path, chunksize=chunk_rows, dtype=str,
+                             usecols=lambda column: column.strip() in CH_COLUMNS)
+        rows = 0
+        for chunk in reader:
+            chunk.columns = chunk.columns.str.strip()
+            rows += len(chunk)
+            if "SICCode.SicText_1" in chunk:
+                self._add("ch.sic_code", chunk["SICCode.SicText_1"].astype(str).str.extract(r'(^\d{4})', expand=False))
+            if "RegAddress.PostCode" in chunk:
+                self._add("ch.postcode_area", chunk["RegAddress.PostCode"].astype(str).str[:3])
+            if "IncorporationDate" in chunk:
+                incorporated = pd.to_datetime(chunk["IncorporationDate"], errors="coerce", dayfirst=True)
+                self._add("ch.incorporation_month", incorporated.dt.strftime("%Y-%m"))
+                self._add("ch.incorporation_year", incorporated.dt.year.dropna().astype(int))
+            if "Accounts.LastMadeUpDate" in chunk:
+                accounts = pd.to_datetime(chunk["Accounts.LastMadeUpDate"], errors="coerce", dayfirst=True)
+                self._add("ch.last_accounts_year", accounts.dt.year.dropna().astype(int))
+        self.meta["sources"].append(os.path.abspath(path))
+        self.meta["rows"]["ch"] = self.meta["rows"].get("ch", 0) + rows
+
+    def add_crawl(self, paths: List[str], chunk_rows: int = CHUNK_ROWS) -> None:
+        rows = 0
+        for path in expand_paths(paths):
+            for chunk in pd.read_csv(path, chunksize=chunk_rows, usecols=lambda column: column in CRAWL_COLUMNS):
+                rows += len(chunk)
+                if "content" in chunk:
+                    words = chunk["content"].fillna("").astype(str).str.count(r'\S+')
+                    self._add("crawl.word_count_bin", (words // WORD_BIN_WIDTH) * WORD_BIN_WIDTH)
+                    self._add("crawl.short_page", words < SHORT_PAGE_WORDS)
+                if "url" in chunk:
+                    self._add("crawl.tld", chunk["url"].astype(str).str.extract(r"\.([a-z]{2,5})/?$", expand=False))
+                if "parent_url" in chunk:
+                    self._add_parent_urls(chunk["parent_url"])
+            self.meta["sources"].append(os.path.abspath(path))
+        self.meta["rows"]["crawl"] = self.meta["rows"].get("crawl", 0) + rows
+
+    def series(self, dimension: str) -> pd.Series:
+        """Counts for one dimension, largest first (empty if the dimension wasn't built)."""
+        counts = self.counts.get(dimension, Counter())
+        return pd.Series(dict(counts), dtype="int64").sort_values(ascending=False, kind="stable")
+
+    def save(self, cube_dir: str = CUBE_DIR) -> str:
+        os.makedirs(cube_dir, exist_ok=True)
+        path = os.path.join(cube_dir, f"{self.snapshot}.json")
+        self.meta["built"] = time.strftime('%Y-%m-%d %H:%M:%S')
+        tmp_path = path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"meta": self.meta, "counts": {dim: dict(c) for dim, c in self.counts.items()}}, f)
+        os.replace(tmp_path, path)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> "AggregateCube":
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        cube = cls(data["meta"]["snapshot"])
+        cube.meta = data["meta"]
+        cube.counts = {dim: Counter(counts) for dim, counts in data["counts"].items()}
+        return cube
+
+
+def snapshot_name(ch_path: Optional[str]) -> Optional[str]:
+    """The CH snapshot date from its file name (BasicCompanyDataAsOneFile-2025-10-01.csv), None if it has none."""
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(ch_path or ""))
+    return match.group(1) if match else None
+
+
+def latest_cube(cube_dir: str = CUBE_DIR) -> Optional[str]:
+    paths = sorted(glob.glob(os.path.join(cube_dir, "*.json")))
+    return paths[-1] if paths else None
+
+
+def build(ch_path: Optional[str], crawl_paths: List[str], snapshot: Optional[str] = None,
+          cube_dir: str = CUBE_DIR) -> str:
+    snapshot = snapshot or snapshot_name(ch_path)
+    if not snapshot:
+        # Naming it after the build date would file a crawl-only cube as a CH snapshot it has nothing to do with
+        raise ValueError("no snapshot name: pass one, or a CH file with its date in the name")
+    cube = AggregateCube(snapshot)
+    if ch_path:
+        print(f"Aggregating Companies House data from {ch_path}...")
+        cube.add_companies_house(ch_path)
+    if crawl_paths:
+        print(f"Aggregating Common Crawl data from {', '.join(crawl_paths)}...")
+        cube.add_crawl(crawl_paths)
+    path = cube.save(cube_dir)
+    print(f"✅ Aggregate cube saved to **{path}** ({os.path.getsize(path) / 1e3:.0f} KB)")
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the aggregate cube that Visuals.py renders from.")
+    parser.add_argument("--ch", help="Companies House BasicCompanyData CSV")
+    parser.add_argument("--crawl", nargs="*", default=[], help="Common Crawl CSV files or globs")
+    parser.add_argument("--snapshot", help="cube name, defaults to the date in the CH file name (required without --ch)")
+    parser.add_argument("--cube-dir", default=CUBE_DIR)
+    args = parser.parse_args()
+    if not args.ch and not args.crawl:
+        parser.error("give --ch and/or --crawl")
+    if not args.snapshot and not snapshot_name(args.ch):
+        parser.error("give --snapshot, there is no date in the CH file name to name the cube after"
+                     if args.ch else "--snapshot is required for a crawl-only cube")
+    build(args.ch, args.crawl, args.snapshot, args.cube_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+import os
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# --- Configuration ---
+CHUNK_ROWS = 50_000          # rows per chunk, memory is roughly (MAX_IN_FLIGHT + 1) chunks
+WORKERS = os.cpu_count() or 1
+MAX_IN_FLIGHT = 2            # chunks queued per worker process before the reader waits
+SHORT_PAGE_WORDS = 50        # pages with fewer words than this count as short
+TOP_DOMAINS = 10
+USECOLS = ['url', 'content', 'parent_url', 'is_info_page']
+COMPACT_URL_HASHES = 5_000_000   # merge the per chunk URL hash arrays once this many are pending
+# ---------------------
+
+# Scheme then netloc, the same part urlparse(url).netloc returns (empty when there is no scheme)
+_NETLOC = r'^[A-Za-z][A-Za-z0-9+.-]*://([^/?#]*)'
+
+
+def _hash(values: pd.Series) -> np.ndarray:
+    # 64-bit hashes stand in for the strings: exact counts up to a negligible collision chance, 8 bytes a key
+    return pd.util.hash_pandas_object(values, index=False).to_numpy()
+
+
+class CrawlAggregate:
+    """
+    Mergeable summary statistics for part of a crawl extract. Built per chunk by aggregate_chunk,
+    added together in any order, and turned into the Common_Crawl_EDA summary by summary().
+
+    Example:
+        total = CrawlAggregate()
+        for chunk in pd.read_csv(path, chunksize=CHUNK_ROWS):
+            total.add(aggregate_chunk(chunk))
+        print(total.summary())
+    """
+
+    def __init__(self):
+        self.rows_read = 0
+        self.total_pages = 0
+        self.total_words = 0
+        self.total_chars = 0
+        self.short_pages = 0
+        self.info_pages = 0
+        self.domains = pd.Series(dtype='int64')          # domain -> pages
+        self.pages_per_site = pd.Series(dtype='int64')   # parent_url hash -> pages
+        self._url_hashes: List[np.ndarray] = []          # sorted unique hashes per chunk, compacted as they pile up
+        self._pending_hashes = 0
+
+    def add(self, other: "CrawlAggregate") -> None:
+        self.rows_read += other.rows_read
+        self.total_pages += other.total_pages
+        self.total_words += other.total_words
+        self.total_chars += other.total_chars
+        self.short_pages += other.short_pages
+        self.info_pages += other.info_pages
+        self.domains = self.domains.add(other.domains, fill_value=0).astype('int64')
+        self.pages_per_site = self.pages_per_site.add(other.pages_per_site, fill_value=0).astype('int64')
+        self._url_hashes.extend(other._url_hashes)
+        self._pending_hashes += sum(len(h) for h in other._url_hashes)
+        if self._pending_hashes > COMPACT_URL_HASHES:
+            self._compact()
+
+    def _compact(self) -> None:
+        if len(self._url_hashes) > 1:
+            self._url_hashes = [np.unique(np.concatenate(self._url_hashes))]
+        self._pending_hashes = 0
+
+    def unique_urls(self) -> int:
+        self._compact()
+        return len(self._url_hashes[0]) if self._url_hashes else 0
+
+    def summary(self, top_domains: int = TOP_DOMAINS) -> Dict[str, Any]:
+        """Same keys and meaning as the original whole-file pandas version of Common_Crawl_EDA."""
+        pages = self.total_pages
+        site_counts = self.pages_per_site
+        return {
+            'total_pages': pages,
+            'total_words': self.total_words,
+            'total_characters': self.total_chars,
+            'average_words_per_page': self.total_words / pages if pages else 0,
+            'average_chars_per_page': self.total_chars / pages if pages else 0,
+            'top_domains': self.domains.sort_values(ascending=False, kind='stable').head(top_domains).to_dict(),
+            'duplicate_pages': pages - self.unique_urls(),
+            'unique_websites': len(site_counts),
+            'info_pages_count': self.info_pages,
+            'short_pages_count': self.short_pages,
+            'website_distribution_summary': {
+                'max_pages_per_site': site_counts.max() if len(site_counts) else None,
+                'min_pages_per_site': site_counts.min() if len(site_counts) else None,
+                'median_pages_per_site': site_counts.median() if len(site_counts) else None,
+                'mean_pages_per_site': site_counts.mean() if len(site_counts) else None,
+            },
+        }
+
+
+def aggregate_chunk(chunk: pd.DataFrame) -> CrawlAggregate:
+    """All the statistics for one chunk in a single pass of vectorised string operations."""
+    part = CrawlAggregate()
+    part.rows_read = len(chunk)
+    chunk = chunk.dropna(subset=['url', 'content'])
+    part.total_pages = len(chunk)
+    if chunk.empty:
+        return part
+
+    content = chunk['content'].astype(str)
+    words = content.str.count(r'\S+')            # == len(x.split()) without building the word lists
+    part.total_words = int(words.sum())
+    part.total_chars = int(content.str.len().sum())
+    part.short_pages = int((words < SHORT_PAGE_WORDS).sum())
+    if 'is_info_page' in chunk:
+        part.info_pages = int(chunk['is_info_page'].sum())
+
+    urls = chunk['url'].astype(str)
+    part.domains = urls.str.extract(_NETLOC, expand=False).fillna('').value_counts()
+    part._url_hashes = [np.unique(_hash(urls))]
+    parents = chunk['parent_url'].dropna()
+    if not parents.empty:
+        part.pages_per_site = pd.Series(_hash(parents)).value_counts()
+    return part
+
+
+def iter_chunks(paths: List[str], chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    for path in paths:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda column: column in USECOLS)
+
+
+def scan(paths: List[str], chunk_rows: int = CHUNK_ROWS, workers: int = WORKERS,
+         progress: Optional[callable] = None) -> CrawlAggregate:
+    """
+    One streaming pass over every file: the reader parses chunks and worker processes aggregate them,
+    with at most workers * MAX_IN_FLIGHT chunks in memory. workers=1 runs everything in this process.
+    """
+    total = CrawlAggregate()
+    if workers <= 1:
+        for chunk in iter_chunks(paths, chunk_rows):
+            total.add(aggregate_chunk(chunk))
+            if progress:
+                progress(total)
+        return total
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: List[Future] = []
+        for chunk in iter_chunks(paths, chunk_rows):
+            in_flight.append(pool.submit(aggregate_chunk, chunk))
+            if len(in_flight) >= workers * MAX_IN_FLIGHT:
+                total.add(in_flight.pop(0).result())
+                if progress:
+                    progress(total)
+        for future in in_flight:
+            total.add(future.result())
+    return total
@@ -0,0 +1,229 @@
+import os
+import sys
+import json
+import re
+import argparse
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import pandas as pd
+
+from results_store import load_scrape_results
+
+# --- Configuration ---
+INPUT_JSON = "scraper_results_Random_CH.json"
+OUTPUT_DIR = "evidence_index"
+POSTCODE_INDEX_FILE = "postcode_index.json"
+COMPANY_NUMBER_INDEX_FILE = "company_number_index.json"
+BATCH_SIZE = 500       # pages handed to a worker at a time
+CSV_CHUNKSIZE = 20000  # rows read per chunk from a crawl CSV
+# ---------------------
+
+# UK postcode: outward code (e.g. 'HA2', 'EC1A', 'B9') then inward code (e.g. '0DU').
+# The space is optional on web pages, so we allow none/one/several.
+POSTCODE_REGEX = re.compile(r"\b([A-Z]{1,2}[0-9][A-Z0-9]?)\s*([0-9][ABD-HJLNP-UW-Z]{2})\b", re.IGNORECASE)
+
+# Companies House numbers are 8 characters: either all digits (often printed without the
+# leading zeros) or a 2 letter jurisdiction/type prefix (SC, NI, OC...) followed by 6 digits.
+# Same idea as COMPANY_REGEX in company_number_scrape.py, but also handles the prefixes
+# and the common "Registration No." / "Registered in England No." phrasing.
+COMPANY_NUMBER_REGEX = re.compile(
+    r"(?:company|registration|registered(?:\s+in\s+[a-z ]{3,30}?)?)\s*(?:no\.?|number|num\.?)?\s*[:\-]?\s*"
+    r"((?:SC|NI|OC|SO|NC|NL|SL|SE|SF|SA|SP|SR|SZ|ZC|FC|GE|LP|IP|RC|R0|NP|NO|NF|NZ|ES|GS)?\s?[0-9]{5,8})\b",
+    re.IGNORECASE,
+)
+
+
+def normalise_postcode(postcode: str) -> str:
+    """
+    Normalises a UK postcode to the canonical upper case 'OUTWARD INWARD' form.
+    e.g. 'ha20du' -> 'HA2 0DU', ' b9  4aa' -> 'B9 4AA'
+    Returns an empty string if the input is not a postcode.
+    """
+    compact = re.sub(r"\s+", "", str(postcode)).upper()
+    if len(compact) < 5 or len(compact) > 7:
+        return ""
+    return f"{compact[:-3]} {compact[-3:]}"
+
+
+def normalise_company_number(company_number: str) -> str:
+    """
+    Normalises a Companies House number to its 8 character form.
+    e.g. '9848870' -> '09848870', 'sc 123456' -> 'SC123456'
+    Returns an empty string if the input can't be a company number.
+    """
+    compact = re.sub(r"\s+", "", str(company_number)).upper()
+    match = re.fullmatch(r"([A-Z]{2}|R0)?([0-9]+)", compact)
+    if not match:
+        return ""
+    prefix = match.group(1) or ""
+    digits = match.group(2)
+    if len(prefix) + len(digits) > 8:
+        return ""
+    return prefix + digits.zfill(8 - len(prefix))
+
+
+def extract_postcodes(text: str) -> Set[str]:
+    """Returns the set of normalised UK postcodes found in a page."""
+    return {f"{m.group(1).upper()} {m.group(2).upper()}" for m in POSTCODE_REGEX.finditer(text)}
+
+
+def extract_company_numbers(text: str) -> Set[str]:
+    """Returns the set of normalised company numbers found in a page."""
+    found = set()
+    for m in COMPANY_NUMBER_REGEX.finditer(text):
+        number = normalise_company_number(m.group(1))
+        if number:
+            found.add(number)
+    return found
+
+
+def _index_batch(batch: List[Tuple[str, str]]) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """Worker: builds partial postcode/company number indexes for a batch of (page_id, text)."""
+    postcode_index = defaultdict(list)
+    company_number_index = defaultdict(list)
+    for page_id, text in batch:
+        if not isinstance(text, str) or not text:
+            continue
+        for postcode in extract_postcodes(text):
+            postcode_index[postcode].append(page_id)
+        for number in extract_company_numbers(text):
+            company_number_index[number].append(page_id)
+    return dict(postcode_index), dict(company_number_index)
+
+
+def _batched(pages: Iterable[Tuple[str, str]], batch_size: int) -> Iterator[List[Tuple[str, str]]]:
+    batch = []
+    for page in pages:
+        batch.append(page)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def iter_scraper_results_pages(json_path: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (page_id, markdown) from a Search_scrape_P1 output file (legacy JSON or results_store file).
+    The page id is '<trial_number>:<position>' so it can be traced back to the trial.
+    """
+    all_trials_data = load_scrape_results(json_path)
+    for trial in all_trials_data:
+        for result in trial.get("scraped_results", []):
+            yield f"{trial['trial_number']}:{result['position']}", result.get("markdown_content", "")
+
+
+def iter_crawl_pages(csv_path: str, id_column: str = "url", chunksize: int = CSV_CHUNKSIZE) -> Iterator[Tuple[str, str]]:
+    """
+    Yields (page_id, content) from a Common Crawl extract CSV without loading it all into memory.
+    The page id is the value of id_column (the page url by default).
+    """
+    for chunk in pd.read_csv(csv_path, usecols=[id_column, "content"], chunksize=chunksize):
+        chunk = chunk.dropna(subset=[id_column, "content"])
+        yield from zip(chunk[id_column].astype(str), chunk["content"].astype(str))
+
+
+def build_evidence_index(pages: Iterable[Tuple[str, str]], workers: int = None, batch_size: int = BATCH_SIZE) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+    """
+    Scans a page corpus in parallel and builds the two inverted indexes.
+
+    Args:
+        pages: iterable of (page_id, text) pairs, e.g. from iter_scraper_results_pages or iter_crawl_pages.
+        workers: number of worker processes (defaults to the CPU count).
+        batch_size: pages per work item, larger batches mean less pickling overhead.
+
+    Returns:
+        (postcode -> sorted page ids, company number -> sorted page ids)
+    """
+    postcode_index = defaultdict(set)
+    company_number_index = defaultdict(set)
+
+    with Pool(processes=workers) as pool:
+        for i, (pc_part, cn_part) in enumerate(pool.imap_unordered(_index_batch, _batched(pages, batch_size)), start=1):
+            for key, page_ids in pc_part.items():
+                postcode_index[key].update(page_ids)
+            for key, page_ids in cn_part.items():
+                company_number_index[key].update(page_ids)
+            if i % 50 == 0:
+                print(f"Indexed {i * batch_size} pages so far...")
+
+    return (
+        {k: sorted(v) for k, v in postcode_index.items()},
+        {k: sorted(v) for k, v in company_number_index.items()},
+    )
+
+
+def save_evidence_index(postcode_index: Dict[str, List[str]], company_number_index: Dict[str, List[str]], output_dir: str = OUTPUT_DIR):
+    """Writes both indexes as JSON files into output_dir."""
+    os.makedirs(output_dir, exist_ok=True)
+    for filename, index in [(POSTCODE_INDEX_FILE, postcode_index), (COMPANY_NUMBER_INDEX_FILE, company_number_index)]:
+        path = os.path.join(output_dir, filename)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False)
+        print(f"✅ Saved {len(index)} keys to **{path}**")
+
+
+class EvidenceIndex:
+    """
+    Read side of the inverted indexes, for use during matching.
+
+    Example:
+        index = EvidenceIndex.load("evidence_index")
+        index.page_has_postcode("12:1", "HA2 0DU")     # constant time
+        index.pages_for_company_number("9848870")      # all pages quoting that number
+    """
+
+    def __init__(self, postcode_index: Dict[str, Iterable[str]], company_number_index: Dict[str, Iterable[str]]):
+        self.postcode_index = {k: frozenset(v) for k, v in postcode_index.items()}
+        self.company_number_index = {k: frozenset(v) for k, v in company_number_index.items()}
+
+    @classmethod
+    def load(cls, output_dir: str = OUTPUT_DIR) -> "EvidenceIndex":
+        with open(os.path.join(output_dir, POSTCODE_INDEX_FILE), "r", encoding="utf-8") as f:
+            postcode_index = json.load(f)
+        with open(os.path.join(output_dir, COMPANY_NUMBER_INDEX_FILE), "r", encoding="utf-8") as f:
+            company_number_index = json.load(f)
+        return cls(postcode_index, company_number_index)
+
+    def pages_for_postcode(self, postcode: str) -> frozenset:
+        return self.postcode_index.get(normalise_postcode(postcode), frozenset())
+
+    def pages_for_company_number(self, company_number: str) -> frozenset:
+        return self.company_number_index.get(normalise_company_number(company_number), frozenset())
+
+    def page_has_postcode(self, page_id: str, postcode: str) -> bool:
+        return page_id in self.pages_for_postcode(postcode)
+
+    def page_has_company_number(self, page_id: str, company_number: str) -> bool:
+        return page_id in self.pages_for_company_number(company_number)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build postcode / company number inverted indexes over a page corpus.")
+    parser.add_argument("--json", default=None, help="Search_scrape_P1 output JSON to index (default: INPUT_JSON)")
+    parser.add_argument("--crawl-csv", default=None, help="Common Crawl extract CSV with a 'content' column")
+    parser.add_argument("--output-dir", default=OUTPUT_DIR)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.crawl_csv:
+        print(f"Indexing crawl pages from {args.crawl_csv}...")
+        pages = iter_crawl_pages(args.crawl_csv)
+    else:
+        json_path = args.json or INPUT_JSON
+        print(f"Indexing scraped pages from {json_path}...")
+        try:
+            pages = list(iter_scraper_results_pages(json_path))
+        except FileNotFoundError:
+            print(f"Error: {json_path} not found.", file=sys.stderr)
+            sys.exit(1)
+
+    postcode_index, company_number_index = build_evidence_index(pages, workers=args.workers)
+    print(f"Found {len(postcode_index)} distinct postcodes and {len(company_number_index)} distinct company numbers.")
+    save_evidence_index(postcode_index, company_number_index, args.output_dir)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,17 +1,26 @@
 import os
 import sys
 import json
+import argparse
 import re
 import pandas as pd
-from google import genai 
 from urllib.parse import urlparse
 
-from typing import List, Dict, Any, Tuple
+from typing import Callable, List, Dict, Any, Optional, Tuple
 import time  
 import jellyfish
+from results_store import load_scrape_results
+from metrics import metrics
+from profiling import profiler, add_profile_argument, start_from_args
+from llm_clients import init_llm_client, MockLLMClient, LLM_BACKEND
+from model_router import ModelRouter, DEFAULT_MODEL
+from llm_schema import MATCH_SCHEMA, structured_config, parse_structured, ask_structured
+from aggregator_extractors import extract_listed_website
+from psc_index import PscIndex, PSC_INDEX_DB
 # --- Configuration ---
-INPUT_JSON = "scraper_results_Random_CH.json"
+INPUT_JSON = "scraper_results_Random_CH.json"  # legacy JSON or a results_store file (.jsonl.zst)
 OUTPUT_CSV = "analysis_results_CH_random.csv"
+LLM_RATE_LIMIT_WAIT = float(os.environ.get("LLM_RATE_LIMIT_WAIT", 60))  # seconds after a 429, lower it against the mock LLM
 # ---------------------
 
 
@@ -92,22 +101,6 @@ def URL_similarity_match(registered_name: str, url_fragment: str) -> bool:
 
 
 
-def init_gemini_client():
-    """Initializes and returns the Gemini V1 client."""
-    print("Initializing Gemini V1 client (genai.Client)...")
-    g_api_key = os.environ.get("GOOGLE_API_KEY")
-    if not g_api_key:
-        print("Error: GOOGLE_API_KEY environment variable not set.", file=sys.stderr)
-        return None
-    
-    try:
-        client = genai.Client() 
-        print("✅ Gemini V1 client initialized successfully.")
-        return client
-    except Exception as e:
-        print(f"Error initializing Gemini V1 client. \nError: {e}", file=sys.stderr)
-        return None
-
 def clean_base_url(raw_url: str) -> str | None:
     """
     Parses a full URL and returns just the scheme + domain.
@@ -131,41 +124,36 @@ def parse_llm_output(llm_response: str) -> Dict[str, Any]:
     - official_url: str or None
     - found_embedded_link: bool  
     - embedded_url: str or None
+    - confidence: float in [0, 1] or None
     - reasoning: str
-    - parse_success: bool (did parsing work?)
+    - parse_success: bool (did the reply conform to MATCH_SCHEMA?)
     """
+    return verdict_from_reply(llm_response, *parse_structured(llm_response, MATCH_SCHEMA))
+
+
+def verdict_from_reply(llm_response: str, parsed: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    """Turns a parse_structured result into the verdict dict, the fields are already type checked."""
     result = {
         "is_entity1_website": False,
         "official_url": None,
         "found_embedded_link": False,
         "embedded_url": None,
         "reasoning": "",
+        "confidence": None,
         "parse_success": False
     }
-    
-    try:
-        # Clean up response - remove markdown code blocks if present
-        cleaned = llm_response.strip()
-        if cleaned.startswith("```"):
-            cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-            cleaned = re.sub(r'\s*```$', '', cleaned)
-        
-        # Parse JSON
-        parsed = json.loads(cleaned)
-        
-        # Extract fields
-        result["is_entity1_website"] = bool(parsed.get("is_entity1_website", False))
-        result["official_url"] = parsed.get("official_url")
-        result["found_embedded_link"] = bool(parsed.get("found_embedded_link", False))
-        result["embedded_url"] = parsed.get("embedded_url")
-        result["reasoning"] = parsed.get("reasoning", "")
-        result["parse_success"] = True
-        
-    except (json.JSONDecodeError, KeyError, AttributeError) as e:
-        # Parsing failed - store raw response in reasoning
-        result["reasoning"] = f"PARSE_ERROR: {llm_response[:200]}"
-        result["parse_success"] = False
-    
+    if error is not None:
+        # Parsing failed - store the reason and raw response in reasoning
+        result["reasoning"] = f"PARSE_ERROR ({error}): {llm_response[:200]}"
+        return result
+
+    result["is_entity1_website"] = parsed["is_entity1_website"]
+    result["official_url"] = parsed["official_url"]
+    result["found_embedded_link"] = parsed["found_embedded_link"]
+    result["embedded_url"] = parsed["embedded_url"]
+    result["reasoning"] = parsed["reasoning"]
+    result["confidence"] = float(parsed["confidence"])
+    result["parse_success"] = True
     return result
 
 def get_domain_fragment(url: str) -> str:
@@ -181,9 +169,25 @@ def get_domain_fragment(url: str) -> str:
         return fragment
     except Exception:
         return ""
+
+
+_LEGAL_SUFFIX = re.compile(r'[\s,]+(limited liability partnership|limited|ltd|llp|plc)\.?$', re.IGNORECASE)
+
+
+def _contains_phrase(text: str, phrase: str) -> bool:
+    """Case-insensitive whole-word search, so 'Ann Lee' doesn't match inside 'Joann Leeds'."""
+    return bool(phrase) and re.search(r'(?<!\w)' + re.escape(phrase) + r'(?!\w)', text, re.IGNORECASE) is not None
+
+
 # OK this is another one that will need changes if you are feeeding different versions of the scraped sites.
-def check_md_match(markdown_content: str, company_name: str, postcode: str) -> bool:
+def check_md_match(markdown_content: str, company_name: str, postcode: str, psc_names: Optional[List[str]] = None) -> bool:
     has_pos_match = company_name.lower() in markdown_content.lower() or postcode.lower() in markdown_content.lower()
+    # A named owner/controller of the company (PSC index) only corroborates: names like 'John Smith' are on
+    # countless unrelated pages, so it counts together with the trading name ('Acme' for 'ACME LIMITED')
+    if not has_pos_match and psc_names:
+        trading_name = _LEGAL_SUFFIX.sub('', company_name.strip())
+        has_pos_match = (_contains_phrase(markdown_content, trading_name)
+                         and any(_contains_phrase(markdown_content, name) for name in psc_names))
     if not has_pos_match:
         return False
     # add any more company info aggregator sites to this list to exclude if we find them. 
@@ -199,6 +203,8 @@ def create_llm_prompt(company_data: Dict[str, Any], scraped_content: str) -> str
     # You need to tweak the the prompt with the commmented out line 2 below if you are using the CH Dataset in entity 1, otherwise comment out the line below
     #sic_code_str = ", ".join(company_data['sic_codes']) if company_data['sic_codes'] else "N/A"
     sic_code_str = {company_data['sic_code_desc']}
+    # Names from the PSC index (psc_index.py), when it has been built
+    psc_line = f"\nPeople with significant control: {', '.join(company_data['psc_names'])}" if company_data.get('psc_names') else ""
     return f"""
 You must respond with ONLY valid JSON. No other text before or after.
 
@@ -210,6 +216,7 @@ Respond with this exact JSON structure:
     "official_url": "url string or null",
     "found_embedded_link": true or false,
     "embedded_url": "url string or null",
+    "confidence": number between 0 and 1 (how sure you are of is_entity1_website),
     "reasoning": "brief explanation"
 }}
 
@@ -228,13 +235,14 @@ available
 based outside of the United Kingdom
 6. The website should be the website of the business descrined in entity 1 be related to the trade described in the SIC codes, be careful it is not a website that is discussing the company only.
 7. if Entity 2 contains website URL contains open.endole.co.uk,  please check for the entity website link within the page and return that instead if found.
+8. People with significant control (owners/controllers) of Entity 1 named on the website support the match, if available
 
 
 Entity 1:
 Company name: {company_data['company_name']}
 Company number: {company_data['company_number']}
 Address post code: {company_data['postcode']}
-SIC codes: {sic_code_str}
+SIC codes: {sic_code_str}{psc_line}
 
 Entity 2:
 {scraped_content[:15000]} 
@@ -244,12 +252,140 @@ Answer in JSON format only:
 
 
 
+def generate_llm_answer(llm_client, llm_prompt: str, model: str = DEFAULT_MODEL, config: Optional[Dict[str, Any]] = None,
+                        acquire: Optional[Callable[[], bool]] = None) -> str:
+    """
+    Sends one prompt to the given model, retrying on "429 RESOURCE_EXHAUSTED" quota errors.
+    config is passed through to generate_content (e.g. structured_config(MATCH_SCHEMA)).
+    acquire (a ModelQuota's) is called before every attempt, so retries count against the quota.
+    Returns the raw response text, or "ERROR" if every attempt failed or the quota ran out.
+    """
+    extra = {"config": config} if config else {}
+    MAX_RETRIES = 3 # Allow a few retries just in case
+    retries = 0
+    llm_answer = "ERROR" # Default to error
+
+    while retries < MAX_RETRIES:
+        if acquire is not None and not acquire():
+            metrics.inc("llm_quota_exhausted_total", model=model)
+            break
+        try:
+            # Attempt the API call
+            with metrics.timer("llm_request_seconds", model=model), profiler.stage("llm"):
+                response = llm_client.models.generate_content(
+                    model=model, 
+                    contents=llm_prompt,
+                    **extra
+                )
+            llm_answer = response.text
+            metrics.inc("llm_requests_total", outcome="ok", model=model)
+            metrics.record_llm_usage(model, response)
+            
+            # If successful, break the retry loop
+            break 
+            
+        except Exception as e:
+            # Check if it's the specific rate limit error
+            if "429 RESOURCE_EXHAUSTED" in str(e):
+                retries += 1
+                metrics.inc("rate_limited_total", api="gemini")
+                metrics.inc("llm_retries_total")
+                wait_time = LLM_RATE_LIMIT_WAIT # Wait for the per-minute quota to reset
+                print(f"    [Warn] Hit Rate Limit. Retrying {retries}/{MAX_RETRIES} in {wait_time}s...")
+                time.sleep(wait_time)
+            else:
+                # It's a different, non-retryable error
+                print(f"    [Warn] LLM generation failed (non-retryable). Error: {e}")
+                metrics.inc("llm_requests_total", outcome="error", model=model)
+                break # Break the retry loop
+
+    return llm_answer
+
+
+def generate_verdict(llm_client, llm_prompt: str, model: str = DEFAULT_MODEL,
+                     acquire: Optional[Callable[[], bool]] = None) -> Tuple[str, Dict[str, Any]]:
+    """
+    Asks for JSON constrained to MATCH_SCHEMA and validates the reply, re-asking once with the
+    validation error if it doesn't conform. Returns (raw answer, parsed verdict).
+    """
+    config = structured_config(MATCH_SCHEMA)
+    answer, parsed, error = ask_structured(lambda prompt: generate_llm_answer(llm_client, prompt, model, config, acquire),
+                                           llm_prompt, MATCH_SCHEMA)
+    return answer, verdict_from_reply(answer, parsed, error)
+
+
+def extracted_verdict(company_data: Dict[str, Any], scraped_url: str, markdown_content: str) -> Optional[Tuple[str, Dict[str, Any]]]:
+    """
+    For a known aggregator page about this company, the verdict rule 7 of the prompt would give,
+    read straight from the page: not the company's site, with the listed website as the embedded link.
+    Returns (answer JSON, parsed verdict), or None when the LLM has to read the page.
+    """
+    extracted = extract_listed_website(scraped_url, markdown_content, company_data['company_number'])
+    if extracted is None:
+        return None
+    parsed = {"is_entity1_website": False, "official_url": None, "found_embedded_link": extracted["website"] is not None,
+              "embedded_url": extracted["website"], "confidence": 1.0, "reasoning": extracted["reasoning"]}
+    metrics.inc("llm_calls_skipped_total", reason="aggregator_extractor")
+    return json.dumps(parsed), {**parsed, "parse_success": True}
+
+
+def route_llm_answer(llm_client, router: ModelRouter, llm_prompt: str, string_match_result: bool,
+                     Key_ID_match: bool) -> Tuple[str, Dict[str, Any], str, str]:
+    """
+    Asks the cheapest model first and escalates per the router's policy.
+    Returns (raw answer, parsed verdict, model that settled it, escalation reasons).
+    """
+    def ask(model: str, acquire: Callable[[], bool]) -> Tuple[str, Dict[str, Any]]:
+        return generate_verdict(llm_client, llm_prompt, model, acquire)
+
+    llm_answer, llm_parsed, llm_model, escalation = router.route(ask, string_match_result, Key_ID_match)
+    if llm_parsed is None:  # every tier's quota was used up
+        llm_parsed = parse_llm_output(llm_answer)
+    return llm_answer, llm_parsed, llm_model, escalation
+
+
+def build_analysis_row(company_data: Dict[str, Any], scraped_pos, scraped_url: str, string_match_result: bool,
+                       Key_ID_match: bool, llm_answer: str, llm_parsed: Dict[str, Any],
+                       llm_model: str = DEFAULT_MODEL, escalation: str = "") -> Dict[str, Any]:
+    """Builds one row of the output CSV for a (company, scraped result) pair."""
+    return {
+        "company_number": company_data['company_number'],
+        "company_name": company_data['company_name'],
+        #"ground_truth_url": ground_truth_url,
+        "scraped_result_position": scraped_pos,
+        "scraped_result_url": scraped_url,
+        #"is_correct_url": is_correct_url,
+        "string_match_result": string_match_result,
+        "Key_ID_match": Key_ID_match,
+        "llm_answer": llm_answer,
+        "llm_is_entity1_website": llm_parsed['is_entity1_website'],
+        "llm_official_url": llm_parsed['official_url'],
+        "llm_found_embedded_link": llm_parsed['found_embedded_link'],
+        "llm_embedded_url": llm_parsed['embedded_url'],
+        "llm_reasoning": llm_parsed['reasoning'],
+        "llm_parse_success": llm_parsed['parse_success'],
+        "llm_confidence": llm_parsed['confidence'],
+        "llm_model": llm_model,
+        "llm_escalation": escalation
+    }
+
+
 def main():
+    parser = argparse.ArgumentParser(description="LLM-match scraped pages back to the sampled companies.")
+    parser.add_argument("--llm-backend", choices=["gemini", "mock"], default=LLM_BACKEND,
+                        help="'mock' answers locally with no cost (see llm_clients.py for its latency/error knobs)")
+    parser.add_argument("--routing-policy", default=None,
+                        help="JSON file overriding model_router's tiers, quotas, confidence threshold and conflict rules")
+    parser.add_argument("--psc-index", default=PSC_INDEX_DB,
+                        help="PSC names index built by psc_index.py, used as match evidence when the file exists")
+    add_profile_argument(parser)
+    args = parser.parse_args()
+    start_from_args(args, "Matching_P1")
+
     total_skiped = 0
     print(f"Loading data from {INPUT_JSON}...")
     try:
-        with open(INPUT_JSON, 'r', encoding='utf-8') as f:
-            all_trials_data: List[Dict[str, Any]] = json.load(f)
+        all_trials_data: List[Dict[str, Any]] = load_scrape_results(INPUT_JSON)
     except FileNotFoundError:
         print(f"Error: {INPUT_JSON} not found.", file=sys.stderr)
         sys.exit(1)
@@ -259,15 +395,19 @@ def main():
         
     print(f"Loaded {len(all_trials_data)} trials.")
 
-    llm_client = init_gemini_client()
+    llm_client = init_llm_client(args.llm_backend)
     if not llm_client:
         sys.exit(1)
+    router = ModelRouter.from_json(args.routing_policy)
+    psc = PscIndex.load(args.psc_index)
 
     analysis_results: List[Dict[str, Any]] = []
 
     for trial in all_trials_data:
         company_data = trial['ground_truth_data']
         company_name = company_data['company_name']
+        if psc:
+            psc.add_evidence(company_data)
         #ground_truth_url = company_data['ground_truth_url']
         
         print(f"\n--- Processing Trial {trial['trial_number']}: {company_name} ---")
@@ -277,79 +417,46 @@ def main():
             total_skiped += 1
             continue
             
-        for result in trial['scraped_results']:
-            scraped_url = result['link']
-            scraped_pos = result['position']
-            markdown_content = result['markdown_content']
-            
-            print(f"  Analysing result {scraped_pos}: {scraped_url}")
-
-            #cleaned_scraped_url = clean_base_url(scraped_url)
-            #is_correct_url = (cleaned_scraped_url == ground_truth_url)
-
-            domain_fragment = get_domain_fragment(scraped_url)
-            string_match_result = URL_similarity_match(company_name, domain_fragment)
-            #Match on key identfiers in the marskedown content, exact company name and post code
-            Key_ID_match = check_md_match(markdown_content, company_name, company_data['company_number'])
-            # --- Rate Limit Logic ---
-            
-            llm_prompt = create_llm_prompt(company_data, markdown_content)
-            
-            MAX_RETRIES = 3 # Allow a few retries just in case
-            retries = 0
-            llm_answer = "ERROR" # Default to error
-            llm_url = ""
-
-            while retries < MAX_RETRIES:
-                try:
-                    # Attempt the API call
-                    response = llm_client.models.generate_content(
-                        model='gemini-2.5-flash-lite', 
-                        contents=llm_prompt
-                    )
-                    llm_answer = response.text
-                    print(f"    - String Match: {string_match_result}")
-                    print(f"    - LLM Match: {llm_answer}")
-                    
-                    # If successful, break the retry loop
-                    break 
-                    
-                except Exception as e:
-                    # Check if it's the specific rate limit error
-                    if "429 RESOURCE_EXHAUSTED" in str(e):
-                        retries += 1
-                        wait_time = 60 # Wait a full minute for quota to reset
-                        print(f"    [Warn] Hit Rate Limit. Retrying {retries}/{MAX_RETRIES} in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        # It's a different, non-retryable error
-                        print(f"    [Warn] LLM generation failed (non-retryable). Error: {e}")
-                        break # Break the retry loop
-            
-            # *** Proactive Throttle REMOVED ***
+        with profiler.span("company", trial=trial['trial_number'], company_number=company_data['company_number']):
+            for result in trial['scraped_results']:
+                scraped_url = result['link']
+                scraped_pos = result['position']
+                markdown_content = result['markdown_content']
             
-            # --- End Rate Limit Logic ---
-            llm_parsed = parse_llm_output(llm_answer)
-            row = {
-                "company_number": company_data['company_number'],
-                "company_name": company_name,
-                #"ground_truth_url": ground_truth_url,
-                "scraped_result_position": scraped_pos,
-                "scraped_result_url": scraped_url,
-                #"is_correct_url": is_correct_url,
-                "string_match_result": string_match_result,
-                "Key_ID_match": Key_ID_match,
-                "llm_answer": llm_answer,
-                "llm_is_entity1_website": llm_parsed['is_entity1_website'],
-                "llm_official_url": llm_parsed['official_url'],
-                "llm_found_embedded_link": llm_parsed['found_embedded_link'],
-                "llm_embedded_url": llm_parsed['embedded_url'],
-                "llm_reasoning": llm_parsed['reasoning'],
-                "llm_parse_success": llm_parsed['parse_success']
-            }
-            analysis_results.append(row)
+                print(f"  Analysing result {scraped_pos}: {scraped_url}")
+
+                #cleaned_scraped_url = clean_base_url(scraped_url)
+                #is_correct_url = (cleaned_scraped_url == ground_truth_url)
+
+                domain_fragment = get_domain_fragment(scraped_url)
+                string_match_result = URL_similarity_match(company_name, domain_fragment)
+                #Match on key identfiers in the marskedown content, exact company name and post code
+                with profiler.stage("prefilter"):
+                    Key_ID_match = check_md_match(markdown_content, company_name, company_data['company_number'],
+                                                  company_data.get('psc_names'))
+
+                extracted = extracted_verdict(company_data, scraped_url, markdown_content)
+                if extracted is not None:
+                    (llm_answer, llm_parsed), llm_model, escalation = extracted, "extractor", ""
+                else:
+                    llm_prompt = create_llm_prompt(company_data, markdown_content)
+                    llm_answer, llm_parsed, llm_model, escalation = route_llm_answer(
+                        llm_client, router, llm_prompt, string_match_result, Key_ID_match)
+                print(f"    - String Match: {string_match_result}")
+                print(f"    - LLM Match ({llm_model}{', escalated: ' + escalation if escalation else ''}): {llm_answer}")
+                row = build_analysis_row(company_data, scraped_pos, scraped_url, string_match_result, Key_ID_match,
+                                         llm_answer, llm_parsed, llm_model, escalation)
+                analysis_results.append(row)
 
     print("\n--- Analysis complete. ---")
+    metrics.print_summary()
+    print(f"  {router.summary()}")
+    if psc:
+        print(f"  {psc.summary()}")
+    if isinstance(llm_client, MockLLMClient):
+        print(f"  {llm_client.summary()}")
+    metrics.write_files()
+    profiler.stop()
     if not analysis_results:
         print("No results to save. Exiting.")
         return
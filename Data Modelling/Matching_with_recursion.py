@@ -1,16 +1,19 @@
-import os
 import sys
 import json
 import re
+import argparse
 import pandas as pd
-from google import genai 
 from urllib.parse import urlparse
-import requests
-from bs4 import BeautifulSoup
-import html2text
-from typing import List, Dict, Any, Tuple, Optional
-import time  
+from typing import List, Dict, Any, Optional
 import jellyfish
+from Scrape_Utils import ScrapeToMarkdown
+from llm_clients import init_llm_client  # LLM_BACKEND=mock runs it against the local mock
+from model_router import DEFAULT_MODEL
+from recursion_frontier import RecursionEngine, RecursionBudget, SpeculativePrefetcher, PREFETCH_MAX_FETCHES, MAX_DEPTH, MAX_FETCHES, MAX_LLM_CALLS, WORKERS
+from aggregator_extractors import extract_listed_website
+from psc_index import PscIndex, PSC_INDEX_DB
+from llm_schema import OFFICIAL_WEBSITE_SCHEMA, REJECTION_SCHEMA, structured_config, parse_structured, ask_structured
+from Matching_P1 import generate_llm_answer, check_md_match
 # --- Configuration ---
 INPUT_JSON = "scraper_results.json"
 OUTPUT_CSV = "analysis_results_JSON_LLM_TP_Recurse.csv"
@@ -94,22 +97,6 @@ def URL_similarity_match(registered_name: str, url_fragment: str) -> bool:
 
 
 
-def init_gemini_client():
-    """Initializes and returns the Gemini V1 client."""
-    print("Initializing Gemini V1 client (genai.Client)...")
-    g_api_key = os.environ.get("GOOGLE_API_KEY")
-    if not g_api_key:
-        print("Error: GOOGLE_API_KEY environment variable not set.", file=sys.stderr)
-        return None
-    
-    try:
-        client = genai.Client() 
-        print("✅ Gemini V1 client initialized successfully.")
-        return client
-    except Exception as e:
-        print(f"Error initializing Gemini V1 client. \nError: {e}", file=sys.stderr)
-        return None
-
 def clean_base_url(raw_url: str) -> str | None:
     """
     Parses a full URL and returns just the scheme + domain.
@@ -134,8 +121,14 @@ def parse_llm_output(llm_response: str) -> Dict[str, Any]:
     - found_embedded_link: bool  
     - embedded_url: str or None
     - reasoning: str
-    - parse_success: bool (did parsing work?)
+    - parse_success: bool (did the reply conform to OFFICIAL_WEBSITE_SCHEMA?)
     """
+    parsed, error = parse_structured(llm_response, OFFICIAL_WEBSITE_SCHEMA)
+    return verdict_from_reply(llm_response, parsed, error)
+
+
+def verdict_from_reply(llm_response: str, parsed: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    """Turns a parse_structured result into the verdict dict, the fields are already type checked."""
     result = {
         "is_official_website": False,
         "official_url": None,
@@ -144,87 +137,16 @@ def parse_llm_output(llm_response: str) -> Dict[str, Any]:
         "reasoning": "",
         "parse_success": False
     }
-    
-    try:
-        # Clean up response - remove markdown code blocks if present
-        cleaned = llm_response.strip()
-        if cleaned.startswith("```"):
-            cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-            cleaned = re.sub(r'\s*```$', '', cleaned)
-        
-        # Parse JSON
-        parsed = json.loads(cleaned)
-        
-        # Extract fields
-        result["is_official_website"] = bool(parsed.get("is_official_website", False))
-        result["official_url"] = parsed.get("official_url")
-        result["found_embedded_link"] = bool(parsed.get("found_embedded_link", False))
-        result["embedded_url"] = parsed.get("embedded_url")
-        result["reasoning"] = parsed.get("reasoning", "")
-        result["parse_success"] = True
-        
-    except (json.JSONDecodeError, KeyError, AttributeError) as e:
-        # Parsing failed - store raw response in reasoning
-        result["reasoning"] = f"PARSE_ERROR: {llm_response[:200]}"
-        result["parse_success"] = False
-    
+    if error is not None:
+        # Parsing failed - store the reason and raw response in reasoning
+        result["reasoning"] = f"PARSE_ERROR ({error}): {llm_response[:200]}"
+        return result
+
+    # Fields are already type checked against the schema
+    result.update({key: parsed[key] for key in ("is_official_website", "official_url", "found_embedded_link", "embedded_url", "reasoning")})
+    result["parse_success"] = True
     return result
 
-def ScrapeToMarkdown(url: str) -> Optional[str]:
-    """
-    Fetches the content of a given URL, cleans the HTML, and converts 
-    the body content into a Markdown-formatted string suitable for an LLM.
-
-    Args:
-        url: The URL of the webpage to scrape.
-
-    Returns:
-        A string containing the page content in Markdown format, or None on failure.
-    
-    Dependancies: beautifulsoup4, html2text, requests
-    """
-    try:
-        # 1. Fetch the raw HTML content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-        # 2. Parse the HTML using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # 3. Clean the HTML (Remove noise before conversion)
-        # Remove script, style, and footer/nav elements that clutter LLM context
-        for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'form', 'aside']):
-            tag.decompose()
-        
-        # 4. Extract the body content
-        body_content = str(soup.body) if soup.body else str(soup)
-
-        # 5. Convert the cleaned HTML to Markdown
-        h = html2text.HTML2Text()
-        h.ignore_links = False  # Set to True if you want to remove all links
-        h.ignore_images = True  # Images are usually noise for text extraction
-        h.body_width = 0        # Don't wrap lines (better for LLM tokenizing)
-        
-        markdown_text = h.handle(body_content)
-
-        # Basic final cleaning to remove excessive whitespace/empty lines
-        clean_text = '\n'.join([line.strip() for line in markdown_text.splitlines() if line.strip()])
-
-        return clean_text
-
-    except requests.exceptions.HTTPError as e:
-        print(f"Error fetching {url}: HTTP Error - {e}")
-        return None
-    except requests.exceptions.RequestException as e:
-        print(f"Error fetching {url}: Connection/Request Error - {e}")
-        return None
-    except Exception as e:
-        print(f"An unexpected error occurred: {e}")
-        return None
-
 def get_domain_fragment(url: str) -> str:
     """
     Extracts the core domain fragment for similarity matching.
@@ -238,24 +160,14 @@ def get_domain_fragment(url: str) -> str:
         return fragment
     except Exception:
         return ""
-# OK this is another one that will need changes if you are feeeding different versions of the scraped sites.
-def check_md_match(markdown_content: str, company_name: str, postcode: str) -> bool:
-    has_pos_match = company_name.lower() in markdown_content.lower() or postcode.lower() in markdown_content.lower()
-    if not has_pos_match:
-        return False
-    # add any more company info aggregator sites to this list to exclude if we find them. 
-    excl_URL_frags = ['open.endole.co.uk','uk.globaldatabase.com','companywall.co.uk','bringo.co.uk','companiesintheuk.co.uk', 'companycheck.co.uk', 'bizdb.co.uk', 'check-business.co.uk']
-    for frag in excl_URL_frags:
-        if frag in markdown_content.lower():
-            return False
-    return True
-
 # ALTER THIS FOR different prompts.  
 def create_llm_prompt(company_data: Dict[str, Any], scraped_content: str) -> str:
     """Builds the standardized prompt for the LLM."""
     # You need to tweak the the prompt with the commmented out line 2 below if you are using the CH Dataset in entity 1, otherwise comment out the line below
     sic_code_str = ", ".join(company_data['sic_codes']) if company_data['sic_codes'] else "N/A"
     #SIC codes: {company_data['sic_code_desc']}
+    # Names from the PSC index (psc_index.py), when it has been built
+    psc_line = f"\nPeople with significant control: {', '.join(company_data['psc_names'])}" if company_data.get('psc_names') else ""
     return f"""
 You must respond with ONLY valid JSON. No other text before or after.
 
@@ -285,6 +197,7 @@ available
 based outside of the United Kingdom
 6. The website should be the official website of the business and be related to the trade described in the SIC codes, be careful it is not a website that is discussing the company only.
 7. if Entity 2 contains website URL contains open.endole.co.uk,  please check for the official website link within the page and return that instead if found.
+8. People with significant control (owners/controllers) of Entity 1 named on the website support the match, if available
 Does the information from entity 2 match the company information 
 from entity 1?
 
@@ -292,7 +205,7 @@ Entity 1:
 Company name: {company_data['company_name']}
 Company number: {company_data['company_number']}
 Address post code: {company_data['postcode']}
-SIC codes: {sic_code_str}
+SIC codes: {sic_code_str}{psc_line}
 
 Entity 2:
 {scraped_content[:15000]} 
@@ -334,8 +247,12 @@ JSON Response:
 """
     
     try:
-        response = llm_client.models.generate_content(model='gemini-2.5-flash-lite', contents=prompt)
-        parsed = parse_rejection_llm_output(response.text)
+        # Structured output against REJECTION_SCHEMA, re-asked once with the error if the reply doesn't conform;
+        # generate_llm_answer retries 429s
+        config = structured_config(REJECTION_SCHEMA)
+        answer, value, error = ask_structured(
+            lambda p: generate_llm_answer(llm_client, p, DEFAULT_MODEL, config), prompt, REJECTION_SCHEMA)
+        parsed = rejection_from_reply(answer, value, error)
         
         return {
             "is_official_website": not parsed["should_reject"],
@@ -359,38 +276,42 @@ def parse_rejection_llm_output(llm_response: str) -> Dict[str, Any]:
     """
     Parses LLM response for rejection-based validation.
     """
+    parsed, error = parse_structured(llm_response, REJECTION_SCHEMA)
+    return rejection_from_reply(llm_response, parsed, error)
+
+
+def rejection_from_reply(llm_response: str, parsed: Optional[Dict[str, Any]], error: Optional[str]) -> Dict[str, Any]:
+    """Turns a parse_structured result into the rejection dict, the fields are already type checked."""
     result = {
         "should_reject": True,  # Default to reject on parse failure (safer)
         "rejection_reasons": [],
         "reasoning": "",
         "parse_success": False
     }
-    
-    try:
-        # Clean up response - remove markdown code blocks if present
-        cleaned = llm_response.strip()
-        if cleaned.startswith("```"):
-            cleaned = re.sub(r'^```(?:json)?\s*', '', cleaned)
-            cleaned = re.sub(r'\s*```$', '', cleaned)
-        
-        # Parse JSON
-        parsed = json.loads(cleaned)
-        
-        # Extract fields
-        result["should_reject"] = bool(parsed.get("should_reject", True))
-        result["rejection_reasons"] = parsed.get("rejection_reasons", [])
-        result["reasoning"] = parsed.get("reasoning", "")
-        result["parse_success"] = True
-        
-    except (json.JSONDecodeError, KeyError, AttributeError) as e:
+    if error is not None:
         # Parsing failed - default to rejection (safer for embedded links)
-        result["reasoning"] = f"PARSE_ERROR: {llm_response[:200]}"
-        result["parse_success"] = False
-    
+        result["reasoning"] = f"PARSE_ERROR ({error}): {llm_response[:200]}"
+        return result
+
+    result["should_reject"] = parsed["should_reject"]
+    result["rejection_reasons"] = parsed["rejection_reasons"]
+    result["reasoning"] = parsed["reasoning"]
+    result["parse_success"] = True
     return result
 
 
 def main():
+    parser = argparse.ArgumentParser(description="LLM-match scraped pages, then follow the embedded links the LLM reports.")
+    parser.add_argument("--max-depth", type=int, default=MAX_DEPTH, help="levels of embedded links to follow")
+    parser.add_argument("--max-fetches", type=int, default=MAX_FETCHES, help="embedded pages fetched per run")
+    parser.add_argument("--max-llm-calls", type=int, default=MAX_LLM_CALLS, help="validation LLM calls per run")
+    parser.add_argument("--recursion-workers", type=int, default=WORKERS, help="embedded links expanded concurrently")
+    parser.add_argument("--no-prefetch", action="store_true", help="don't fetch likely embedded links while the LLM is judging")
+    parser.add_argument("--max-prefetches", type=int, default=PREFETCH_MAX_FETCHES, help="speculative fetches per run")
+    parser.add_argument("--psc-index", default=PSC_INDEX_DB,
+                        help="PSC names index built by psc_index.py, used as match evidence when the file exists")
+    args = parser.parse_args()
+
     total_skiped = 0
     print(f"Loading data from {INPUT_JSON}...")
     try:
@@ -405,16 +326,23 @@ def main():
         
     print(f"Loaded {len(all_trials_data)} trials.")
 
-    llm_client = init_gemini_client()
+    llm_client = init_llm_client()
     if not llm_client:
         sys.exit(1)
 
     analysis_results: List[Dict[str, Any]] = []
-    recursion_depth={}
+    psc = PscIndex.load(args.psc_index)
+    budget = RecursionBudget(args.max_fetches, args.max_llm_calls)
+    prefetcher = None if args.no_prefetch else SpeculativePrefetcher(max_fetches=args.max_prefetches)
+    engine = RecursionEngine(lambda company, url, markdown: validate_embedded_link(company, url, markdown, llm_client),
+                             scrape=prefetcher.fetch if prefetcher else ScrapeToMarkdown,
+                             budget=budget, max_depth=args.max_depth, workers=args.recursion_workers)
     for trial in all_trials_data:
         company_data = trial['ground_truth_data']
         company_name = company_data['company_name']
         ground_truth_url = company_data['ground_truth_url']
+        if psc:
+            psc.add_evidence(company_data)
         
         print(f"\n--- Processing Trial {trial['trial_number']}: {company_name} ---")
 
@@ -423,9 +351,12 @@ def main():
             total_skiped += 1
             continue
             
+        recursion_seeds = []  # (embedded_url, page it was found on), expanded best-first once all results are judged
+        origin_position = {}  # page URL -> position of the search result its link chain started from
         for result in trial['scraped_results']:
             scraped_url = result['link']
             scraped_pos = result['position']
+            origin_position[scraped_url] = scraped_pos
             markdown_content = result['markdown_content']
             
             print(f"  Analysing result {scraped_pos}: {scraped_url}")
@@ -437,82 +368,31 @@ def main():
             domain_fragment = get_domain_fragment(scraped_url)
             string_match_result = URL_similarity_match(company_name, domain_fragment)
             #Match on key identfiers in the marskedown content, exact company name and post code
-            Key_ID_match = check_md_match(markdown_content, company_name, company_data['company_number'])
-            # --- Rate Limit Logic ---
-            
+            Key_ID_match = check_md_match(markdown_content, company_name, company_data['company_number'],
+                                          company_data.get('psc_names'))
             llm_prompt = create_llm_prompt(company_data, markdown_content)
-            
-            MAX_RETRIES = 3 # Allow a few retries just in case
-            retries = 0
-            llm_answer = "ERROR" # Default to error
-            llm_url = ""
-            
-            while retries < MAX_RETRIES:
-                try:
-                    # Attempt the API call
-                    response = llm_client.models.generate_content(
-                        model='gemini-2.5-flash-lite', 
-                        contents=llm_prompt
-                    )
-                    llm_answer = response.text
-                    print(f"    - String Match: {string_match_result}")
-                    print(f"    - LLM Match: {llm_answer}")
-                    
-                    # If successful, break the retry loop
-                    break 
-                    
-                except Exception as e:
-                    # Check if it's the specific rate limit error
-                    if "429 RESOURCE_EXHAUSTED" in str(e):
-                        retries += 1
-                        wait_time = 60 # Wait a full minute for quota to reset
-                        print(f"    [Warn] Hit Rate Limit. Retrying {retries}/{MAX_RETRIES} in {wait_time}s...")
-                        time.sleep(wait_time)
-                    else:
-                        # It's a different, non-retryable error
-                        print(f"    [Warn] LLM generation failed (non-retryable). Error: {e}")
-                        break # Break the retry loop
-            
-            # *** Proactive Throttle REMOVED ***
-                 
-            # --- End Rate Limit Logic ---
-            llm_parsed = parse_llm_output(llm_answer)
+            if prefetcher:
+                # Overlaps fetching the likely embedded links with the LLM call below
+                prefetcher.start(scraped_url, markdown_content, company_name)
+
+            # Known aggregator layout: read the listed website from the page instead of asking the LLM
+            extracted = extract_listed_website(scraped_url, markdown_content, company_data['company_number'])
+            if extracted is not None:
+                verdict = {"is_official_website": False, "official_url": None,
+                           "found_embedded_link": extracted["website"] is not None,
+                           "embedded_url": extracted["website"], "reasoning": extracted["reasoning"]}
+                llm_answer, llm_parsed = json.dumps(verdict), {**verdict, "parse_success": True}
+            else:
+                # Structured output, re-asked once with the error if the reply doesn't conform;
+                # generate_llm_answer retries 429s
+                config = structured_config(OFFICIAL_WEBSITE_SCHEMA)
+                llm_answer, value, error = ask_structured(
+                    lambda p: generate_llm_answer(llm_client, p, DEFAULT_MODEL, config), llm_prompt, OFFICIAL_WEBSITE_SCHEMA)
+                llm_parsed = verdict_from_reply(llm_answer, value, error)
+            print(f"    - String Match: {string_match_result}")
+            print(f"    - LLM Match: {llm_answer}")
             if llm_parsed['found_embedded_link']:
-                company_number = company_data['company_number']
-                if recursion_depth.get(company_number,0) <1:
-                    embedded_url = llm_parsed['embedded_url']
-                    print(f" [Recursion] Checking :{embedded_url}")
-
-                    try:
-                        #
-                        embedded_content = ScrapeToMarkdown(embedded_url)
-                        if not embedded_content:
-                            print(f"    [Warn] Failed to scrape embedded URL: {embedded_url}")
-                            recursion_depth[company_number] = 1
-                        else:
-                            try:    
-                               recursive_result = validate_embedded_link(company_data, embedded_url, embedded_content, llm_client)
-                               analysis_results.append({
-                            "company_number": company_data['company_number'],
-                            "company_name": company_name,
-                            "scraped_result_position": f"{scraped_pos}_recursive",
-                            "scraped_result_url": embedded_url,
-                            "string_match_result": URL_similarity_match(company_name, get_domain_fragment(embedded_url)),
-                            
-                            
-                            "llm_is_official_website": recursive_result["is_official_website"],
-                            "llm_recursive_official_url": recursive_result["official_url"],
-                            "llm_recursive_reasoning": recursive_result.get('reasoning'),
-                            "llm_embedded_url": recursive_result["embedded_url"],
-                            "recurse_should_reject":recursive_result["should_reject"],
-                            "llm_parse_success": recursive_result["parse_success"]
-                        })
-                            except Exception as e:
-                              print(f"    [Warn] Recursive LLM validation failed. Error: {e}")
-                        recursion_depth[company_number] = 1
-                    except Exception as e:
-                        print(f"    [Warn] Recursive LLM validation failed. Error: {e}")
-                        recursion_depth [company_number] = 1    
+                recursion_seeds.append((llm_parsed['embedded_url'], scraped_url))
 
             row = {
                 "company_number": company_data['company_number'],
@@ -534,8 +414,40 @@ def main():
 
                  }
             analysis_results.append(row)
-            
+
+        for recursive_result in engine.expand(company_data, recursion_seeds):
+            embedded_url = recursive_result["url"]
+            # Results come back parents first, so every page's chain leads back to a search result.
+            # Depth 1 keeps the original '<pos>_recursive' label, deeper levels add '_d<depth>'
+            origin = origin_position.get(recursive_result["parent_url"], "")
+            origin_position.setdefault(embedded_url, origin)
+            depth = recursive_result['depth']
+            analysis_results.append({
+                "company_number": company_data['company_number'],
+                "company_name": company_name,
+                "scraped_result_position": f"{origin}_recursive" + (f"_d{depth}" if depth > 1 else ""),
+                "scraped_result_url": embedded_url,
+                "recursive_parent_url": recursive_result["parent_url"],
+                "recursive_score": recursive_result["score"],
+                "string_match_result": URL_similarity_match(company_name, get_domain_fragment(embedded_url)),
+                "llm_is_official_website": recursive_result["is_official_website"],
+                "llm_recursive_official_url": recursive_result["official_url"],
+                "llm_recursive_reasoning": recursive_result.get('reasoning'),
+                "llm_embedded_url": recursive_result.get("embedded_url"),
+                "recurse_should_reject": not recursive_result["is_official_website"],
+                "llm_parse_success": recursive_result["parse_success"]
+            })
+        if prefetcher:
+            prefetcher.release(company_name)  # this company's frontier is done, drop its prefetched pages
+
+    engine.close()
     print("\n--- Analysis complete. ---")
+    print(f"Recursion spend: {budget.summary()}")
+    if prefetcher:
+        prefetcher.close()
+        print(f"Speculative prefetch: {prefetcher.summary()}")
+    if psc:
+        print(psc.summary())
     if not analysis_results:
         print("No results to save. Exiting.")
         return
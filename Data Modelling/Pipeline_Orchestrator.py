@@ -0,0 +1,352 @@
+import os
+import sys
+import csv
+import json
+import time
+import asyncio
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from Scrape_Utils import extract_test_case_CH, SerphSearch, select_results_to_scrape, make_result_filename, load_companies_from_csv
+from Search_scrape_P1 import build_ground_truth, build_search_query, ground_truth_from_company
+from psc_index import PscIndex, PSC_INDEX_DB
+from Matching_P1 import (get_domain_fragment, URL_similarity_match, check_md_match,
+                         create_llm_prompt, route_llm_answer, extracted_verdict, parse_llm_output, build_analysis_row)
+from fetch_parse_pipeline import PageFetcher, ParsePool, AsyncUrlCoalescer, PARSE_WORKERS
+from host_cache import HostNegativeCache, HOST_CACHE_JSON
+from metrics import metrics, METRICS_PROM, METRICS_JSON
+from llm_clients import init_llm_client, LLM_BACKEND
+from model_router import ModelRouter
+
+# --- Configuration ---
+NUM_TRIALS = 100
+OUTPUT_CSV = "analysis_results_pipeline.csv"
+OUTPUT_PAGES_JSONL = "scraper_results_pipeline.jsonl"  # every scraped page, one JSON object per line
+
+# Workers per stage. Search and LLM are bounded by API quotas, fetch by sockets, parse by cores.
+STAGE_CONCURRENCY = {
+    "sample": 1,
+    "search": 4,
+    "fetch": 32,
+    "parse": PARSE_WORKERS,
+    "prefilter": 1,
+    "llm": 4,
+    "write": 1,
+}
+# Max items waiting in front of each stage. A full queue blocks the stage feeding it (backpressure),
+# so a slow LLM stage throttles searching/fetching instead of piling pages up in memory.
+QUEUE_SIZE = {
+    "search": 16,
+    "fetch": 64,
+    "parse": 32,
+    "prefilter": 32,
+    "llm": 16,
+    "write": 64,
+}
+# ---------------------
+
+_DONE = object()  # end-of-stream sentinel
+
+
+class Stage:
+    """
+    One pipeline stage: `workers` tasks each take an item from in_queue, await handler(item) and put
+    every item it returns onto out_queue. A handler can fan out (search -> 3 pages) or drop (return []).
+    When the input is exhausted the stage passes a single _DONE downstream.
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Awaitable[List[Any]]], in_queue: Optional[asyncio.Queue],
+                 out_queue: Optional[asyncio.Queue], workers: int):
+        self.name = name
+        self.handler = handler
+        self.in_queue = in_queue
+        self.out_queue = out_queue
+        self.workers = workers
+        self.processed = 0
+        self.busy_seconds = 0.0
+
+    async def _worker(self):
+        while True:
+            item = await self.in_queue.get()
+            if item is _DONE:
+                await self.in_queue.put(_DONE)  # let the sibling workers see it too
+                return
+            metrics.set_gauge("queue_depth", self.in_queue.qsize(), stage=self.name)
+            start = time.perf_counter()
+            try:
+                with metrics.in_flight("stage_in_flight", stage=self.name):
+                    outputs = await self.handler(item)
+            except Exception as e:
+                print(f"  [Warn] {self.name} stage failed on an item. Error: {e}")
+                metrics.inc("stage_errors_total", stage=self.name)
+                outputs = []
+            elapsed = time.perf_counter() - start
+            metrics.observe("stage_seconds", elapsed, stage=self.name)
+            self.busy_seconds += elapsed
+            self.processed += 1
+            if self.out_queue is not None:
+                for output in outputs:
+                    await self.out_queue.put(output)
+
+    async def run(self):
+        await asyncio.gather(*(self._worker() for _ in range(self.workers)))
+        if self.out_queue is not None:
+            await self.out_queue.put(_DONE)
+
+
+class PipelineOrchestrator:
+    """
+    Runs sample -> search -> fetch -> parse -> pre-filter -> LLM judge -> write as connected stages,
+    all overlapping, so the LLM is busy while later companies are still being searched and fetched.
+    Total wall-clock approaches the slowest stage rather than the sum of all of them.
+    """
+
+    def __init__(self, serper_api_key: str, llm_client, num_trials: int = NUM_TRIALS,
+                 concurrency: Dict[str, int] = None, queue_size: Dict[str, int] = None,
+                 output_csv: str = OUTPUT_CSV, output_pages: str = OUTPUT_PAGES_JSONL, backend: Optional[str] = None,
+                 host_cache_path: str = HOST_CACHE_JSON, metrics_prom: str = METRICS_PROM, metrics_json: str = METRICS_JSON,
+                 router: Optional[ModelRouter] = None, companies: Optional[List[Dict[str, Any]]] = None,
+                 psc_index: Optional[PscIndex] = None):
+        self.serper_api_key = serper_api_key
+        self.llm_client = llm_client
+        self.router = router or ModelRouter()
+        # A fixed company list (load_companies_from_csv) replaces the random test cases
+        self.companies = companies
+        self.num_trials = len(companies) if companies is not None else num_trials
+        self.psc_index = psc_index
+        self.concurrency = {**STAGE_CONCURRENCY, **(concurrency or {})}
+        self.queue_size = {**QUEUE_SIZE, **(queue_size or {})}
+        self.output_csv = output_csv
+        self.output_pages = output_pages
+        self.backend = backend
+        self.fetcher: Optional[PageFetcher] = None
+        self.parse_pool: Optional[ParsePool] = None
+        self.url_coalescer = AsyncUrlCoalescer()
+        self.host_cache = HostNegativeCache.load(host_cache_path)
+        self.metrics_prom = metrics_prom
+        self.metrics_json = metrics_json
+        self.rows: List[Dict[str, Any]] = []
+        self.companies_without_results = 0
+
+    # --- Stage handlers: each takes one item and returns the list of items for the next stage ---
+
+    async def _sample(self, trial_number: int) -> List[Dict[str, Any]]:
+        if self.companies is not None:
+            ground_truth_dict = ground_truth_from_company(self.companies[trial_number - 1])
+        else:
+            current_co = await asyncio.to_thread(extract_test_case_CH)
+            if not current_co or len(current_co) < 5:
+                print("  [Warn] Failed to extract test case. Skipping trial.")
+                return []
+            ground_truth_dict = build_ground_truth(current_co)
+        if self.psc_index:
+            self.psc_index.add_evidence(ground_truth_dict)
+        return [{"trial_number": trial_number, "ground_truth_data": ground_truth_dict,
+                 "search_query_used": build_search_query(ground_truth_dict)}]
+
+    async def _search(self, trial: Dict[str, Any]) -> List[Dict[str, Any]]:
+        results_json = await asyncio.to_thread(SerphSearch, trial["search_query_used"], self.serper_api_key)
+        if 'error' in results_json:
+            print(f"  [Warn] Search failed for trial {trial['trial_number']}.")
+            return []
+        candidates = select_results_to_scrape(results_json, top_n=3)
+        if not candidates:
+            self.companies_without_results += 1
+        # Hosts in a failure backoff are dropped here rather than tying up a fetch worker, and
+        # aggregator listings are queued after the company's other results.
+        candidates = [c for c in candidates if not self.host_cache.should_skip(c["link"])]
+        candidates.sort(key=lambda c: self.host_cache.priority(c["link"]))
+        return [{**trial, **candidate} for candidate in candidates]
+
+    async def _fetch(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        # The same URL often comes up for many companies (endole listings, group sites): only the first
+        # request fetches and parses it, the rest wait for that result and skip straight past the parse stage.
+        future, owner = self.url_coalescer.claim(page["link"])
+        if not owner:
+            markdown_content = await asyncio.shield(future)
+            return [{**page, "markdown_content": markdown_content}] if markdown_content else []
+
+        try:
+            body, error = await self.fetcher.fetch(page["link"])
+        except Exception as e:
+            body, error = None, f"Unexpected error - {e}"
+        if body is None:
+            print(f"Error fetching {page['link']}: {error}")
+            future.set_result(None)
+            return []
+        return [{**page, "raw_html": body, "url_future": future}]
+
+    async def _parse(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if "markdown_content" in page:
+            return [page]  # already converted for another company
+        raw_html = page.pop("raw_html")
+        future = page.pop("url_future")
+        try:
+            markdown_content = await self.parse_pool.parse(raw_html)
+        except Exception as e:
+            print(f"An unexpected error occurred parsing {page['link']}: {e}")
+            markdown_content = None
+        future.set_result(markdown_content)
+        return [{**page, "markdown_content": markdown_content}]
+
+    async def _prefilter(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        if not page["markdown_content"]:
+            print(f"❌ Failed to scrape this webpage: {page['link']}")
+            return []
+        company_data = page["ground_truth_data"]
+        domain_fragment = get_domain_fragment(page["link"])
+        page["string_match_result"] = URL_similarity_match(company_data['company_name'], domain_fragment)
+        page["Key_ID_match"] = check_md_match(page["markdown_content"], company_data['company_name'], company_data['company_number'],
+                                             company_data.get('psc_names'))
+        return [page]
+
+    async def _judge(self, page: Dict[str, Any]) -> List[Dict[str, Any]]:
+        extracted = extracted_verdict(page["ground_truth_data"], page["link"], page["markdown_content"])
+        if extracted is not None:
+            # Known aggregator layout: the listed website is read from the page, no LLM call
+            (page["llm_answer"], page["llm_parsed"]), page["llm_model"], page["llm_escalation"] = extracted, "extractor", ""
+            return [page]
+        llm_prompt = create_llm_prompt(page["ground_truth_data"], page["markdown_content"])
+        page["llm_answer"], page["llm_parsed"], page["llm_model"], page["llm_escalation"] = await asyncio.to_thread(
+            route_llm_answer, self.llm_client, self.router, llm_prompt, page["string_match_result"], page["Key_ID_match"])
+        return [page]
+
+    async def _write(self, page: Dict[str, Any], csv_writer: csv.DictWriter, csv_file, pages_file) -> List[Any]:
+        company_data = page["ground_truth_data"]
+        llm_parsed = page["llm_parsed"]
+        row = build_analysis_row(company_data, page["position"], page["link"], page["string_match_result"],
+                                 page["Key_ID_match"], page["llm_answer"], llm_parsed, page["llm_model"], page["llm_escalation"])
+        csv_writer.writerow(row)
+        csv_file.flush()
+        pages_file.write(json.dumps({
+            "trial_number": page["trial_number"],
+            "ground_truth_data": company_data,
+            "search_query_used": page["search_query_used"],
+            "position": page["position"],
+            "title": page["title"],
+            "link": page["link"],
+            "filename": make_result_filename(page["position"], page["link"]),
+            "markdown_content": page["markdown_content"],
+        }, ensure_ascii=False) + "\n")
+        self.rows.append(row)
+        print(f"  ✅ Trial {page['trial_number']} result {page['position']}: LLM match = {llm_parsed['is_entity1_website']}")
+        return []
+
+    async def run(self) -> List[Dict[str, Any]]:
+        # Search, sample and LLM calls are blocking client calls run in threads, size the pool to match
+        thread_workers = self.concurrency["sample"] + self.concurrency["search"] + self.concurrency["llm"]
+        asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=thread_workers))
+
+        names = ["search", "fetch", "parse", "prefilter", "llm", "write"]
+        queues = {name: asyncio.Queue(maxsize=self.queue_size[name]) for name in names}
+        sample_queue: asyncio.Queue = asyncio.Queue()
+        for trial_number in range(1, self.num_trials + 1):
+            sample_queue.put_nowait(trial_number)
+        sample_queue.put_nowait(_DONE)
+
+        fieldnames = list(build_analysis_row({"company_number": "", "company_name": ""}, 0, "", False, False, "",
+                                             parse_llm_output("{}")).keys())
+        with open(self.output_csv, 'w', newline='', encoding='utf-8') as csv_file, \
+             open(self.output_pages, 'w', encoding='utf-8') as pages_file:
+            csv_writer = csv.DictWriter(csv_file, fieldnames=fieldnames)
+            csv_writer.writeheader()
+
+            async def write(page):
+                return await self._write(page, csv_writer, csv_file, pages_file)
+
+            async with PageFetcher(self.concurrency["fetch"], host_cache=self.host_cache) as fetcher:
+                with ParsePool(self.concurrency["parse"], self.backend) as parse_pool:
+                    self.fetcher, self.parse_pool = fetcher, parse_pool
+                    stages = [
+                        Stage("sample", self._sample, sample_queue, queues["search"], self.concurrency["sample"]),
+                        Stage("search", self._search, queues["search"], queues["fetch"], self.concurrency["search"]),
+                        Stage("fetch", self._fetch, queues["fetch"], queues["parse"], self.concurrency["fetch"]),
+                        Stage("parse", self._parse, queues["parse"], queues["prefilter"], self.concurrency["parse"]),
+                        Stage("prefilter", self._prefilter, queues["prefilter"], queues["llm"], self.concurrency["prefilter"]),
+                        Stage("llm", self._judge, queues["llm"], queues["write"], self.concurrency["llm"]),
+                        Stage("write", write, queues["write"], None, self.concurrency["write"]),
+                    ]
+                    start = time.perf_counter()
+                    await asyncio.gather(*(stage.run() for stage in stages))
+                    elapsed = time.perf_counter() - start
+
+        print(f"\n--- Pipeline complete in {elapsed:.1f}s ---")
+        for stage in stages:
+            # busy time / (wall time * workers) close to 1.0 means that stage is the bottleneck
+            utilisation = stage.busy_seconds / (elapsed * stage.workers) if elapsed else 0
+            print(f"  {stage.name:<10} workers={stage.workers:<3} items={stage.processed:<6} busy={stage.busy_seconds:8.1f}s utilisation={utilisation:.0%}")
+        print(f"  {self.url_coalescer.summary()}")
+        print(f"  {self.host_cache.summary()}")
+        print(f"  {self.router.summary()}")
+        if self.psc_index:
+            print(f"  {self.psc_index.summary()}")
+        self.host_cache.save()
+        metrics.write_files(self.metrics_prom, self.metrics_json)
+        return self.rows
+
+
+def _parse_stage_settings(values: List[str], option: str) -> Dict[str, int]:
+    """Turns ['llm=8', 'fetch=64'] into {'llm': 8, 'fetch': 64}."""
+    settings = {}
+    for value in values or []:
+        name, _, number = value.partition("=")
+        if name not in STAGE_CONCURRENCY or not number.isdigit():
+            print(f"Error: bad {option} '{value}', expected <stage>=<int> with stage in {list(STAGE_CONCURRENCY)}", file=sys.stderr)
+            sys.exit(1)
+        settings[name] = int(number)
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Search, scrape and LLM-match companies as one overlapped pipeline.")
+    parser.add_argument("--trials", type=int, default=NUM_TRIALS)
+    parser.add_argument("--companies", help="CSV of companies to run (CH columns, e.g. a changed_companies_<snapshot>.csv "
+                                            "from CH_Snapshot_Diff.py) instead of --trials random test cases")
+    parser.add_argument("--concurrency", action="append", metavar="STAGE=N", help="workers for a stage, e.g. --concurrency llm=8")
+    parser.add_argument("--queue-size", action="append", metavar="STAGE=N", help="queue size in front of a stage, e.g. --queue-size fetch=128")
+    parser.add_argument("--backend", default=None, help="HTML backend (bs4, lxml, selectolax)")
+    parser.add_argument("--llm-backend", choices=["gemini", "mock"], default=LLM_BACKEND,
+                        help="'mock' answers locally, for tuning llm concurrency and retries without cost")
+    parser.add_argument("--routing-policy", default=None, help="JSON file overriding model_router's tiers, quotas and escalation policy")
+    parser.add_argument("--output", default=OUTPUT_CSV)
+    parser.add_argument("--pages-output", default=OUTPUT_PAGES_JSONL)
+    parser.add_argument("--psc-index", default=PSC_INDEX_DB, help="PSC names index from psc_index.py, used as match evidence if present")
+    parser.add_argument("--host-cache", default=HOST_CACHE_JSON, help="negative cache of failing hosts, shared across runs")
+    parser.add_argument("--metrics-prom", default=METRICS_PROM, help="Prometheus text file written at the end of the run")
+    parser.add_argument("--metrics-json", default=METRICS_JSON, help="JSON run summary (timings, counters, tokens, cost)")
+    args = parser.parse_args()
+
+    s_api_key = os.environ.get('SERPER_API_KEY')
+    if not s_api_key:
+        print("Error: SERPER_API_KEY environment variable not set.", file=sys.stderr)
+        sys.exit(1)
+    llm_client = init_llm_client(args.llm_backend)
+    if not llm_client:
+        sys.exit(1)
+
+    orchestrator = PipelineOrchestrator(
+        s_api_key, llm_client, num_trials=args.trials,
+        concurrency=_parse_stage_settings(args.concurrency, "--concurrency"),
+        queue_size=_parse_stage_settings(args.queue_size, "--queue-size"),
+        output_csv=args.output, output_pages=args.pages_output, backend=args.backend,
+        host_cache_path=args.host_cache, metrics_prom=args.metrics_prom, metrics_json=args.metrics_json,
+        router=ModelRouter.from_json(args.routing_policy),
+        companies=load_companies_from_csv(args.companies) if args.companies else None,
+        psc_index=PscIndex.load(args.psc_index),
+    )
+    rows = asyncio.run(orchestrator.run())
+
+    if not rows:
+        print("No results saved.")
+        return
+    total_companies = len({row['company_number'] for row in rows})
+    companies_with_match = len({row['company_number'] for row in rows if row['llm_is_entity1_website']})
+    print(f"Companies with ≥1 match: {companies_with_match}")
+    print(f"Recall: {companies_with_match / total_companies * 100 if total_companies else 0:.1f}%")
+    print(f"✅ Saved {len(rows)} analysis rows to **{args.output}** and pages to **{args.pages_output}**")
+    print(f" companies with no search results = {orchestrator.companies_without_results}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,127 +1,217 @@
+import os
 import requests
-from bs4 import BeautifulSoup
 from typing import Optional, List, Dict, Any
-import html2text
 import csv
 from time import sleep
 import re
 import requests
 import json
-from urllib.parse import urlparse
+from urllib.parse import urlparse, quote
 import pandas as pd
 import random
 import jellyfish
+import threading
+from concurrent.futures import Future
+from html_backends import html_to_markdown
+from host_cache import HostNegativeCache
+from metrics import metrics
+from profiling import profiler
 
 
-def should_recurse(embedded_url: str, original_url: str, company_name: str) -> bool:
+RECURSE_AGGREGATOR_DOMAINS = ['endole.co.uk', 'companieshouse.gov.uk', 'scooploop.com']
+MARKDOWN_LINK = re.compile(r'\[([^\]]*)\]\((https?://[^)\s]+)\)')
+
+
+def get_domain_fragment(url: str) -> str:
     """
-    Decide if an embedded link is worth recursing on.
+    Extracts the core domain fragment for similarity matching.
+    e.g., 'https://www.acme-ltd.co.uk/page' -> 'acme-ltd'
+    """
+    try:
+        netloc = urlparse(url).netloc
+        if netloc.startswith("www."):
+            netloc = netloc[4:]
+        return netloc.split('.')[0]
+    except Exception:
+        return ""
+
+
+def recurse_score(embedded_url: str, original_url: str, company_name: str) -> float:
+    """
+    How worth recursing on an embedded link is: 0 means don't (same domain or a known aggregator),
+    above 1 means URL_similarity_match says the domain is the company's name, otherwise the name vs
+    domain similarity ratio (kept above 0, an unrelated looking domain is still worth a low priority try).
     """
     # Don't recurse to same domain
     if urlparse(embedded_url).netloc == urlparse(original_url).netloc:
-        return False
-    
+        return 0.0
+
     # Don't recurse to known aggregators
-    aggregator_domains = ['endole.co.uk', 'companieshouse.gov.uk', 'scooploop.com']
-    if any(agg in embedded_url for agg in aggregator_domains):
-        return False
-    
-    # Optional: String similarity check on embedded URL domain
+    if any(agg in embedded_url for agg in RECURSE_AGGREGATOR_DOMAINS):
+        return 0.0
+
     domain_fragment = get_domain_fragment(embedded_url)
     if URL_similarity_match(company_name, domain_fragment):
-        return True  # High confidence, definitely recurse
-    
-    # For others, maybe recurse with lower priority
-    return True
+        return 2.0  # High confidence, definitely recurse first
+    cleaned_name, cleaned_url = _clean_string(company_name), _clean_string(domain_fragment)
+    len_sum = len(cleaned_name) + len(cleaned_url)
+    ratio = (len_sum - jellyfish.levenshtein_distance(cleaned_name, cleaned_url)) / len_sum if len_sum else 0.0
+    return max(ratio, 0.01)
+
+
+def should_recurse(embedded_url: str, original_url: str, company_name: str) -> bool:
+    """
+    Decide if an embedded link is worth recursing on.
+    """
+    return recurse_score(embedded_url, original_url, company_name) > 0
+
+
+def extract_markdown_links(markdown_content: str) -> List[Dict[str, str]]:
+    """Every [label](http...) link in a page's markdown, in page order, as {'label', 'url'} dicts."""
+    return [{"label": label.strip(), "url": url} for label, url in MARKDOWN_LINK.findall(markdown_content or "")]
+
+# --- Download limits ---
+# Only these content types are worth parsing, anything else (PDFs, images, video, zip files...) is rejected
+# from the response headers before the body is downloaded.
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml', 'text/plain')
+MAX_HTML_BYTES = 2_000_000  # bodies are truncated at this size, the LLM only ever sees the first 15000 characters anyway
+CHUNK_SIZE = 64 * 1024
+REQUEST_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+
+# --- Endpoints ---
+# Both can be pointed at replay_server.py to run offline / load test without paid quota or real sites.
+SERPER_URL = os.environ.get("SERPER_URL", "https://google.serper.dev/search")
+# When set, every page is fetched as <PAGE_REPLAY_URL>/page?url=<original url> instead of from the site
+PAGE_REPLAY_URL = os.environ.get("PAGE_REPLAY_URL")
+
+
+def resolve_fetch_url(url: str) -> str:
+    """The URL actually requested for a page: the page itself, or its replay server stand-in."""
+    if PAGE_REPLAY_URL:
+        return f"{PAGE_REPLAY_URL.rstrip('/')}/page?url={quote(url, safe='')}"
+    return url
+
+
+class ContentRejectedError(requests.exceptions.RequestException):
+    """Raised when a response is not HTML (checked from the headers before the body is read)."""
+
+
+def fetch_html(url: str, max_bytes: int = MAX_HTML_BYTES, timeout: int = 15) -> bytes:
+    """
+    Streams the body of a URL, rejecting non-HTML responses up front and
+    stopping the transfer once max_bytes have been read.
+
+    Args:
+        url: The URL of the webpage to download.
+        max_bytes: Maximum number of bytes to keep, the rest of the body is never read.
+        timeout: Connect/read timeout in seconds.
+
+    Returns:
+        The raw (possibly truncated) response body.
+
+    Raises:
+        requests.exceptions.HTTPError for 4xx/5xx responses, ContentRejectedError for
+        non-HTML responses, and the usual requests exceptions for connection problems.
+    """
+    with metrics.in_flight("fetch_in_flight"), metrics.timer("fetch_seconds"), \
+            requests.get(resolve_fetch_url(url), headers=REQUEST_HEADERS, timeout=timeout, stream=True) as response:
+        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+
+        content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+        if content_type and content_type not in HTML_CONTENT_TYPES:
+            raise ContentRejectedError(f"Non-HTML content type '{content_type}'")
+
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            body += chunk
+            if len(body) >= max_bytes:
+                del body[max_bytes:]
+                break  # closing the response drops the rest of the transfer
+    metrics.inc("fetch_bytes_total", len(body))
+
+    if body[:5] == b'%PDF-':
+        # Some servers send PDFs as text/html or with no content type at all
+        raise ContentRejectedError("Body is a PDF document")
+    return bytes(body)
 
 #scrape to markdown function
-def ScrapeToMarkdown(url: str) -> Optional[str]:
+def ScrapeToMarkdown(url: str, backend: Optional[str] = None, host_cache: Optional[HostNegativeCache] = None) -> Optional[str]:
     """
     Fetches the content of a given URL, cleans the HTML, and converts 
     the body content into a Markdown-formatted string suitable for an LLM.
+    Non-HTML responses are skipped and the download is capped at MAX_HTML_BYTES.
 
     Args:
         url: The URL of the webpage to scrape.
+        backend: HTML parser backend name (see html_backends.py), defaults to HTML_BACKEND / 'bs4'.
+        host_cache: optional HostNegativeCache (see host_cache.py). Hosts in a failure backoff are
+            skipped without a request, and host level failures (DNS, 403, 429, timeouts...) are recorded.
 
     Returns:
         A string containing the page content in Markdown format, or None on failure.
     
-    Dependancies: beautifulsoup4, html2text, requests
+    Dependancies: beautifulsoup4, html2text, requests (optionally lxml or selectolax)
     """
+    if host_cache is not None and host_cache.should_skip(url):
+        print(f"Skipping {url}: host failed recently ({host_cache.failure_class(url)})")
+        metrics.inc("fetch_requests_total", outcome="host_skipped")
+        return None
     try:
         # 1. Fetch the raw HTML content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
-
-        # 2. Parse the HTML using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # 3. Clean the HTML (Remove noise before conversion)
-        # Remove script, style, and footer/nav elements that clutter LLM context
-        for tag in soup(['script', 'style', 'nav', 'footer', 'header', 'form', 'aside']):
-            tag.decompose()
-        
-        # 4. Extract the body content
-        body_content = str(soup.body) if soup.body else str(soup)
-
-        # 5. Convert the cleaned HTML to Markdown
-        h = html2text.HTML2Text()
-        h.ignore_links = False  # Set to True if you want to remove all links
-        h.ignore_images = True  # Images are usually noise for text extraction
-        h.body_width = 0        # Don't wrap lines (better for LLM tokenizing)
-        
-        markdown_text = h.handle(body_content)
+        with profiler.stage("fetch", url=url):
+            html_bytes = fetch_html(url)
+        if host_cache is not None:
+            host_cache.record_success(url)
 
-        # Basic final cleaning to remove excessive whitespace/empty lines
-        clean_text = '\n'.join([line.strip() for line in markdown_text.splitlines() if line.strip()])
+        # 2. Parse, clean (script/style/nav/footer... removed) and convert the body to Markdown.
+        # The parser is pluggable, see html_backends.py - 'bs4' is the original BeautifulSoup + html2text pipeline.
+        with metrics.timer("parse_seconds", backend=backend or "default"), profiler.stage("parse", url=url):
+            clean_text = html_to_markdown(html_bytes, backend)
+        metrics.inc("fetch_requests_total", outcome="ok")
 
         return clean_text
 
     except requests.exceptions.HTTPError as e:
         print(f"Error fetching {url}: HTTP Error - {e}")
+        metrics.inc("fetch_requests_total", outcome="http_error")
+        if host_cache is not None:
+            host_cache.record_exception(url, e)
+        return None
+    except ContentRejectedError as e:
+        print(f"Skipping {url}: {e}")
+        metrics.inc("fetch_requests_total", outcome="rejected")
         return None
     except requests.exceptions.RequestException as e:
         print(f"Error fetching {url}: Connection/Request Error - {e}")
+        metrics.inc("fetch_requests_total", outcome="connection_error")
+        if host_cache is not None:
+            host_cache.record_exception(url, e)
         return None
     except Exception as e:
         print(f"An unexpected error occurred: {e}")
+        metrics.inc("fetch_requests_total", outcome="error")
         return None
 
-#search and scrape function function
-
-def search_and_scrape(search_query: str, api_key: str) -> List[Dict[str, Any]]:
+def select_results_to_scrape(results_json: Dict[str, Any], top_n: int = 3) -> List[Dict[str, Any]]:
     """
-    Orchestrates the full process:
-    1. Searches using Serper API.
-    2. Scrapes the TOP 3 results (filtering out .gov.uk).
-    3. Returns all data as a list of dictionaries in memory.
-    """
-    print(f"Starting search for: '{search_query}'...")
-    results_json = SerphSearch(search_query, api_key)
-
-    # This list will hold our final data
-    scraped_data = []
-
-    # --- Part 1: Handle Search Results ---
-    if 'error' in results_json:
-        print("Script terminated due to a search error.")
-        return scraped_data  # Return the empty list
+    Picks the top_n organic search results worth scraping, skipping results
+    with no link and anything on a .gov.uk domain.
 
-    # --- Part 2: Handle Scraping Top 3 Results ---
-    
-    # Get the first 3 items from the 'organic' list
-    top_results = results_json.get('organic', [])[:3]
+    Returns:
+        A list of {"position", "title", "link"} dictionaries, in search order.
+    """
+    top_results = results_json.get('organic', [])[:top_n]
 
     if not top_results:
         print("No organic search results found to scrape.")
-        return scraped_data  # Return the empty list
+        return []
 
     print(f"\nFound {len(top_results)} results. Attempting to scrape (will filter '.gov.uk')...")
 
-    # Loop over each of the top results
+    candidates = []
     for i, result in enumerate(top_results):
         url_to_scrape = result.get('link')
         title = result.get('title', f'result_{i+1}')
@@ -143,26 +233,144 @@ def search_and_scrape(search_query: str, api_key: str) -> List[Dict[str, Any]]:
             # Catch any potential URL parsing errors
             print(f"⚠️  Error parsing URL for filter: {e}. Skipping.")
             continue
-            
+
+        candidates.append({"position": position, "title": title, "link": url_to_scrape})
+    return candidates
+
+
+def make_result_filename(position: int, url: str) -> str:
+    """Builds the dynamic '<position>_<url with punctuation as _>.md' filename stored with each result."""
+    cleaned_url = re.sub(r'^https?://', '', url)
+    safe_filename_base = re.sub(r'[^a-zA-Z0-9]', '_', cleaned_url)
+    return f"{position}_{safe_filename_base}.md"
+
+# Query parameters that only track where a click came from, they never change the page
+TRACKING_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_term', 'utm_content', 'gclid', 'fbclid', 'msclkid')
+
+
+def normalise_url(url: str) -> str:
+    """
+    Normalises a URL so that trivially different links to the same page share one key.
+    Lower-cases the scheme and host, drops default ports, fragments, tracking parameters and
+    trailing slashes, and sorts the remaining query parameters.
+    e.g. 'HTTPS://Open.Endole.co.uk:443/insight/?utm_source=x#top' -> 'https://open.endole.co.uk/insight'
+    """
+    try:
+        parsed = urlparse(url.strip())
+    except Exception:
+        return url
+    scheme = parsed.scheme.lower()
+    netloc = (parsed.hostname or '').lower()
+    if parsed.port and not ((scheme == 'http' and parsed.port == 80) or (scheme == 'https' and parsed.port == 443)):
+        netloc = f"{netloc}:{parsed.port}"
+    path = parsed.path.rstrip('/')
+    query = '&'.join(sorted(
+        part for part in parsed.query.split('&')
+        if part and part.split('=', 1)[0].lower() not in TRACKING_PARAMS
+    ))
+    return f"{scheme}://{netloc}{path}" + (f"?{query}" if query else "")
+
+
+class UrlCoalescer:
+    """
+    Run-wide, thread-safe 'fetch each URL once' layer. The first caller for a normalised URL runs the
+    loader, callers arriving while it is in flight wait for that same result, and later callers get it
+    straight from memory. Failures (None) are shared too, so a dead page isn't retried by every company.
+
+    Example:
+        coalescer = UrlCoalescer()
+        markdown = coalescer.get(url, ScrapeToMarkdown)
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._results: Dict[str, Future] = {}
+        self.requests = 0
+        self.loads = 0
+
+    def get(self, url: str, loader):
+        key = normalise_url(url)
+        with self._lock:
+            self.requests += 1
+            future = self._results.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._results[key] = future
+                self.loads += 1
+        metrics.inc("url_cache_requests_total", result="miss" if owner else "hit")
+        if owner:
+            try:
+                future.set_result(loader(url))
+            except Exception as e:
+                print(f"An unexpected error occurred loading {url}: {e}")
+                future.set_result(None)
+        return future.result()
+
+    def forget(self, url: str) -> bool:
+        """Drops a URL's page from memory (a fetch in flight still completes for its waiters). Returns whether it was held."""
+        with self._lock:
+            return self._results.pop(normalise_url(url), None) is not None
+
+    def summary(self) -> str:
+        saved = self.requests - self.loads
+        return f"{self.requests} URL requests, {self.loads} fetched, {saved} served from the run cache"
+
+#search and scrape function function
+
+def search_and_scrape(search_query: str, api_key: str, url_coalescer: Optional[UrlCoalescer] = None,
+                      host_cache: Optional[HostNegativeCache] = None) -> List[Dict[str, Any]]:
+    """
+    Orchestrates the full process:
+    1. Searches using Serper API.
+    2. Scrapes the TOP 3 results (filtering out .gov.uk).
+    3. Returns all data as a list of dictionaries in memory.
+
+    If a UrlCoalescer is passed, pages already scraped for an earlier company
+    in the run (e.g. the same endole listing) are reused instead of re-fetched.
+    If a HostNegativeCache is passed, hosts that failed recently are skipped straight away.
+    """
+    print(f"Starting search for: '{search_query}'...")
+    with profiler.stage("search", query=search_query):
+        results_json = SerphSearch(search_query, api_key)
+
+    # This list will hold our final data
+    scraped_data = []
+
+    # --- Part 1: Handle Search Results ---
+    if 'error' in results_json:
+        print("Script terminated due to a search error.")
+        return scraped_data  # Return the empty list
+
+    # --- Part 2: Handle Scraping Top 3 Results ---
+    
+    # Get the first 3 items from the 'organic' list, minus anything we won't scrape
+    candidates = select_results_to_scrape(results_json, top_n=3)
+
+    if not candidates:
+        return scraped_data  # Return the empty list
+
+    # Loop over each of the top results
+    for candidate in candidates:
+        url_to_scrape = candidate['link']
+        position = candidate['position']
         print(f"URL: {url_to_scrape}")
         
         # --- Part 3: Scrape and Store Data in Memory ---
-        markdown_content = ScrapeToMarkdown(url_to_scrape)
+        if url_coalescer is not None:
+            markdown_content = url_coalescer.get(url_to_scrape, lambda url: ScrapeToMarkdown(url, host_cache=host_cache))
+        else:
+            markdown_content = ScrapeToMarkdown(url_to_scrape, host_cache=host_cache)
 
         if markdown_content:
             print("✅ Scraping Successful.")
 
-            # Create the dynamic filename string
-            cleaned_url = re.sub(r'^https?://', '', url_to_scrape)
-            safe_filename_base = re.sub(r'[^a-zA-Z0-9]', '_', cleaned_url)
-            filename = f"{position}_{safe_filename_base}.md"
-            
             # Append the data to our list
             scraped_data.append({
                 "position": position,
-                "title": title,
+                "title": candidate['title'],
                 "link": url_to_scrape,
-                "filename": filename,
+                "filename": make_result_filename(position, url_to_scrape),
                 "markdown_content": markdown_content
             })
                 
@@ -214,7 +422,7 @@ def SerphSearch(search_string: str, api_key: str) -> Dict[str, Any]:
         If an error occurs, returns a dictionary with an "error" key.
     """
     
-    url = "https://google.serper.dev/search"
+    url = SERPER_URL
     
     # 1. Prepare the payload with the dynamic search string
     payload = json.dumps({
@@ -231,7 +439,11 @@ def SerphSearch(search_string: str, api_key: str) -> Dict[str, Any]:
 
     # 3. Execute the API request
     try:
-        response = requests.request("POST", url, headers=headers, data=payload)
+        with metrics.timer("serper_request_seconds"):
+            response = requests.request("POST", url, headers=headers, data=payload)
+        metrics.inc("serper_requests_total", status=response.status_code)
+        if response.status_code == 429:
+            metrics.inc("rate_limited_total", api="serper")
         # Raise an exception for bad status codes (4xx or 5xx)
         response.raise_for_status() 
         
@@ -245,10 +457,26 @@ def SerphSearch(search_string: str, api_key: str) -> Dict[str, Any]:
     except requests.exceptions.RequestException as req_err:
         # Handle other request errors (e.g., connection errors, timeouts)
         print(f"Request error occurred: {req_err}")
+        metrics.inc("serper_requests_total", status="error")
         return {"error": f"Request Error: {req_err}"}
 
 
 
+def company_record(row: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Normalizes one CH row (CSV or DataFrame record) into the company dict load_companies_from_csv returns.
+    """
+    # Raw CH downloads pad some headers with a leading space (' CompanyNumber'), and pandas gives NaN for blanks
+    row = {key.strip(): (value if isinstance(value, str) else "") for key, value in row.items() if key}
+    return {
+        "Company number": row.get("CompanyNumber", "").strip(),
+        "Company name": row.get("CompanyName", "").strip(),
+        "Address": row.get("RegAddress.AddressLine1", "").strip(),
+        "Postcode": row.get("RegAddress.PostCode", "").strip(),
+        "Sic codes": [code.strip() for code in row.get("SICCode.SicText_1", "").split(",") if code.strip()]
+    }
+
+
 def load_companies_from_csv(filepath: str):
     """
     Loads company data from a CSV and normalizes fields.
@@ -258,14 +486,7 @@ def load_companies_from_csv(filepath: str):
     with open(filepath, newline='', encoding='utf-8') as csvfile:
         reader = csv.DictReader(csvfile)
         for i, row in enumerate(reader, start=1):
-            company = {
-                "Company number": row.get("CompanyNumber", "").strip(),
-                "Company name": row.get("CompanyName", "").strip(),
-                "Address": row.get("RegAddress.AddressLine1", "").strip(),
-                "Postcode": row.get("RegAddress.PostCode", "").strip(),
-                "Sic codes": [code.strip() for code in row.get("SICCode.SicText_1", "").split(",") if code.strip()]
-            }
-            companies.append(company)
+            companies.append(company_record(row))
             if i % 50 == 0:
                 print(f"Loaded {i} rows so far...")
     print(f"✅ Finished loading {len(companies)} companies.\n")
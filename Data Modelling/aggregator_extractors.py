@@ -0,0 +1,102 @@
+import re
+from typing import Callable, Dict, List, Optional
+
+from host_cache import get_host, AGGREGATOR_HOSTS
+from Scrape_Utils import extract_markdown_links
+
+# --- Configuration ---
+# Values an aggregator shows in its website field when it has none on record
+NO_WEBSITE_VALUES = {'unreported', 'not reported', 'n/a', 'none', 'not available', 'unknown', '-'}
+# ---------------------
+
+# An extractor takes a page's markdown and returns the listed website:
+#   {"website": url}  - the page lists one
+#   {"website": None} - the page has a website field but nothing on record ('Unreported')
+#   None              - the layout wasn't recognised, let the LLM read the page
+Extractor = Callable[[str], Optional[Dict[str, Optional[str]]]]
+
+EXTRACTORS: Dict[str, Extractor] = {}
+
+_WEBSITE_LABEL = re.compile(r'^\s*(?:\*\*)?(?:company\s+)?(?:website|web\s*site|web|url)(?:\*\*)?\s*:?\s*(.*)$', re.IGNORECASE)
+_BARE_DOMAIN = re.compile(r'^(?:https?://)?(?:www\.)?[a-z0-9-]+(?:\.[a-z0-9-]+)+(?:/\S*)?$', re.IGNORECASE)
+
+
+def register(*hosts: str) -> Callable[[Extractor], Extractor]:
+    """Decorator adding an extractor for one or more aggregator hosts (as get_host returns them)."""
+    def wrap(fn: Extractor) -> Extractor:
+        for host in hosts:
+            EXTRACTORS[host] = fn
+        return fn
+    return wrap
+
+
+def _website_from_value(value: str) -> Optional[Dict[str, Optional[str]]]:
+    """Reads a website field's value: a markdown link, a bare domain, or a 'nothing on record' marker."""
+    value = value.strip().strip('*').strip()
+    if not value:
+        return None
+    links = extract_markdown_links(value)
+    if links:
+        url = links[0]["url"]
+        return None if get_host(url) in AGGREGATOR_HOSTS else {"website": url}
+    if value.lower() in NO_WEBSITE_VALUES:
+        return {"website": None}
+    if _BARE_DOMAIN.match(value):
+        return {"website": value if value.lower().startswith("http") else f"http://{value}"}
+    return None
+
+
+def _labelled_website(lines: List[str]) -> Optional[Dict[str, Optional[str]]]:
+    """Finds a 'Website' label line and reads its value from the same line or the next non-empty one."""
+    for i, line in enumerate(lines):
+        match = _WEBSITE_LABEL.match(line)
+        if not match:
+            continue
+        value = match.group(1)
+        if not value:
+            value = next((following for following in lines[i + 1:i + 3] if following.strip()), "")
+        found = _website_from_value(value)
+        if found is not None:
+            return found
+    return None
+
+
+@register("open.endole.co.uk")
+def extract_endole(markdown_content: str) -> Optional[Dict[str, Optional[str]]]:
+    # The contact block is 'Telephone\n...\nEmail\n...\nWebsite\n[Acme.co.uk](http://www.acme.co.uk)' or 'Website\nUnreported'
+    lines = markdown_content.splitlines()
+    for i, line in enumerate(lines[:-1]):
+        if line.strip() == "Website":
+            return _website_from_value(lines[i + 1])
+    return None
+
+
+@register("uk.globaldatabase.com", "companywall.co.uk", "bringo.co.uk", "companiesintheuk.co.uk",
+          "companycheck.co.uk", "bizdb.co.uk", "check-business.co.uk")
+def extract_labelled(markdown_content: str) -> Optional[Dict[str, Optional[str]]]:
+    # These show the website as a 'Website' / 'Website:' field, on the same line or the next one
+    return _labelled_website(markdown_content.splitlines())
+
+
+def extract_listed_website(page_url: str, markdown_content: str, company_number: str) -> Optional[Dict[str, Optional[str]]]:
+    """
+    The website an aggregator page lists for the company, without an LLM call.
+    Returns {"host", "website" (url or None), "reasoning"}, or None when the page isn't from a known
+    aggregator, the layout wasn't recognised, or nothing ties the page to this company number.
+    """
+    host = get_host(page_url)
+    extractor = EXTRACTORS.get(host)
+    if extractor is None or not markdown_content:
+        return None
+    number = company_number.strip().lstrip('0')
+    # The page must be about this company: its number in the URL (endole) or the page text
+    if not number or (number not in page_url and number not in markdown_content):
+        return None
+    found = extractor(markdown_content)
+    if found is None:
+        return None
+    if found["website"]:
+        reasoning = f"{host} lists the company's website as {found['website']} (read from the page, no LLM call)."
+    else:
+        reasoning = f"{host} has no website on record for the company (read from the page, no LLM call)."
+    return {"host": host, "website": found["website"], "reasoning": reasoning}
@@ -0,0 +1,154 @@
+import os
+import sys
+import re
+import html
+import time
+import hashlib
+import argparse
+import statistics
+from difflib import SequenceMatcher
+from typing import List, Dict, Tuple
+
+from html_backends import available_backends, get_backend
+from results_store import load_scrape_results
+
+# --- Configuration ---
+INPUT_JSON = "scraper_results_Random_CH.json"
+HTML_CACHE_DIR = "html_cache"   # raw pages fetched once by --fetch, reused by every benchmark run
+REPEATS = 5                     # timings are the median of this many parses per page
+# ---------------------
+
+_MD_LINK = re.compile(r'\[([^\]]*)\]\(([^)\s]+)\)')
+
+
+def _cache_path(url: str) -> str:
+    return os.path.join(HTML_CACHE_DIR, hashlib.sha1(url.encode('utf-8')).hexdigest() + ".html")
+
+
+def load_stored_pages(json_path: str) -> List[Dict[str, str]]:
+    """Returns [{'link':..., 'markdown_content':...}] for every scraped result in a Search_scrape_P1 output (.json or store file)."""
+    all_trials_data = load_scrape_results(json_path)
+    return [result for trial in all_trials_data for result in trial['scraped_results']]
+
+
+def fetch_pages(pages: List[Dict[str, str]]) -> None:
+    """Downloads the raw HTML of every stored page into HTML_CACHE_DIR (the JSON only keeps the markdown)."""
+    from Scrape_Utils import fetch_html
+    os.makedirs(HTML_CACHE_DIR, exist_ok=True)
+    for page in pages:
+        path = _cache_path(page['link'])
+        if os.path.exists(path):
+            continue
+        try:
+            with open(path, 'wb') as f:
+                f.write(fetch_html(page['link']))
+            print(f"✅ Cached {page['link']}")
+        except Exception as e:
+            print(f"❌ Could not fetch {page['link']}: {e}")
+            if os.path.exists(path):
+                os.remove(path)
+
+
+def markdown_to_html(markdown_content: str) -> bytes:
+    """
+    Rebuilds an HTML page from stored markdown, used when a page isn't in the HTML cache so the
+    benchmark can still run offline. Noise tags are added so the strip step has work to do.
+    """
+    body = []
+    for line in markdown_content.splitlines():
+        text = _MD_LINK.sub(lambda m: f'<a href="{html.escape(m.group(2))}">{html.escape(m.group(1))}</a>', html.escape(line, quote=False))
+        heading = re.match(r'^(#{1,6})\s+(.*)', text)
+        if heading:
+            level = len(heading.group(1))
+            body.append(f"<h{level}>{heading.group(2)}</h{level}>")
+        elif re.match(r'^[*\-+]\s+', text):
+            body.append(f"<ul><li>{text[2:]}</li></ul>")
+        else:
+            body.append(f"<p>{text}</p>")
+    page = (
+        "<!DOCTYPE html><html><head><title>page</title><style>body{margin:0}</style>"
+        "<script>var x = 1;</script></head><body>"
+        "<header><nav><a href='/'>Home</a><a href='/about'>About</a></nav></header>"
+        + "\n".join(body) +
+        "<footer>Registered in England</footer><script>track();</script></body></html>"
+    )
+    return page.encode('utf-8')
+
+
+def load_html(pages: List[Dict[str, str]]) -> List[Tuple[str, bytes, str]]:
+    """Returns (link, raw html, source) per page, source is 'cache' or 'rebuilt'."""
+    loaded = []
+    for page in pages:
+        path = _cache_path(page['link'])
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                loaded.append((page['link'], f.read(), 'cache'))
+        else:
+            loaded.append((page['link'], markdown_to_html(page['markdown_content']), 'rebuilt'))
+    return loaded
+
+
+def time_backend(backend_name: str, html_bytes: bytes, repeats: int = REPEATS) -> Tuple[float, str]:
+    """Median wall time (ms) of one to_markdown call, plus the output of the last call."""
+    backend = get_backend(backend_name)
+    timings = []
+    output = ""
+    for _ in range(repeats):
+        start = time.perf_counter()
+        output = backend.to_markdown(html_bytes)
+        timings.append((time.perf_counter() - start) * 1000)
+    return statistics.median(timings), output
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-page parse time of each HTML backend on the stored scrape results.")
+    parser.add_argument("--json", default=INPUT_JSON)
+    parser.add_argument("--fetch", action="store_true", help=f"download the raw pages into {HTML_CACHE_DIR}/ first")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--per-page", action="store_true", help="print a line per page as well as the summary")
+    args = parser.parse_args()
+
+    try:
+        pages = load_stored_pages(args.json)
+    except FileNotFoundError:
+        print(f"Error: {args.json} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    if args.fetch:
+        fetch_pages(pages)
+
+    corpus = load_html(pages)
+    backends = available_backends()
+    n_cached = sum(1 for _, _, source in corpus if source == 'cache')
+    print(f"Benchmarking {backends} on {len(corpus)} pages ({n_cached} cached HTML, {len(corpus) - n_cached} rebuilt from markdown)")
+
+    times: Dict[str, List[float]] = {name: [] for name in backends}
+    similarity: Dict[str, List[float]] = {name: [] for name in backends}
+
+    for link, html_bytes, source in corpus:
+        reference = None
+        row = []
+        for name in backends:
+            ms, output = time_backend(name, html_bytes, args.repeats)
+            if reference is None:
+                reference = output  # 'bs4' is always first, everything is compared with it
+            # Line level diff: cheap enough for big pages and what matters is whether the same lines come out
+            ratio = SequenceMatcher(None, reference.splitlines(), output.splitlines()).ratio() if reference or output else 1.0
+            times[name].append(ms)
+            similarity[name].append(ratio)
+            row.append(f"{name}={ms:.2f}ms ({ratio:.2f})")
+        if args.per_page:
+            print(f"  [{source}] {link[:70]:<70} " + "  ".join(row))
+
+    print("\nbackend      median ms   mean ms   p95 ms   total s   speedup   similarity to bs4")
+    base_total = sum(times[backends[0]])
+    for name in backends:
+        t = sorted(times[name])
+        p95 = t[min(len(t) - 1, int(len(t) * 0.95))]
+        total = sum(t)
+        print(f"{name:<12} {statistics.median(t):>9.2f} {statistics.mean(t):>9.2f} {p95:>8.2f} {total / 1000:>9.2f} "
+              f"{base_total / total if total else 0:>8.1f}x {statistics.mean(similarity[name]):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
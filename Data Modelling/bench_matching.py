@@ -0,0 +1,177 @@
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import statistics
+import tracemalloc
+from typing import Any, Callable, Dict, List, Tuple
+
+from Matching_P1 import (_clean_string, URL_similarity_match, get_domain_fragment, check_md_match,
+                         parse_llm_output, create_llm_prompt)
+from html_backends import available_backends, get_backend
+from results_store import load_scrape_results
+from bench_html_backends import load_stored_pages, load_html
+
+# --- Configuration ---
+INPUT_JSON = "scraper_results_Random_CH.json"
+BASELINE_JSON = "bench_matching_baseline.json"  # written by --update-baseline, machine specific
+ROUNDS = 5              # throughput is the median of this many rounds
+MIN_ROUND_SECONDS = 0.2 # each round repeats the fixture set until at least this long
+TOLERANCE = 0.20        # flag a regression when throughput drops or allocations grow by more than this
+# ---------------------
+
+
+def load_fixtures(json_path: str) -> Dict[str, List[Tuple]]:
+    """
+    Builds the argument tuples for every benchmark from a Search_scrape_P1 output file (.json or a
+    results_store file), so the functions run on real company names, URLs and page sizes.
+    """
+    all_trials_data = load_scrape_results(json_path)
+
+    companies = [trial['ground_truth_data'] for trial in all_trials_data]
+    pages = [(trial['ground_truth_data'], result) for trial in all_trials_data for result in trial['scraped_results']]
+
+    # LLM replies aren't stored, so build the shapes the model actually returns: plain, fenced and broken JSON
+    llm_replies = []
+    for i, (company, result) in enumerate(pages):
+        reply = json.dumps({"is_entity1_website": i % 2 == 0, "official_url": result['link'], "found_embedded_link": False,
+                            "embedded_url": None, "confidence": 0.9, "reasoning": f"The page names {company['company_name']} and its postcode."})
+        llm_replies.append((reply,))
+        llm_replies.append((f"```json\n{reply}\n```",))
+    llm_replies.append(("Sorry, I can't help with that.",))
+
+    return {
+        "_clean_string": [(c['company_name'],) for c in companies],
+        "URL_similarity_match": [(c['company_name'], get_domain_fragment(r['link'])) for c, r in pages],
+        "get_domain_fragment": [(r['link'],) for _, r in pages],
+        "check_md_match": [(r['markdown_content'], c['company_name'], c['postcode']) for c, r in pages],
+        "parse_llm_output": llm_replies,
+        "create_llm_prompt": [(c, r['markdown_content']) for c, r in pages],
+    }
+
+
+def benchmark_targets(json_path: str) -> Dict[str, Tuple[Callable, List[Tuple]]]:
+    """name -> (function, list of argument tuples)."""
+    fixtures = load_fixtures(json_path)
+    targets = {
+        "_clean_string": (_clean_string, fixtures["_clean_string"]),
+        "URL_similarity_match": (URL_similarity_match, fixtures["URL_similarity_match"]),
+        "get_domain_fragment": (get_domain_fragment, fixtures["get_domain_fragment"]),
+        "check_md_match": (check_md_match, fixtures["check_md_match"]),
+        "parse_llm_output": (parse_llm_output, fixtures["parse_llm_output"]),
+        "create_llm_prompt": (create_llm_prompt, fixtures["create_llm_prompt"]),
+    }
+    # HTML -> markdown on the cached (or rebuilt) pages, once per installed backend
+    html_pages = [(html_bytes,) for _, html_bytes, _ in load_html(load_stored_pages(json_path))]
+    for name in available_backends():
+        targets[f"html_to_markdown[{name}]"] = (get_backend(name).to_markdown, html_pages)
+    return targets
+
+
+def measure_throughput(fn: Callable, cases: List[Tuple], rounds: int = ROUNDS) -> float:
+    """Median calls per second over `rounds` rounds, each looping over the cases for MIN_ROUND_SECONDS."""
+    rates = []
+    for _ in range(rounds):
+        calls = 0
+        start = time.perf_counter()
+        while True:
+            for args in cases:
+                fn(*args)
+            calls += len(cases)
+            elapsed = time.perf_counter() - start
+            if elapsed >= MIN_ROUND_SECONDS:
+                break
+        rates.append(calls / elapsed)
+    return statistics.median(rates)
+
+
+def measure_allocations(fn: Callable, cases: List[Tuple]) -> float:
+    """Mean peak bytes allocated per call (tracemalloc), run separately so it doesn't skew the timings."""
+    peaks = []
+    tracemalloc.start()
+    try:
+        for args in cases:
+            before = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            fn(*args)
+            peaks.append(tracemalloc.get_traced_memory()[1] - before)
+    finally:
+        tracemalloc.stop()
+    return statistics.mean(peaks) if peaks else 0.0
+
+
+def run(json_path: str, only: List[str] = None, rounds: int = ROUNDS) -> Dict[str, Dict[str, float]]:
+    results = {}
+    for name, (fn, cases) in benchmark_targets(json_path).items():
+        if only and not any(o in name for o in only):
+            continue
+        fn(*cases[0])  # warm up caches/lazy imports outside the measurement
+        results[name] = {
+            "cases": len(cases),
+            "ops_per_sec": round(measure_throughput(fn, cases, rounds), 1),
+            "alloc_bytes_per_call": round(measure_allocations(fn, cases), 1),
+        }
+    return results
+
+
+def compare(results: Dict[str, Dict[str, float]], baseline: Dict[str, Any], tolerance: float = TOLERANCE) -> List[str]:
+    """Returns the names of benchmarks that got slower or allocate more than tolerance allows."""
+    regressions = []
+    base = baseline.get("results", {})
+    print(f"\n{'benchmark':<28} {'ops/s':>12} {'vs base':>9} {'bytes/call':>12} {'vs base':>9}")
+    for name, r in results.items():
+        b = base.get(name)
+        speed = r["ops_per_sec"] / b["ops_per_sec"] if b and b["ops_per_sec"] else None
+        alloc = r["alloc_bytes_per_call"] / b["alloc_bytes_per_call"] if b and b["alloc_bytes_per_call"] else None
+        flag = ""
+        if (speed is not None and speed < 1 - tolerance) or (alloc is not None and alloc > 1 + tolerance):
+            regressions.append(name)
+            flag = "  <-- REGRESSION"
+        speed_txt = f"{speed:8.2f}x" if speed is not None else f"{'-':>9}"
+        alloc_txt = f"{alloc:8.2f}x" if alloc is not None else f"{'-':>9}"
+        print(f"{name:<28} {r['ops_per_sec']:>12,.0f} {speed_txt} {r['alloc_bytes_per_call']:>12,.0f} {alloc_txt}{flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmarks for the per-row matching functions.")
+    parser.add_argument("--json", default=INPUT_JSON, help="fixture source (a Search_scrape_P1 output file)")
+    parser.add_argument("--baseline", default=BASELINE_JSON)
+    parser.add_argument("--update-baseline", action="store_true", help="save this run as the new baseline")
+    parser.add_argument("--only", action="append", help="run benchmarks whose name contains this (repeatable)")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    args = parser.parse_args()
+
+    try:
+        results = run(args.json, args.only, args.rounds)
+    except FileNotFoundError:
+        print(f"Error: {args.json} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != platform.node() or baseline.get("python") != platform.python_version():
+            print(f"[Warn] Baseline was recorded on {baseline.get('machine')} / Python {baseline.get('python')}, "
+                  f"timings aren't directly comparable.")
+    else:
+        print(f"No baseline at {args.baseline}, run with --update-baseline to record one.")
+
+    regressions = compare(results, baseline, args.tolerance)
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({"machine": platform.node(), "python": platform.python_version(),
+                       "recorded": time.strftime('%Y-%m-%d %H:%M:%S'), "results": results}, f, indent=2)
+        print(f"✅ Baseline saved to **{args.baseline}**")
+    elif regressions:
+        print(f"❌ {len(regressions)} regression(s): {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
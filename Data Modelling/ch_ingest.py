@@ -0,0 +1,213 @@
+import io
+import os
+import sys
+import glob
+import zlib
+import zipfile
+import argparse
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+# pyarrow is only needed for the parquet store, sampling and full loads work without it
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# --- Configuration ---
+CHUNK_ROWS = 200_000
+WORKERS = os.cpu_count() or 1
+STORE_DIR = "ch_store"          # parquet dataset, one file per zip member: pd.read_parquet(STORE_DIR)
+PARQUET_COMPRESSION = "zstd"
+SAMPLE_SIZE = 100
+# ---------------------
+
+# One unit of parallel work: (zip path, CSV member inside it), or (csv path, None) for a plain CSV
+Member = Tuple[str, Optional[str]]
+
+
+def expand_paths(patterns: List[str]) -> List[str]:
+    """Files matching each pattern (globs allowed, e.g. 'BasicCompanyData-*-part*.zip', 'crawl/df2024-*.csv'), in order, without repeats."""
+    paths = []
+    for pattern in patterns:
+        for path in sorted(glob.glob(pattern)) or [pattern]:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+
+def zip_members(patterns: List[str], suffixes: Tuple[str, ...] = (".csv",)) -> List[Member]:
+    """
+    Every file to read: each member of the CH zip downloads (the one-file zip or the
+    BasicCompanyData-<date>-partN_M.zip parts) ending in one of suffixes, and any plain paths as they are.
+    """
+    members = []
+    for path in expand_paths(patterns):
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                members.extend((path, name) for name in sorted(archive.namelist()) if name.lower().endswith(suffixes))
+        else:
+            members.append((path, None))
+    return members
+
+
+def member_name(member: Member) -> str:
+    path, name = member
+    return f"{os.path.basename(path)}:{name}" if name else os.path.basename(path)
+
+
+@contextmanager
+def open_member(member: Member) -> Iterator[IO[str]]:
+    """A text stream over one member, decompressed as it is read, so nothing is extracted to disk."""
+    path, name = member
+    with (zipfile.ZipFile(path) if name else open(path, 'rb')) as source:
+        with (source.open(name) if name else source) as raw:
+            yield io.TextIOWrapper(raw, encoding="utf-8", errors="replace", newline="")
+
+
+def iter_member_chunks(member: Member, chunk_rows: int = CHUNK_ROWS,
+                       columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Streams one CSV member in chunks of strings, decompressing as it reads, so nothing is extracted
+    to disk. The stray leading spaces in CH headers (' CompanyNumber') are stripped, and columns
+    (stripped names) limits what is parsed.
+    """
+    usecols = (lambda column: column.strip() in columns) if columns else None
+    with open_member(member) as text:
+        for chunk in pd.read_csv(text, chunksize=chunk_rows, dtype=str, usecols=usecols):
+            chunk.columns = chunk.columns.str.strip()
+            yield chunk
+
+
+def run_parallel(fn: Callable, tasks: List[tuple], workers: int) -> list:
+    """fn(*task) for every task, one member per worker process (in this process when there's only one)."""
+    workers = min(workers, len(tasks))
+    if workers <= 1:
+        return [fn(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(fn, *zip(*tasks)))
+
+
+# --- Columnar store ---
+
+def _member_to_parquet(member: Member, out_path: str, chunk_rows: int, columns: Optional[List[str]]) -> int:
+    writer = None
+    rows = 0
+    tmp_path = out_path + ".tmp"
+    try:
+        for chunk in iter_member_chunks(member, chunk_rows, columns):
+            if writer is None:
+                # Every column is a string, fixed up front so an all-empty column in a later chunk can't change the schema
+                schema = pa.schema([(column, pa.string()) for column in chunk.columns])
+                writer = pq.ParquetWriter(tmp_path, schema, compression=PARQUET_COMPRESSION)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    if writer is not None:
+        os.replace(tmp_path, out_path)
+    return rows
+
+
+def ingest_to_parquet(patterns: List[str], store_dir: str = STORE_DIR, workers: int = WORKERS,
+                      chunk_rows: int = CHUNK_ROWS, columns: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Converts the CH download into a parquet dataset under store_dir, one file per member, with the
+    members parsed in parallel processes. Returns rows written per member.
+    """
+    if pq is None:
+        raise ImportError("pyarrow is required for the parquet store (pip install pyarrow)")
+    members = zip_members(patterns)
+    os.makedirs(store_dir, exist_ok=True)
+    tasks = []
+    for member in members:
+        stem = os.path.splitext(os.path.basename(member[1] or member[0]))[0]
+        tasks.append((member, os.path.join(store_dir, f"{stem}.parquet"), chunk_rows, columns))
+    rows = run_parallel(_member_to_parquet, tasks, workers)
+    return {member_name(member): n for member, n in zip(members, rows)}
+
+
+# --- Sampler ---
+
+def _member_sample(member: Member, n: int, seed: int, chunk_rows: int, columns: Optional[List[str]]) -> pd.DataFrame:
+    # Bottom-n rows by an independent uniform key is a uniform sample without replacement, and the
+    # bottom-n of the members' bottom-n samples is one for the whole register.
+    rng = np.random.default_rng([seed, zlib.crc32(member_name(member).encode())])
+    best = None
+    for chunk in iter_member_chunks(member, chunk_rows, columns):
+        chunk = chunk.assign(_sample_key=rng.random(len(chunk)))
+        best = chunk.nsmallest(n, "_sample_key") if best is None else \
+            pd.concat([best, chunk], ignore_index=True).nsmallest(n, "_sample_key")
+    return best if best is not None else pd.DataFrame()
+
+
+def sample_companies(patterns: List[str], n: int = SAMPLE_SIZE, seed: Optional[int] = None, workers: int = WORKERS,
+                     chunk_rows: int = CHUNK_ROWS, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """A uniform random sample of n companies across every member, each member scanned in its own process."""
+    seed = int(np.random.SeedSequence().entropy % 2**32) if seed is None else seed
+    tasks = [(member, n, seed, chunk_rows, columns) for member in zip_members(patterns)]
+    samples = [sample for sample in run_parallel(_member_sample, tasks, workers) if not sample.empty]
+    if not samples:
+        return pd.DataFrame()
+    return pd.concat(samples, ignore_index=True).nsmallest(n, "_sample_key").drop(columns="_sample_key").reset_index(drop=True)
+
+
+# --- Full load ---
+
+def _read_member(member: Member, chunk_rows: int, columns: Optional[List[str]]) -> pd.DataFrame:
+    chunks = list(iter_member_chunks(member, chunk_rows, columns))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+
+def read_companies(patterns: List[str], workers: int = WORKERS, chunk_rows: int = CHUNK_ROWS,
+                   columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """The whole register as one DataFrame of strings, the members parsed in parallel processes."""
+    tasks = [(member, chunk_rows, columns) for member in zip_members(patterns)]
+    frames = [frame for frame in run_parallel(_read_member, tasks, workers) if not frame.empty]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stream the Companies House zip download (no extraction) into a parquet "
+                                                 "store or a random company sample.")
+    parser.add_argument("action", choices=["parquet", "sample"])
+    parser.add_argument("paths", nargs="+", help="CH zip files (one-file or parts) or CSVs, globs allowed")
+    parser.add_argument("--store-dir", default=STORE_DIR, help="parquet output directory (parquet)")
+    parser.add_argument("-n", "--size", type=int, default=SAMPLE_SIZE, help="companies to sample (sample)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", default="ch_sample.csv", help="sample CSV, feed it to Search_scrape_P1 --companies (sample)")
+    parser.add_argument("--columns", nargs="*", default=None, help="only these columns (stripped CH header names)")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    members = zip_members(args.paths)
+    if not members:
+        print("Error: no CSV members found.", file=sys.stderr)
+        sys.exit(1)
+    print(f"Reading {len(members)} member(s) with {min(args.workers, len(members))} worker(s): "
+          f"{', '.join(member_name(member) for member in members)}")
+
+    if args.action == "parquet":
+        try:
+            rows = ingest_to_parquet(args.paths, args.store_dir, args.workers, args.chunk_rows, args.columns)
+        except ImportError as e:
+            print(f"Error: {e}", file=sys.stderr)
+            sys.exit(1)
+        for name, n in rows.items():
+            print(f"  {name}: {n:,} rows")
+        print(f"✅ {sum(rows.values()):,} companies saved to the parquet store **{args.store_dir}**")
+    else:
+        sample = sample_companies(args.paths, args.size, args.seed, args.workers, args.chunk_rows, args.columns)
+        sample.to_csv(args.output, index=False)
+        print(f"✅ Sample of {len(sample)} companies saved to **{args.output}**")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+import re
+import sys
+import zlib
+import argparse
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+import numpy as np
+import pandas as pd
+
+from ch_ingest import zip_members, iter_member_chunks, member_name, run_parallel, Member, CHUNK_ROWS, WORKERS
+from results_store import load_scrape_results
+
+# --- Configuration ---
+TOP_N = 100                     # companies written, i.e. the search budget of one run
+OUTPUT_CSV = "ch_triage.csv"
+# Filters: companies failing any of these are very unlikely to have a website of their own
+KEEP_STATUSES = ["Active"]
+EXCLUDE_ACCOUNT_CATEGORIES = ["DORMANT", "NO ACCOUNTS FILED"]
+EXCLUDE_COMPANY_CATEGORIES = ["Limited Partnership", "Scottish Partnership", "Overseas Entity",
+                              "Investment Company with Variable Capital", "Other company type"]
+EXCLUDE_SIC_CODES = ["99999", "74990"]     # dormant company, non-trading company
+MIN_AGE_YEARS = 0.5             # too new for a website to be indexed yet
+MAX_ACCOUNTS_AGE_YEARS = 2      # last accounts older than this (or none after this long) looks defunct
+# Ranking: the company's best SIC hit rate times a size prior from its accounts category
+ACCOUNT_CATEGORY_WEIGHTS = {
+    "FULL": 1.5, "GROUP": 1.5, "MEDIUM": 1.4, "SMALL": 1.2, "AUDITED ABRIDGED": 1.1,
+    "UNAUDITED ABRIDGED": 1.0, "TOTAL EXEMPTION FULL": 1.0, "TOTAL EXEMPTION SMALL": 1.0, "MICRO ENTITY": 0.8,
+}
+DEFAULT_HIT_RATE = 0.35         # used until there is any history
+PRIOR_STRENGTH = 5              # pseudo-companies shrinking a SIC's hit rate towards its division's
+TRIAGE_COLUMNS = ["CompanyName", "CompanyNumber", "RegAddress.AddressLine1", "RegAddress.PostCode", "CompanyCategory",
+                  "CompanyStatus", "IncorporationDate", "Accounts.AccountCategory", "Accounts.LastMadeUpDate",
+                  "SICCode.SicText_1", "SICCode.SicText_2", "SICCode.SicText_3", "SICCode.SicText_4"]
+# ---------------------
+
+SIC_COLUMNS = ["SICCode.SicText_1", "SICCode.SicText_2", "SICCode.SicText_3", "SICCode.SicText_4"]
+_SIC_CODE = re.compile(r'\d{5}')
+
+
+class HitRates:
+    """
+    Historic share of companies for which a run found the website, per SIC code. A SIC code's rate is
+    shrunk towards its division's (first two digits), and the division's towards the overall rate,
+    by PRIOR_STRENGTH pseudo-companies, so a code seen twice doesn't jump to 0% or 100%. Also keeps
+    the company numbers already searched, so triage doesn't hand them to search again.
+
+    Example:
+        rates = HitRates.from_history(["scraper_results_Random_CH.json"], ["analysis_results_CH_random.csv"])
+        rates.rate("62020")
+    """
+
+    def __init__(self):
+        self.companies = 0
+        self.hits = 0
+        self.by_code: Dict[str, List[int]] = defaultdict(lambda: [0, 0])      # code -> [companies, hits]
+        self.by_division: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+        self.searched: Set[str] = set()                                        # zero-padded company numbers
+
+    def add(self, sic_codes: List[str], hit: bool) -> None:
+        self.companies += 1
+        self.hits += hit
+        for code in set(sic_codes):
+            for table, key in ((self.by_code, code), (self.by_division, code[:2])):
+                table[key][0] += 1
+                table[key][1] += hit
+
+    @classmethod
+    def from_history(cls, results_paths: List[str], analysis_csvs: List[str]) -> "HitRates":
+        """
+        Companies searched in earlier runs (Search_scrape_P1 output, with their SIC codes) and whether
+        Matching_P1 found a website for any of their results. A company with no search results is a miss.
+        """
+        matched = set()
+        for path in analysis_csvs:
+            rows = pd.read_csv(path, dtype={"company_number": str}, usecols=["company_number", "llm_is_entity1_website"])
+            found = rows["llm_is_entity1_website"].astype(str).str.lower() == "true"
+            matched.update(rows.loc[found, "company_number"].str.zfill(8))
+        rates = cls()
+        for path in results_paths:
+            for trial in load_scrape_results(path):
+                company = trial["ground_truth_data"]
+                number = str(company["company_number"]).zfill(8)
+                if number in rates.searched:
+                    continue
+                rates.searched.add(number)
+                rates.add(_SIC_CODE.findall(str(company.get("sic_code_no", ""))), number in matched)
+        return rates
+
+    def overall(self) -> float:
+        if not self.companies:
+            return DEFAULT_HIT_RATE
+        return (self.hits + PRIOR_STRENGTH * DEFAULT_HIT_RATE) / (self.companies + PRIOR_STRENGTH)
+
+    def tables(self) -> Tuple[Dict[str, float], Dict[str, float], float, float]:
+        """
+        Smoothed (code -> rate, division -> rate, overall rate, no-SIC rate), for vectorised lookups.
+        A company with no SIC code gets the lowest known code's rate (at most the overall rate), so
+        filing no SIC can never outrank a code with a track record.
+        """
+        overall = self.overall()
+        divisions = {division: (hits + PRIOR_STRENGTH * overall) / (n + PRIOR_STRENGTH)
+                     for division, (n, hits) in self.by_division.items()}
+        codes = {code: (hits + PRIOR_STRENGTH * divisions.get(code[:2], overall)) / (n + PRIOR_STRENGTH)
+                 for code, (n, hits) in self.by_code.items()}
+        return codes, divisions, overall, min([overall, *codes.values()])
+
+    def rate(self, code: str) -> float:
+        codes, divisions, overall, no_sic = self.tables()
+        if not code:
+            return no_sic
+        return codes.get(code, divisions.get(code[:2], overall))
+
+    def summary(self) -> str:
+        return (f"hit rates from {self.companies} historic companies ({self.hits} matched), "
+                f"{len(self.by_code)} SIC codes, overall {self.overall():.0%}")
+
+
+def _years_since(dates: pd.Series, today: pd.Timestamp) -> pd.Series:
+    return (today - pd.to_datetime(dates, errors="coerce", dayfirst=True)).dt.days / 365.25
+
+
+def triage_chunk(chunk: pd.DataFrame, tables: Tuple[Dict[str, float], Dict[str, float], float, float],
+                 today: pd.Timestamp, searched: Set[str] = frozenset()) -> Tuple[pd.DataFrame, Dict[str, int]]:
+    """
+    Applies the filters to one chunk of CH rows and scores the survivors, all as column operations.
+    Companies in searched (zero-padded numbers from earlier runs) are dropped. Returns the kept rows
+    with triage_score / triage_sic_rate columns and the rows dropped per filter.
+    """
+    codes, divisions, overall, no_sic = tables
+
+    def column(name: str) -> pd.Series:
+        return chunk[name].fillna("").str.strip() if name in chunk else pd.Series("", index=chunk.index)
+
+    sic = pd.DataFrame({name: column(name).str.extract(r'^(\d{5})', expand=False) for name in SIC_COLUMNS})
+    age = _years_since(column("IncorporationDate"), today)
+    accounts_age = _years_since(column("Accounts.LastMadeUpDate"), today)
+
+    # Each filter only counts the rows it drops that no earlier filter already dropped
+    filters = {
+        "already_searched": column("CompanyNumber").str.zfill(8).isin(searched),
+        "status": ~column("CompanyStatus").isin(KEEP_STATUSES),
+        "account_category": column("Accounts.AccountCategory").str.upper().isin(EXCLUDE_ACCOUNT_CATEGORIES),
+        "company_category": column("CompanyCategory").isin(EXCLUDE_COMPANY_CATEGORIES),
+        "dormant_sic": sic.isin(EXCLUDE_SIC_CODES).any(axis=1),
+        "too_new": age < MIN_AGE_YEARS,
+        "stale_accounts": (accounts_age > MAX_ACCOUNTS_AGE_YEARS)
+                          | (accounts_age.isna() & (age > MAX_ACCOUNTS_AGE_YEARS)),
+    }
+    dropped = pd.Series(False, index=chunk.index)
+    counts = {}
+    for name, mask in filters.items():
+        counts[name] = int((mask & ~dropped).sum())
+        dropped |= mask
+
+    kept = chunk[~dropped]
+    sic = sic[~dropped]
+    # A code's rate, else its division's, else the overall rate; a company scores its best code
+    rates = pd.DataFrame({name: sic[name].map(codes).fillna(sic[name].str[:2].map(divisions)) for name in SIC_COLUMNS})
+    sic_rate = rates.max(axis=1).fillna(overall).where(sic.notna().any(axis=1), no_sic)
+    weight = column("Accounts.AccountCategory")[~dropped].str.upper().map(ACCOUNT_CATEGORY_WEIGHTS).fillna(1.0)
+    return kept.assign(triage_score=(sic_rate * weight).round(4), triage_sic_rate=sic_rate.round(4)), counts
+
+
+def _top(scored: pd.DataFrame, n: int) -> pd.DataFrame:
+    # Highest score first, equal scores (common: many companies share a SIC code) in random tie-break order
+    return scored.sort_values(["triage_score", "_tiebreak"], ascending=[False, True], kind="stable").head(n)
+
+
+def _triage_member(member: Member, tables, searched: Set[str], top_n: int, today: pd.Timestamp,
+                   chunk_rows: int, seed: int) -> Dict[str, Any]:
+    # Seeded per member like ch_ingest's sampler, so a run is reproducible whatever the worker count
+    rng = np.random.default_rng([seed, zlib.crc32(member_name(member).encode())])
+    best = None
+    counts: Dict[str, int] = defaultdict(int)
+    rows = kept = 0
+    rate_sum = 0.0
+    for chunk in iter_member_chunks(member, chunk_rows, TRIAGE_COLUMNS):
+        scored, dropped = triage_chunk(chunk, tables, today, searched)
+        scored = scored.assign(_tiebreak=rng.random(len(scored)))
+        rows += len(chunk)
+        kept += len(scored)
+        rate_sum += float(scored["triage_sic_rate"].sum())
+        for name, n in dropped.items():
+            counts[name] += n
+        best = _top(scored, top_n) if best is None else _top(pd.concat([best, scored], ignore_index=True), top_n)
+    return {"top": best if best is not None else pd.DataFrame(), "rows": rows, "kept": kept,
+            "rate_sum": rate_sum, "dropped": dict(counts)}
+
+
+def triage(patterns: List[str], rates: HitRates, top_n: int = TOP_N, workers: int = WORKERS,
+           chunk_rows: int = CHUNK_ROWS, seed: Optional[int] = None) -> Tuple[pd.DataFrame, Dict[str, Any]]:
+    """
+    Filters and ranks every company in the CH download (zips or CSVs, members scanned in parallel)
+    not already searched in the history, and returns the top_n by triage_score (ties broken at
+    random, reproducibly for a given seed), plus run statistics.
+    """
+    today = pd.Timestamp.today()
+    seed = int(np.random.SeedSequence().entropy % 2**32) if seed is None else seed
+    tasks = [(member, rates.tables(), rates.searched, top_n, today, chunk_rows, seed) for member in zip_members(patterns)]
+    parts = run_parallel(_triage_member, tasks, workers)
+
+    stats = {"rows": sum(p["rows"] for p in parts), "kept": sum(p["kept"] for p in parts), "dropped": defaultdict(int)}
+    for part in parts:
+        for name, n in part["dropped"].items():
+            stats["dropped"][name] += n
+    stats["mean_rate_kept"] = sum(p["rate_sum"] for p in parts) / stats["kept"] if stats["kept"] else 0.0
+    tops = [p["top"] for p in parts if not p["top"].empty]
+    if not tops:
+        return pd.DataFrame(), stats
+    top = _top(pd.concat(tops, ignore_index=True), top_n).drop(columns="_tiebreak").reset_index(drop=True)
+    return top, stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Filter the CH register down to companies likely to have a website and "
+                                                 "rank them by SIC hit rate, so search goes to high-yield companies first.")
+    parser.add_argument("paths", nargs="+", help="CH zip download(s) or CSV, globs allowed")
+    parser.add_argument("--history", nargs="*", default=[], metavar="RESULTS",
+                        help="earlier Search_scrape_P1 outputs (.json or results_store files), for the SIC hit rates")
+    parser.add_argument("--analysis", nargs="*", default=[], metavar="CSV",
+                        help="the Matching_P1 analysis CSVs for those runs (llm_is_entity1_website per result)")
+    parser.add_argument("--top", type=int, default=TOP_N, help="companies to keep")
+    parser.add_argument("--output", default=OUTPUT_CSV, help="ranked companies, feed to Search_scrape_P1 --companies")
+    parser.add_argument("--workers", type=int, default=WORKERS)
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--seed", type=int, default=None, help="seed for the order of equally scored companies")
+    args = parser.parse_args()
+
+    if bool(args.history) != bool(args.analysis):
+        parser.error("--history and --analysis go together")
+    rates = HitRates.from_history(args.history, args.analysis)
+    print(f"Triage using {rates.summary()}")
+
+    top, stats = triage(args.paths, rates, args.top, args.workers, args.chunk_rows, args.seed)
+    if top.empty:
+        print("Error: no companies passed the filters.", file=sys.stderr)
+        sys.exit(1)
+    top.to_csv(args.output, index=False)
+
+    print(f"\nScanned {stats['rows']:,} companies, {stats['kept']:,} passed the filters")
+    for name, n in stats["dropped"].items():
+        print(f"  dropped {name:<17} {n:,}")
+    print(f"Expected hit rate: top {len(top)} {top['triage_sic_rate'].mean():.0%} "
+          f"vs {stats['mean_rate_kept']:.0%} for a random filtered company")
+    print(f"✅ Ranked companies saved to **{args.output}**")
+
+
+if __name__ == "__main__":
+    main()
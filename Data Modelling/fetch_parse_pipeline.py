@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import asyncio
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Optional, Tuple
+
+import aiohttp
+
+from Scrape_Utils import HTML_CONTENT_TYPES, MAX_HTML_BYTES, CHUNK_SIZE, REQUEST_HEADERS, normalise_url, resolve_fetch_url
+from html_backends import html_to_markdown
+from host_cache import HostNegativeCache, classify_status, classify_exception
+from metrics import metrics
+
+# --- Configuration ---
+FETCH_CONCURRENCY = 32     # simultaneous HTTP requests (I/O bound, one event loop)
+PARSE_WORKERS = os.cpu_count() or 4  # processes doing HTML cleaning + markdown conversion (CPU bound)
+QUEUE_SIZE = 64            # max raw pages waiting to be parsed, fetchers block when it's full
+FETCH_TIMEOUT = 15         # seconds, same as ScrapeToMarkdown
+# ---------------------
+
+_DONE = object()  # queue sentinel
+
+
+class PageFetcher:
+    """
+    Async, streaming equivalent of Scrape_Utils.fetch_html: non-HTML responses are rejected from
+    the headers and the body is capped at max_bytes. Returns raw bytes, no decoding happens here.
+    With a HostNegativeCache, hosts in a failure backoff are refused without a request and
+    host level failures are recorded.
+    """
+
+    def __init__(self, concurrency: int = FETCH_CONCURRENCY, max_bytes: int = MAX_HTML_BYTES, timeout: int = FETCH_TIMEOUT,
+                 host_cache: Optional[HostNegativeCache] = None):
+        self.host_cache = host_cache
+        self.max_bytes = max_bytes
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.session: Optional[aiohttp.ClientSession] = None
+        self.concurrency = concurrency
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit=self.concurrency, ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(headers=REQUEST_HEADERS, timeout=self.timeout, connector=connector)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.session.close()
+
+    async def fetch(self, url: str) -> Tuple[Optional[bytes], Optional[str]]:
+        """Returns (raw body, None) on success or (None, error description) on failure."""
+        if self.host_cache is not None and self.host_cache.should_skip(url):
+            metrics.inc("fetch_requests_total", outcome="host_skipped")
+            return None, f"Host failed recently ({self.host_cache.failure_class(url)}), skipped"
+        async with self.semaphore:
+            with metrics.in_flight("fetch_in_flight"), metrics.timer("fetch_seconds"):
+                body, error, outcome = await self._fetch(url)
+        metrics.inc("fetch_requests_total", outcome=outcome)
+        if body is not None:
+            metrics.inc("fetch_bytes_total", len(body))
+        return body, error
+
+    async def _fetch(self, url: str) -> Tuple[Optional[bytes], Optional[str], str]:
+        # Same as fetch() plus an outcome label for the metrics
+        try:
+            async with self.session.get(resolve_fetch_url(url)) as response:
+                if response.status >= 400:
+                    self._record_failure(url, classify_status(response.status), response.status)
+                    return None, f"HTTP Error - {response.status} {response.reason}", "http_error"
+                content_type = response.headers.get('Content-Type', '').split(';')[0].strip().lower()
+                if content_type and content_type not in HTML_CONTENT_TYPES:
+                    return None, f"Non-HTML content type '{content_type}'", "rejected"
+
+                chunks = []
+                read = 0
+                async for chunk in response.content.iter_chunked(CHUNK_SIZE):
+                    if read + len(chunk) >= self.max_bytes:
+                        chunks.append(chunk[:self.max_bytes - read])  # trim the last chunk, not the joined body
+                        break  # leaving the context manager drops the rest of the transfer
+                    chunks.append(chunk)
+                    read += len(chunk)
+            if self.host_cache is not None:
+                self.host_cache.record_success(url)
+            # One join = the only copy of the body before it's handed to the parse pool
+            body = b''.join(chunks)
+            if body[:5] == b'%PDF-':
+                return None, "Body is a PDF document", "rejected"
+            return body, None, "ok"
+        except asyncio.TimeoutError:
+            self._record_failure(url, "timeout", "Timeout")
+            return None, "Timeout", "timeout"
+        except aiohttp.ClientError as e:
+            self._record_failure(url, classify_exception(e), e)
+            return None, f"Connection/Request Error - {e}", "connection_error"
+        except Exception as e:
+            # e.g. a bad URL (ValueError) or a broken response: fail this page, not the whole gather
+            return None, f"Unexpected error - {type(e).__name__}: {e}", "error"
+
+    def _record_failure(self, url: str, failure_class: Optional[str], error) -> None:
+        if self.host_cache is not None:
+            self.host_cache.record_failure(url, failure_class, str(error))
+
+
+def _parse_page(html_bytes: bytes, backend: Optional[str]) -> str:
+    # Runs in a worker process: top level so it can be pickled
+    return html_to_markdown(html_bytes, backend)
+
+
+class ParsePool:
+    """
+    Process pool for the CPU-bound HTML -> markdown step, so parsing scales with cores instead of
+    sharing one interpreter (and its GIL) with the network code. The raw bytes object is sent as is,
+    bytes pickle as a single buffer so nothing is decoded or re-encoded on the way.
+    """
+
+    def __init__(self, workers: int = PARSE_WORKERS, backend: Optional[str] = None):
+        self.workers = workers
+        self.backend = backend
+        self.executor: Optional[ProcessPoolExecutor] = None
+
+    def __enter__(self):
+        self.executor = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, *exc):
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+    async def parse(self, html_bytes: bytes) -> str:
+        loop = asyncio.get_running_loop()
+        # Timed from here: includes the wait for a free worker, which is what the pipeline sees
+        with metrics.timer("parse_seconds", backend=self.backend or "default"):
+            return await loop.run_in_executor(self.executor, _parse_page, html_bytes, self.backend)
+
+
+class AsyncUrlCoalescer:
+    """
+    asyncio counterpart of Scrape_Utils.UrlCoalescer: one fetch + parse per normalised URL per run.
+    claim() tells the caller whether it owns the load (and must resolve the future, or abandon() it) or
+    should wait on it.
+    """
+
+    def __init__(self):
+        self._results: Dict[str, asyncio.Future] = {}
+        self.requests = 0
+        self.loads = 0
+
+    def claim(self, url: str) -> Tuple[asyncio.Future, bool]:
+        self.requests += 1
+        key = normalise_url(url)
+        future = self._results.get(key)
+        metrics.inc("url_cache_requests_total", result="miss" if future is None else "hit")
+        if future is not None:
+            return future, False
+        future = asyncio.get_running_loop().create_future()
+        self._results[key] = future
+        self.loads += 1
+        return future, True
+
+    def abandon(self, url: str, future: asyncio.Future) -> None:
+        """Cancels an owner's unresolved future so waiters aren't left hanging, the next claim loads the URL again."""
+        if not future.done():
+            future.cancel()
+        key = normalise_url(url)
+        if self._results.get(key) is future:
+            del self._results[key]
+
+    async def get(self, url: str, loader) -> Optional[str]:
+        """Awaits loader(url) once per normalised URL, everyone else shares the result (None on failure)."""
+        future, owner = self.claim(url)
+        if owner:
+            try:
+                future.set_result(await loader(url))
+            except Exception as e:
+                print(f"An unexpected error occurred loading {url}: {e}")
+                future.set_result(None)
+            finally:
+                # Only still pending if the owner was cancelled mid-load
+                if not future.done():
+                    self.abandon(url, future)
+        return await asyncio.shield(future)
+
+    def summary(self) -> str:
+        saved = self.requests - self.loads
+        return f"{self.requests} URL requests, {self.loads} fetched, {saved} served from the run cache"
+
+
+class FetchParsePipeline:
+    """
+    Two stage pipeline: async fetchers push raw pages into a bounded queue, parse dispatchers pull
+    them and run the conversion in the process pool. When the pool falls behind the queue fills and
+    the fetchers wait, so memory stays bounded by QUEUE_SIZE * max_bytes.
+
+    Example:
+        results = fetch_and_parse(["https://www.example.co.uk", ...])
+        results["https://www.example.co.uk"]  # markdown, or None if the fetch/parse failed
+    """
+
+    def __init__(self, fetch_concurrency: int = FETCH_CONCURRENCY, parse_workers: int = PARSE_WORKERS,
+                 queue_size: int = QUEUE_SIZE, backend: Optional[str] = None, max_bytes: int = MAX_HTML_BYTES,
+                 host_cache: Optional[HostNegativeCache] = None):
+        self.fetch_concurrency = fetch_concurrency
+        self.parse_workers = parse_workers
+        self.queue_size = queue_size
+        self.backend = backend
+        self.max_bytes = max_bytes
+        self.host_cache = host_cache
+        self.errors: Dict[str, str] = {}
+
+    async def _fetch_stage(self, fetcher: PageFetcher, url_queue: asyncio.Queue, raw_queue: asyncio.Queue, results: Dict[str, Optional[str]]):
+        while True:
+            url = await url_queue.get()
+            if url is _DONE:
+                return
+            body, error = await fetcher.fetch(url)
+            if body is None:
+                print(f"Error fetching {url}: {error}")
+                self.errors[url] = error
+                results[url] = None
+                continue
+            await raw_queue.put((url, body))  # blocks while the parse stage is behind
+
+    async def _parse_stage(self, pool: ParsePool, raw_queue: asyncio.Queue, results: Dict[str, Optional[str]]):
+        while True:
+            item = await raw_queue.get()
+            if item is _DONE:
+                return
+            url, body = item
+            try:
+                results[url] = await pool.parse(body)
+            except Exception as e:
+                print(f"An unexpected error occurred parsing {url}: {e}")
+                self.errors[url] = f"Parse error - {e}"
+                results[url] = None
+
+    async def run(self, urls: Iterable[str]) -> Dict[str, Optional[str]]:
+        urls = list(dict.fromkeys(urls))  # de-duplicate, keep order
+        results: Dict[str, Optional[str]] = {}
+        url_queue: asyncio.Queue = asyncio.Queue()
+        raw_queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        for url in urls:
+            url_queue.put_nowait(url)
+
+        async with PageFetcher(self.fetch_concurrency, self.max_bytes, host_cache=self.host_cache) as fetcher:
+            with ParsePool(self.parse_workers, self.backend) as pool:
+                # The pool can only run parse_workers jobs at once, more dispatchers would just queue there
+                parsers = [asyncio.create_task(self._parse_stage(pool, raw_queue, results)) for _ in range(self.parse_workers)]
+                fetchers = [asyncio.create_task(self._fetch_stage(fetcher, url_queue, raw_queue, results)) for _ in range(self.fetch_concurrency)]
+                for _ in fetchers:
+                    url_queue.put_nowait(_DONE)
+                await asyncio.gather(*fetchers)
+                for _ in parsers:
+                    await raw_queue.put(_DONE)
+                await asyncio.gather(*parsers)
+        return results
+
+
+def fetch_and_parse(urls: Iterable[str], **kwargs) -> Dict[str, Optional[str]]:
+    """Synchronous entry point: fetches and converts every url, returns url -> markdown (None on failure)."""
+    return asyncio.run(FetchParsePipeline(**kwargs).run(urls))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fetch (async) and convert (process pool) a list of URLs to markdown.")
+    parser.add_argument("urls_file", help="text file with one URL per line")
+    parser.add_argument("--output", default="fetched_pages.json")
+    parser.add_argument("--fetch-concurrency", type=int, default=FETCH_CONCURRENCY)
+    parser.add_argument("--parse-workers", type=int, default=PARSE_WORKERS)
+    parser.add_argument("--queue-size", type=int, default=QUEUE_SIZE)
+    parser.add_argument("--backend", default=None, help="HTML backend (bs4, lxml, selectolax)")
+    args = parser.parse_args()
+
+    try:
+        with open(args.urls_file, 'r', encoding='utf-8') as f:
+            urls = [line.strip() for line in f if line.strip()]
+    except FileNotFoundError:
+        print(f"Error: {args.urls_file} not found.", file=sys.stderr)
+        sys.exit(1)
+
+    host_cache = HostNegativeCache.load()
+    start = time.perf_counter()
+    results = fetch_and_parse(urls, fetch_concurrency=args.fetch_concurrency, parse_workers=args.parse_workers,
+                              queue_size=args.queue_size, backend=args.backend, host_cache=host_cache)
+    elapsed = time.perf_counter() - start
+    ok = sum(1 for v in results.values() if v)
+    print(f"✅ {ok}/{len(results)} pages converted in {elapsed:.1f}s ({len(results) / elapsed if elapsed else 0:.1f} pages/s)")
+    print(f"  {host_cache.summary()}")
+    host_cache.save()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Saved to **{args.output}**")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,200 @@
+import os
+import ssl
+import json
+import time
+import socket
+import asyncio
+import threading
+from typing import Any, Dict, Optional
+from urllib.parse import urlparse
+
+import requests
+
+# aiohttp is only needed by the async fetcher (fetch_parse_pipeline), the classification works without it
+try:
+    import aiohttp
+    _AIOHTTP_CONNECTION_ERRORS = (aiohttp.ClientConnectorError, aiohttp.ServerDisconnectedError)
+except ImportError:
+    _AIOHTTP_CONNECTION_ERRORS = ()
+
+from metrics import metrics
+
+# --- Configuration ---
+HOST_CACHE_JSON = "host_negative_cache.json"  # shared by every run, delete it to forget all hosts
+# How long a host is avoided after its first failure of each class (seconds). Each further
+# failure in a row doubles it, up to MAX_BACKOFF.
+FAILURE_TTL = {
+    "dns": 7 * 24 * 3600,         # domain doesn't resolve - usually a dead business
+    "forbidden": 24 * 3600,       # 401/403 bot walls
+    "rate_limited": 15 * 60,      # 429
+    "timeout": 6 * 3600,          # connect/read timeouts, each one costs a worker the full timeout
+    "connection": 6 * 3600,       # refused, reset, SSL errors
+    "server_error": 3600,         # 5xx
+    "aggregator": 30 * 24 * 3600, # company-info listing sites: still fetched, just after everything else
+}
+MAX_BACKOFF = 30 * 24 * 3600
+# Classes that are only pushed to the back of the queue instead of skipped
+DEPRIORITISE_CLASSES = {"aggregator"}
+# Company-info aggregators (same list as the check_md_match exclusions), never a company's own site
+AGGREGATOR_HOSTS = ['open.endole.co.uk', 'uk.globaldatabase.com', 'companywall.co.uk', 'bringo.co.uk',
+                    'companiesintheuk.co.uk', 'companycheck.co.uk', 'bizdb.co.uk', 'check-business.co.uk']
+# ---------------------
+
+
+def get_host(url: str) -> str:
+    """Lower-cased host name of a URL without a leading 'www.', '' if it can't be parsed."""
+    try:
+        host = (urlparse(url).hostname or '').lower()
+    except Exception:
+        return ''
+    return host[4:] if host.startswith('www.') else host
+
+
+def classify_status(status: int) -> Optional[str]:
+    """Failure class for an HTTP status code, None if the status says nothing about the host (e.g. 404)."""
+    if status in (401, 403):
+        return "forbidden"
+    if status == 429:
+        return "rate_limited"
+    if status >= 500:
+        return "server_error"
+    return None
+
+
+def classify_exception(exc: BaseException) -> Optional[str]:
+    """
+    Failure class for an exception raised while fetching (requests or aiohttp), None if the
+    error is about the page rather than the host (e.g. a PDF, a 404, a redirect loop or a bad
+    encoding). Note every requests exception is an OSError, so only real connection failures
+    count as "connection".
+    """
+    if isinstance(exc, requests.exceptions.HTTPError) and exc.response is not None:
+        return classify_status(exc.response.status_code)
+    if isinstance(exc, (requests.exceptions.Timeout, asyncio.TimeoutError, socket.timeout)):
+        return "timeout"
+    status = getattr(exc, 'status', None)  # aiohttp.ClientResponseError
+    if isinstance(status, int):
+        return classify_status(status)
+    # Walk the cause chain: requests and aiohttp both wrap the socket.gaierror from the resolver
+    seen = exc
+    while seen is not None:
+        if isinstance(seen, socket.gaierror) or "Name or service not known" in str(seen) \
+                or "nodename nor servname" in str(seen) or "getaddrinfo failed" in str(seen):
+            return "dns"
+        seen = seen.__cause__ or seen.__context__
+    if isinstance(exc, (requests.exceptions.ConnectionError, ConnectionError, ssl.SSLError) + _AIOHTTP_CONNECTION_ERRORS):
+        return "connection"
+    return None
+
+
+class HostNegativeCache:
+    """
+    Persistent record of hosts that recently failed and why, so a dead or hostile site costs one
+    timeout per backoff window instead of one per company that lists it.
+
+    Each failure sets the host's 'until' to now + FAILURE_TTL[class] * 2**(failures in a row - 1).
+    Once that passes the next request goes through as a probe: success clears the entry, another
+    failure doubles the wait. Thread safe, and saved to JSON so the backoff carries across runs.
+
+    Example:
+        host_cache = HostNegativeCache.load()
+        if not host_cache.should_skip(url):
+            ...fetch, then host_cache.record_failure(url, "timeout") or host_cache.record_success(url)
+        host_cache.save()
+    """
+
+    def __init__(self, path: str = HOST_CACHE_JSON, entries: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.path = path
+        self.entries: Dict[str, Dict[str, Any]] = entries or {}
+        self._lock = threading.Lock()
+        self.skipped = 0
+        for host in AGGREGATOR_HOSTS:
+            self.entries.setdefault(host, {"failure_class": "aggregator", "failures": 1, "until": float('inf'),
+                                           "last_error": "known aggregator"})
+
+    @classmethod
+    def load(cls, path: str = HOST_CACHE_JSON) -> "HostNegativeCache":
+        """Reads the cache from path, starting empty if the file is missing or unreadable."""
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entries = json.load(f)
+        except FileNotFoundError:
+            entries = {}
+        except (json.JSONDecodeError, OSError) as e:
+            print(f"[Warn] Could not read {path} ({e}), starting with an empty host cache.")
+            entries = {}
+        return cls(path, entries)
+
+    def save(self) -> None:
+        """Writes the cache back to its JSON file, dropping entries whose backoff ran out long ago."""
+        now = time.time()
+        with self._lock:
+            entries = {host: entry for host, entry in self.entries.items()
+                       if entry["until"] != float('inf') and entry["until"] + MAX_BACKOFF > now}
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(entries, f, indent=2)
+        os.replace(tmp_path, self.path)  # never leaves a half written file behind
+
+    def _active(self, url: str) -> Optional[Dict[str, Any]]:
+        entry = self.entries.get(get_host(url))
+        if entry is None or entry["until"] <= time.time():
+            return None
+        return entry
+
+    def should_skip(self, url: str) -> bool:
+        """True while the URL's host is inside a backoff window for a skip class."""
+        with self._lock:
+            entry = self._active(url)
+            skip = entry is not None and entry["failure_class"] not in DEPRIORITISE_CLASSES
+            if skip:
+                self.skipped += 1
+        if skip:
+            metrics.inc("host_cache_skips_total", failure_class=entry["failure_class"])
+        return skip
+
+    def priority(self, url: str) -> int:
+        """Scheduling rank, lower goes first: 0 normal, 1 deprioritised (aggregators), 2 skipped hosts."""
+        with self._lock:
+            entry = self._active(url)
+        if entry is None:
+            return 0
+        return 1 if entry["failure_class"] in DEPRIORITISE_CLASSES else 2
+
+    def failure_class(self, url: str) -> Optional[str]:
+        with self._lock:
+            entry = self._active(url)
+        return entry["failure_class"] if entry else None
+
+    def record_failure(self, url: str, failure_class: Optional[str], error: str = "") -> None:
+        """Starts or extends the host's backoff. A None class (page specific error) is ignored."""
+        host = get_host(url)
+        if not host or failure_class is None:
+            return
+        with self._lock:
+            entry = self.entries.get(host)
+            if entry and entry["failure_class"] in DEPRIORITISE_CLASSES:
+                return  # aggregators stay aggregators, their errors don't mean the host is dead
+            failures = entry["failures"] + 1 if entry else 1
+            ttl = min(FAILURE_TTL[failure_class] * 2 ** (failures - 1), MAX_BACKOFF)
+            self.entries[host] = {"failure_class": failure_class, "failures": failures,
+                                  "until": time.time() + ttl, "last_error": str(error)[:200]}
+        metrics.inc("host_failures_total", failure_class=failure_class)
+
+    def record_exception(self, url: str, exc: BaseException) -> None:
+        self.record_failure(url, classify_exception(exc), repr(exc))
+
+    def record_success(self, url: str) -> None:
+        """A successful fetch clears the host's failure history (aggregator entries are kept)."""
+        host = get_host(url)
+        with self._lock:
+            entry = self.entries.get(host)
+            if entry and entry["failure_class"] not in DEPRIORITISE_CLASSES:
+                del self.entries[host]
+
+    def summary(self) -> str:
+        with self._lock:
+            now = time.time()
+            blocked = sum(1 for e in self.entries.values()
+                          if e["until"] > now and e["failure_class"] not in DEPRIORITISE_CLASSES)
+        return f"{blocked} hosts in backoff, {self.skipped} fetches skipped"
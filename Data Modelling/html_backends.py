@@ -0,0 +1,337 @@
+import os
+import re
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional, Union
+
+from bs4 import BeautifulSoup
+import html2text
+
+# Optional fast parsers - both are C based. If neither is installed everything falls back to bs4.
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser as SelectolaxParser
+except ImportError:
+    SelectolaxParser = None
+
+# --- Configuration ---
+# Which backend ScrapeToMarkdown / ScrapeToText use, override with the HTML_BACKEND environment variable.
+DEFAULT_BACKEND = os.environ.get("HTML_BACKEND", "bs4")
+# Noise removed before conversion (same list ScrapeToMarkdown has always used)
+STRIP_TAGS = ['script', 'style', 'nav', 'footer', 'header', 'form', 'aside']
+# ---------------------
+
+# Tags that start/end a new line in the single pass markdown writer
+_BLOCK_TAGS = {
+    'p', 'div', 'section', 'article', 'main', 'ul', 'ol', 'li', 'table', 'tr', 'thead', 'tbody',
+    'blockquote', 'pre', 'dl', 'dt', 'dd', 'br', 'hr', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6',
+    'figure', 'figcaption', 'center', 'body', 'html',
+}
+_HEADINGS = {'h1': '# ', 'h2': '## ', 'h3': '### ', 'h4': '#### ', 'h5': '##### ', 'h6': '###### '}
+_EMPHASIS = {'strong': '**', 'b': '**', 'em': '_', 'i': '_'}
+_SKIP_TAGS = {'img', 'svg', 'noscript', 'template', 'iframe', 'head', 'title', 'meta', 'link'}
+_WHITESPACE = re.compile(r'\s+')
+
+
+def clean_markdown_lines(markdown_text: str) -> str:
+    """Basic final cleaning to remove excessive whitespace/empty lines."""
+    return '\n'.join([line.strip() for line in markdown_text.splitlines() if line.strip()])
+
+
+class _MarkdownWriter:
+    """
+    Builds markdown from a stream of start/text/end events in one pass over the tree.
+    Mirrors the html2text settings used by ScrapeToMarkdown: links kept, images dropped, no wrapping.
+    """
+
+    def __init__(self):
+        self.parts: List[str] = []
+        self.link_stack: List[tuple] = []  # (href, index into parts where the link text starts)
+        self.skip_depth = 0
+        self.pre_depth = 0
+        self.cells_in_row = 0
+        self.rows_in_table: List[int] = []  # rows seen so far, per open table
+
+    def start(self, tag: str, attrs) -> None:
+        if self.skip_depth or tag in _SKIP_TAGS:
+            self.skip_depth += 1
+            return
+        if tag == 'pre':
+            self.pre_depth += 1
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+        if tag in _HEADINGS:
+            self.parts.append(_HEADINGS[tag])
+        elif tag == 'li':
+            self.parts.append('* ')
+        elif tag == 'table':
+            self.rows_in_table.append(0)
+        elif tag == 'tr':
+            self.cells_in_row = 0
+        elif tag in ('td', 'th'):
+            # html2text layout: 'a| b' with a '---|---' rule under the first row
+            if self.cells_in_row:
+                self.parts.append('| ')
+            self.cells_in_row += 1
+        elif tag in _EMPHASIS:
+            self.parts.append(_EMPHASIS[tag])
+        elif tag == 'a':
+            self.link_stack.append((attrs.get('href'), len(self.parts)))
+
+    def text(self, text: str) -> None:
+        if self.skip_depth or not text:
+            return
+        self.parts.append(text if self.pre_depth else _WHITESPACE.sub(' ', text))
+
+    def end(self, tag: str) -> None:
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        if tag == 'pre':
+            self.pre_depth -= 1
+        if tag in _EMPHASIS:
+            self.parts.append(_EMPHASIS[tag])
+        elif tag == 'tr' and self.rows_in_table:
+            self.rows_in_table[-1] += 1
+            if self.rows_in_table[-1] == 1 and self.cells_in_row:
+                self.parts.append('\n' + '|'.join(['---'] * self.cells_in_row))
+        elif tag == 'table' and self.rows_in_table:
+            self.rows_in_table.pop()
+        elif tag == 'a' and self.link_stack:
+            href, start = self.link_stack.pop()
+            if href:
+                label = ''.join(self.parts[start:]).strip()
+                del self.parts[start:]
+                self.parts.append(f'[{label}]({href})')
+        if tag in _BLOCK_TAGS:
+            self.parts.append('\n')
+
+    def markdown(self) -> str:
+        return clean_markdown_lines(''.join(self.parts))
+
+
+class _TagTextCollector:
+    """
+    Single pass equivalent of running soup.find_all(tag).get_text(" ", strip=True) for several tags.
+    Text is collected per tag name and returned in the order of tag_names, like ScrapeToText did.
+    """
+
+    def __init__(self, tag_names: List[str]):
+        self.tag_names = tag_names
+        self.active: List[tuple] = []            # (tag name, list of text pieces) for open target tags
+        self.found: Dict[str, List[str]] = {t: [] for t in tag_names}
+
+    def start(self, tag: str, attrs) -> None:
+        if tag in self.found:
+            self.active.append((tag, []))
+
+    def text(self, text: str) -> None:
+        text = text.strip()
+        if text:
+            for _, pieces in self.active:
+                pieces.append(text)
+
+    def end(self, tag: str) -> None:
+        if tag in self.found:
+            for i in range(len(self.active) - 1, -1, -1):
+                if self.active[i][0] == tag:
+                    name, pieces = self.active.pop(i)
+                    if pieces:
+                        self.found[name].append(' '.join(pieces))
+                    break
+
+    def texts(self) -> List[str]:
+        return [text for tag in self.tag_names for text in self.found[tag]]
+
+
+class HtmlBackend(ABC):
+    """
+    Interface every parser backend implements.
+
+    to_markdown: cleaned page body as markdown (what ScrapeToMarkdown returns).
+    tag_text: the text inside each of tag_names, in tag_names order (what ScrapeToText joins up).
+    """
+    name = ""
+
+    @abstractmethod
+    def to_markdown(self, html: Union[bytes, str]) -> str:
+        ...
+
+    @abstractmethod
+    def tag_text(self, html: Union[bytes, str], tag_names: List[str]) -> List[str]:
+        ...
+
+
+class Bs4Backend(HtmlBackend):
+    """The original pure python pipeline: BeautifulSoup('html.parser') + decompose + html2text."""
+    name = "bs4"
+
+    def to_markdown(self, html):
+        soup = BeautifulSoup(html, 'html.parser')
+        for tag in soup(STRIP_TAGS):
+            tag.decompose()
+        body_content = str(soup.body) if soup.body else str(soup)
+
+        h = html2text.HTML2Text()
+        h.ignore_links = False
+        h.ignore_images = True
+        h.body_width = 0
+        return clean_markdown_lines(h.handle(body_content))
+
+    def tag_text(self, html, tag_names):
+        soup = BeautifulSoup(html, 'html.parser')
+        extracted_content = []
+        for tag_name in tag_names:
+            for tag in soup.find_all(tag_name):
+                text = tag.get_text(separator=" ", strip=True)
+                if text:
+                    extracted_content.append(text)
+        return extracted_content
+
+
+_UTF8_PARSER = lxml.html.HTMLParser(encoding='utf-8') if lxml is not None else None
+
+
+class LxmlBackend(HtmlBackend):
+    """libxml2 parser, one iterwalk over the body feeding the markdown writer."""
+    name = "lxml"
+
+    @staticmethod
+    def _parse(html):
+        if not html or not html.strip():
+            return None
+        parser = None
+        if isinstance(html, bytes):
+            # libxml2 assumes latin-1 when a page has no <meta charset>, most of the web is utf-8
+            try:
+                html.decode('utf-8')
+                parser = _UTF8_PARSER
+            except UnicodeDecodeError:
+                pass
+        try:
+            return lxml.html.document_fromstring(html, parser=parser)
+        except etree.ParserError:
+            # Comment or whitespace only documents have no root element, bs4 just returns nothing
+            return None
+
+    @staticmethod
+    def _walk(root, handler) -> None:
+        for event, el in etree.iterwalk(root, events=("start", "end")):
+            is_element = isinstance(el.tag, str)
+            if event == "start":
+                if is_element:
+                    handler.start(el.tag, el.attrib)
+                    handler.text(el.text or "")
+            else:
+                if is_element:
+                    handler.end(el.tag)
+                if el is not root:
+                    handler.text(el.tail or "")
+
+    def to_markdown(self, html):
+        doc = self._parse(html)
+        if doc is None:
+            return ""
+        for el in list(doc.iter(*STRIP_TAGS)):
+            el.drop_tree()  # keeps the tail text, like decompose()
+        body = doc.find('body')
+        writer = _MarkdownWriter()
+        self._walk(body if body is not None else doc, writer)
+        return writer.markdown()
+
+    def tag_text(self, html, tag_names):
+        doc = self._parse(html)
+        if doc is None:
+            return []
+        collector = _TagTextCollector(tag_names)
+        self._walk(doc, collector)
+        return collector.texts()
+
+
+class SelectolaxBackend(HtmlBackend):
+    """lexbor parser (selectolax), strip_tags then an explicit stack walk feeding the markdown writer."""
+    name = "selectolax"
+
+    @staticmethod
+    def _walk(root, handler) -> None:
+        # Iterative so very deep pages can't hit the recursion limit
+        stack = [(root, False)]
+        while stack:
+            node, closing = stack.pop()
+            tag = node.tag
+            if tag == '-text':
+                handler.text(node.text_content or "")
+                continue
+            if tag.startswith('-') or tag.startswith('_'):  # comments, doctype
+                continue
+            if closing:
+                handler.end(tag)
+                continue
+            handler.start(tag, node.attributes)
+            stack.append((node, True))
+            children = []
+            child = node.child
+            while child is not None:
+                children.append(child)
+                child = child.next
+            stack.extend((c, False) for c in reversed(children))
+
+    def to_markdown(self, html):
+        tree = SelectolaxParser(html)
+        tree.strip_tags(STRIP_TAGS)
+        root = tree.body or tree.root
+        if root is None:
+            return ""
+        writer = _MarkdownWriter()
+        self._walk(root, writer)
+        return writer.markdown()
+
+    def tag_text(self, html, tag_names):
+        tree = SelectolaxParser(html)
+        if tree.root is None:
+            return []
+        collector = _TagTextCollector(tag_names)
+        self._walk(tree.root, collector)
+        return collector.texts()
+
+
+BACKENDS = {"bs4": Bs4Backend}
+if lxml is not None:
+    BACKENDS["lxml"] = LxmlBackend
+if SelectolaxParser is not None:
+    BACKENDS["selectolax"] = SelectolaxBackend
+
+_instances: Dict[str, HtmlBackend] = {}
+
+
+def available_backends() -> List[str]:
+    """Names of the backends whose parser is installed."""
+    return list(BACKENDS)
+
+
+def get_backend(name: Optional[str] = None) -> HtmlBackend:
+    """
+    Returns the named backend ('bs4', 'lxml' or 'selectolax'), DEFAULT_BACKEND if name is None.
+    Falls back to bs4 with a warning if the requested parser isn't installed.
+    """
+    name = name or DEFAULT_BACKEND
+    if name not in BACKENDS:
+        print(f"[Warn] HTML backend '{name}' not available, using bs4. Available: {available_backends()}")
+        name = "bs4"
+    if name not in _instances:
+        _instances[name] = BACKENDS[name]()
+    return _instances[name]
+
+
+def html_to_markdown(html: Union[bytes, str], backend: Optional[str] = None) -> str:
+    """Converts raw HTML to cleaned markdown with the chosen backend."""
+    return get_backend(backend).to_markdown(html)
+
+
+def html_tag_text(html: Union[bytes, str], tag_names: List[str], backend: Optional[str] = None) -> List[str]:
+    """Returns the text of every tag in tag_names (grouped in tag_names order) with the chosen backend."""
+    return get_backend(backend).tag_text(html, tag_names)
@@ -4,22 +4,25 @@ import json
 from urllib.parse import urlparse
 from typing import List, Dict, Any
 import requests
-from bs4 import BeautifulSoup
 from typing import Optional, List, Dict, Any
 import html2text
 import re
 import requests
 import json
 import pandas as pd
+from Scrape_Utils import fetch_html, ContentRejectedError
+from html_backends import html_tag_text
 
 # scrape to markdown function
-def ScrapeToText(url: str) -> Optional[str]:
+def ScrapeToText(url: str, backend: Optional[str] = None) -> Optional[str]:
     """
     Fetches the content of a given URL, cleans the HTML, and converts 
     the body content into a plain text string suitable for an LLM.
+    Non-HTML responses are skipped and the download is capped (see fetch_html).
 
     Args:
         url: The URL of the webpage to scrape.
+        backend: HTML parser backend name (see html_backends.py), defaults to HTML_BACKEND / 'bs4'.
 
     Returns:
         A string containing the page content in plain text format, or None on failure.
@@ -28,27 +31,13 @@ def ScrapeToText(url: str) -> Optional[str]:
     """
     try:
         # 1. Fetch the raw HTML content
-        headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        }
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status() # Raise HTTPError for bad responses (4xx or 5xx)
+        html_bytes = fetch_html(url)
 
-        # 2. Parse the HTML using BeautifulSoup
-        soup = BeautifulSoup(response.content, 'html.parser')
-
-        # 3. Extract content from specific tags
+        # 2. Parse the HTML and extract content from specific tags (single pass, parser chosen in html_backends.py)
         tags_extract = ['title', 'address', 'header', 'footer']
-        extracted_content = []
-        
-        for tag_name in tags_extract:
-            tags = soup.find_all(tag_name)
-            for tag in tags:
-                text = tag.get_text(separator=" ", strip=True)
-                if text:
-                    extracted_content.append(text)
+        extracted_content = html_tag_text(html_bytes, tags_extract, backend)
         
-        # 4. Combine extracted content into plain text
+        # 3. Combine extracted content into plain text
         if extracted_content:
             return " ".join(extracted_content)
         else:
@@ -58,6 +47,9 @@ def ScrapeToText(url: str) -> Optional[str]:
     except requests.exceptions.HTTPError as e:
         print(f"Error fetching {url}: HTTP Error - {e}")
         return None
+    except ContentRejectedError as e:
+        print(f"Skipping {url}: {e}")
+        return None
     except requests.exceptions.RequestException as e:
         print(f"Error fetching {url}: Connection/Request Error - {e}")
         return None
@@ -0,0 +1,208 @@
+import os
+import re
+import sys
+import json
+import time
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, Optional
+
+# --- Configuration ---
+# Which client init_llm_client returns: 'gemini' (the real API) or 'mock' (local, no cost)
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini")
+# Mock behaviour, each can be overridden with the environment variable of the same name
+MOCK_LLM_LATENCY_MS = float(os.environ.get("MOCK_LLM_LATENCY_MS", 800))    # median latency
+MOCK_LLM_LATENCY_SIGMA = float(os.environ.get("MOCK_LLM_LATENCY_SIGMA", 0.5))  # lognormal spread, 0 = constant
+MOCK_LLM_429_RATE = float(os.environ.get("MOCK_LLM_429_RATE", 0.0))        # share of calls failing with a quota error
+MOCK_LLM_MALFORMED_RATE = float(os.environ.get("MOCK_LLM_MALFORMED_RATE", 0.0))  # share of replies that aren't valid JSON
+MOCK_LLM_RPM = int(os.environ.get("MOCK_LLM_RPM", 0))                      # requests/minute quota, 0 = unlimited
+MOCK_LLM_SEED = os.environ.get("MOCK_LLM_SEED")
+# ---------------------
+
+
+def init_gemini_client():
+    """Initializes and returns the Gemini V1 client."""
+    from google import genai  # only needed for the real backend
+
+    print("Initializing Gemini V1 client (genai.Client)...")
+    g_api_key = os.environ.get("GOOGLE_API_KEY")
+    if not g_api_key:
+        print("Error: GOOGLE_API_KEY environment variable not set.", file=sys.stderr)
+        return None
+
+    try:
+        client = genai.Client()
+        print("✅ Gemini V1 client initialized successfully.")
+        return client
+    except Exception as e:
+        print(f"Error initializing Gemini V1 client. \nError: {e}", file=sys.stderr)
+        return None
+
+
+class MockUsage:
+    def __init__(self, prompt_token_count: int, candidates_token_count: int):
+        self.prompt_token_count = prompt_token_count
+        self.candidates_token_count = candidates_token_count
+
+
+class MockResponse:
+    """Has the two attributes the pipeline reads from a google-genai response: text and usage_metadata."""
+
+    def __init__(self, text: str, prompt_tokens: int):
+        self.text = text
+        self.usage_metadata = MockUsage(prompt_tokens, max(1, len(text) // 4))
+
+
+class MockModels:
+    """
+    Stand-in for genai.Client().models. generate_content sleeps for a lognormal latency, may raise the
+    same '429 RESOURCE_EXHAUSTED' error the real API does (randomly or when the rpm quota is used up)
+    and otherwise answers with a verdict in whichever JSON schema the prompt asks for.
+    """
+
+    def __init__(self, latency_ms: float = MOCK_LLM_LATENCY_MS, latency_sigma: float = MOCK_LLM_LATENCY_SIGMA,
+                 rate_limit_rate: float = MOCK_LLM_429_RATE, malformed_rate: float = MOCK_LLM_MALFORMED_RATE,
+                 rpm: int = MOCK_LLM_RPM, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.rate_limit_rate = rate_limit_rate
+        self.malformed_rate = malformed_rate
+        self.rpm = rpm
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._recent = deque()  # call times inside the last minute, for the rpm quota
+        self.calls = 0
+        self.rate_limited = 0
+        self.malformed = 0
+
+    def _roll(self) -> float:
+        with self._lock:
+            return self._rng.random()
+
+    def _check_quota(self) -> None:
+        if self._roll() < self.rate_limit_rate:
+            with self._lock:
+                self.rate_limited += 1
+            raise RuntimeError("429 RESOURCE_EXHAUSTED. {'error': {'code': 429, 'message': 'Resource has been exhausted (mock).'}}")
+        if self.rpm:
+            now = time.monotonic()
+            with self._lock:
+                while self._recent and now - self._recent[0] > 60:
+                    self._recent.popleft()
+                over = len(self._recent) >= self.rpm
+                if over:
+                    self.rate_limited += 1
+                else:
+                    self._recent.append(now)
+            if over:
+                raise RuntimeError("429 RESOURCE_EXHAUSTED. {'error': {'code': 429, 'message': 'Quota exceeded for requests per minute (mock).'}}")
+
+    def _latency(self) -> float:
+        with self._lock:
+            factor = self._rng.lognormvariate(0, self.latency_sigma) if self.latency_sigma else 1.0
+        return self.latency_ms * factor / 1000
+
+    def generate_content(self, model: str, contents: str, config: Optional[Dict[str, Any]] = None, **kwargs) -> MockResponse:
+        with self._lock:
+            self.calls += 1
+        self._check_quota()
+        time.sleep(self._latency())
+        verdict = mock_verdict(contents, model)
+        schema = (config or {}).get("response_schema")
+        if schema:
+            # Structured output: exactly the declared fields, bare JSON
+            verdict = {name: verdict.get(name) for name in schema["properties"]}
+        text = json.dumps(verdict, indent=2)
+        if self._roll() < self.malformed_rate:
+            with self._lock:
+                self.malformed += 1
+            text = self._malform(text, verdict, structured=bool(schema))
+        elif not schema and self._roll() < 0.3:
+            text = f"```json\n{text}\n```"  # the real model often fences its JSON, the parsers must cope
+        return MockResponse(text, prompt_tokens=max(1, len(contents) // 4))
+
+    def _malform(self, text: str, verdict: Dict[str, Any], structured: bool) -> str:
+        choice = self._roll()
+        if choice < 0.4:
+            return text[: len(text) // 2]                        # truncated (max tokens hit, even with a schema)
+        if structured:
+            broken = dict(verdict)
+            broken.pop(next(iter(broken)))                       # a required field left out
+            return json.dumps(broken, indent=2)
+        if choice < 0.7:
+            return "Here is my analysis:\n" + text               # prose before the JSON
+        return text.replace('"', "'")                            # python style quotes
+
+
+class MockLLMClient:
+    """Duck-types genai.Client: the pipeline only ever calls client.models.generate_content."""
+
+    def __init__(self, **kwargs):
+        self.models = MockModels(**kwargs)
+
+    def summary(self) -> str:
+        m = self.models
+        return f"mock LLM: {m.calls} calls, {m.rate_limited} rate limited, {m.malformed} malformed replies"
+
+
+_ENTITY1_NAME = re.compile(r'Company(?: name)?:\s*(.+?)(?:\s*\(\d|\n)')
+_ENTITY1_POSTCODE = re.compile(r'(?:Address post code|Postcode):\s*(.+)')
+_ENTITY1_NUMBER = re.compile(r'Company number:\s*(\S+)')
+_MD_LINK = re.compile(r'\[[^\]]*\]\((https?://[^)\s]+)\)')
+
+
+def mock_verdict(prompt: str, model: str = "") -> Dict[str, Any]:
+    """
+    A plausible verdict for a matching prompt, so downstream logic sees realistic true/false mixes:
+    the page 'matches' when it contains Entity 1's name, number or postcode. Confidence is lower when
+    only some of the identifiers were found, and higher for the stronger (non '-lite') models, so
+    model routing escalates a realistic share. Rejection prompts (validate_embedded_link) get the
+    should_reject schema instead.
+    """
+    entity1, _, entity2 = prompt.partition("Entity 2:")
+    if not entity2:
+        entity1, _, entity2 = prompt.partition("Website content:")
+    page = entity2.lower()
+    name = _ENTITY1_NAME.search(entity1)
+    postcode = _ENTITY1_POSTCODE.search(entity1)
+    number = _ENTITY1_NUMBER.search(entity1)
+    evidence = [m.group(1).strip().lower() for m in (name, postcode, number) if m]
+    found = [e for e in evidence if e and e in page]
+
+    if '"should_reject"' in prompt:
+        return {"should_reject": not found, "rejection_reasons": [] if found else ["No identifying details found (mock)"],
+                "reasoning": f"Mock: matched {found}" if found else "Mock: nothing matched"}
+
+    confidence = 0.9 if len(found) != 1 else 0.6
+    if model and not model.endswith("-lite"):
+        confidence = min(1.0, confidence + 0.2)
+
+    links = _MD_LINK.findall(entity2)
+    embedded = next((link for link in links if 'endole' not in link), None) if 'endole' in page else None
+    verdict_key = "is_official_website" if '"is_official_website"' in prompt else "is_entity1_website"
+    return {
+        verdict_key: bool(found) and 'endole' not in page,
+        "official_url": None,
+        "found_embedded_link": embedded is not None,
+        "embedded_url": embedded,
+        "confidence": confidence,
+        "reasoning": f"Mock: matched {found}" if found else "Mock: nothing matched",
+    }
+
+
+def init_llm_client(backend: Optional[str] = None):
+    """
+    Returns an LLM client for the backend ('gemini' or 'mock', LLM_BACKEND if None), or None if it
+    can't be created. Every backend is used the same way: client.models.generate_content(model=..., contents=...).
+    """
+    backend = backend or LLM_BACKEND
+    if backend == "mock":
+        seed = int(MOCK_LLM_SEED) if MOCK_LLM_SEED is not None else None
+        print(f"Using the mock LLM (median {MOCK_LLM_LATENCY_MS:.0f} ms, 429 rate {MOCK_LLM_429_RATE}, "
+              f"malformed rate {MOCK_LLM_MALFORMED_RATE}, rpm {MOCK_LLM_RPM or 'unlimited'}).")
+        return MockLLMClient(seed=seed)
+    if backend == "gemini":
+        return init_gemini_client()
+    print(f"Error: unknown LLM backend '{backend}', use 'gemini' or 'mock'.", file=sys.stderr)
+    return None
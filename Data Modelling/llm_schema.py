@@ -0,0 +1,140 @@
+import json
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from metrics import metrics
+
+# --- Configuration ---
+MAX_REASKS = 1   # extra calls allowed per prompt when a reply fails the schema, 0 disables re-asking
+# ---------------------
+
+# Response schemas, in the OpenAPI subset Gemini's structured output takes as response_schema.
+# Declaring them makes the API return bare JSON of this shape, and validate() checks the same shape
+# for backends (or older models) that don't enforce it.
+MATCH_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_entity1_website": {"type": "BOOLEAN"},
+        "official_url": {"type": "STRING", "nullable": True},
+        "found_embedded_link": {"type": "BOOLEAN"},
+        "embedded_url": {"type": "STRING", "nullable": True},
+        "confidence": {"type": "NUMBER", "minimum": 0, "maximum": 1},
+        "reasoning": {"type": "STRING"},
+    },
+    "required": ["is_entity1_website", "official_url", "found_embedded_link", "embedded_url", "confidence", "reasoning"],
+}
+
+# Matching_with_recursion's prompt names the verdict is_official_website and has no confidence
+OFFICIAL_WEBSITE_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "is_official_website": {"type": "BOOLEAN"},
+        "official_url": {"type": "STRING", "nullable": True},
+        "found_embedded_link": {"type": "BOOLEAN"},
+        "embedded_url": {"type": "STRING", "nullable": True},
+        "reasoning": {"type": "STRING"},
+    },
+    "required": ["is_official_website", "official_url", "found_embedded_link", "embedded_url", "reasoning"],
+}
+
+REJECTION_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "should_reject": {"type": "BOOLEAN"},
+        "rejection_reasons": {"type": "ARRAY", "items": {"type": "STRING"}},
+        "reasoning": {"type": "STRING"},
+    },
+    "required": ["should_reject", "rejection_reasons", "reasoning"],
+}
+
+_PY_TYPES = {"BOOLEAN": bool, "STRING": str, "ARRAY": list, "OBJECT": dict}
+
+
+def structured_config(schema: Dict[str, Any]) -> Dict[str, Any]:
+    """generate_content config asking for JSON that follows schema."""
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def validate(value: Any, schema: Dict[str, Any], path: str = "$") -> Optional[str]:
+    """First way value breaks schema, as a short message the model can act on, None if it conforms."""
+    if value is None:
+        return None if schema.get("nullable") else f"{path} must not be null"
+    expected = schema["type"]
+    if expected in ("NUMBER", "INTEGER"):
+        if isinstance(value, bool) or not isinstance(value, (int, float)):
+            return f"{path} must be a number"
+        if "minimum" in schema and value < schema["minimum"] or "maximum" in schema and value > schema["maximum"]:
+            return f"{path} must be between {schema.get('minimum')} and {schema.get('maximum')}"
+        return None
+    if not isinstance(value, _PY_TYPES[expected]):
+        return f"{path} must be a {expected.lower()}"
+    if expected == "ARRAY":
+        for i, item in enumerate(value):
+            error = validate(item, schema["items"], f"{path}[{i}]")
+            if error:
+                return error
+    elif expected == "OBJECT":
+        for name in schema.get("required", []):
+            if name not in value:
+                return f"missing required field '{name}'"
+        for name, sub_schema in schema["properties"].items():
+            if name in value:
+                error = validate(value[name], sub_schema, f"{path}.{name}" if path != "$" else name)
+                if error:
+                    return error
+    return None
+
+
+def _strip_fences(text: str) -> str:
+    # Only reached when the backend ignored response_schema and fenced its JSON
+    text = text.strip()
+    if text.startswith("```"):
+        text = text[3:]
+        if text.startswith("json"):
+            text = text[4:]
+        if text.rstrip().endswith("```"):
+            text = text.rstrip()[:-3]
+    return text.strip()
+
+
+def parse_structured(text: str, schema: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """
+    (parsed object, None) for a reply that conforms to schema, else (None, what is wrong).
+    Structured output is bare JSON, so the common case is a single json.loads.
+    """
+    try:
+        value = json.loads(text)
+    except (json.JSONDecodeError, TypeError):
+        try:
+            value = json.loads(_strip_fences(text or ""))
+        except json.JSONDecodeError as e:
+            return None, f"reply is not valid JSON ({e.msg} at char {e.pos})"
+    error = validate(value, schema)
+    return (value, None) if error is None else (None, error)
+
+
+def reask_prompt(prompt: str, error: str) -> str:
+    """The original prompt plus the specific reason the last reply was rejected."""
+    return (f"{prompt}\n\nYour previous reply was rejected: {error}. "
+            f"Reply again with ONLY a JSON object that follows the structure above exactly.")
+
+
+def ask_structured(generate: Callable[[str], str], prompt: str, schema: Dict[str, Any],
+                   max_reasks: int = MAX_REASKS) -> Tuple[str, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    Calls generate(prompt) and validates the reply against schema, re-asking with the validation
+    error only when the reply is invalid. generate returns the reply text, or "ERROR" if the call
+    itself failed (those aren't re-asked, the caller's retry logic has already run).
+    Returns (last reply text, parsed object or None, last validation error or None).
+    """
+    answer = generate(prompt)
+    value, error = parse_structured(answer, schema)
+    reasks = 0
+    while error is not None and answer != "ERROR" and reasks < max_reasks:
+        reasks += 1
+        metrics.inc("llm_reasks_total")
+        answer = generate(reask_prompt(prompt, error))
+        value, error = parse_structured(answer, schema)
+        metrics.inc("llm_reask_outcomes_total", outcome="fixed" if error is None else "still_invalid")
+    if error is not None:
+        metrics.inc("llm_invalid_replies_total")
+    return answer, value, error
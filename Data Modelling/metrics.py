@@ -0,0 +1,213 @@
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# --- Configuration ---
+METRICS_PROM = "run_metrics.prom"      # Prometheus text exposition format (node_exporter textfile collector)
+METRICS_JSON = "run_metrics.json"      # human readable run summary
+# Histogram bucket upper bounds in seconds: covers a 5 ms parse up to a 60 s rate limit wait
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 15.0, 30.0, 60.0)
+# USD per 1M tokens (input, output). Update when prices change, unknown models are costed at 0.
+LLM_PRICING = {
+    "gemini-2.5-flash-lite": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+    "gemini-2.5-pro": (1.25, 10.00),
+}
+# ---------------------
+
+_LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, Any]) -> _LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(key: _LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    # Prometheus text format: backslash, double quote and newline are escaped inside label values
+    escaped = (f'{k}="{_escape_label(v)}"' for k, v in pairs)
+    return "{" + ",".join(escaped) + "}"
+
+
+class _Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.min = float('inf')
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.min = min(self.min, value)
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimate from the buckets (linear within the bucket), exact enough to spot a bottleneck."""
+        if not self.count:
+            return 0.0
+        target = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, n in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if seen + n >= target and n:
+                # Clamp the bucket to the observed range so a narrow spread isn't smeared over the bucket
+                lo, hi = max(lower, self.min), min(upper, self.max)
+                return lo + (hi - lo) * (target - seen) / n
+            seen += n
+            lower = upper
+        return self.max
+
+    def summary(self) -> Dict[str, float]:
+        return {"count": self.count, "sum": round(self.sum, 6), "mean": round(self.sum / self.count, 6) if self.count else 0.0,
+                "min": round(self.min, 6) if self.count else 0.0, "max": round(self.max, 6),
+                "p50": round(self.quantile(0.5), 6), "p95": round(self.quantile(0.95), 6)}
+
+
+class MetricsRegistry:
+    """
+    Thread-safe counters, gauges and timing histograms, keyed by name + labels.
+    Exports to the Prometheus text format and to a JSON run summary.
+
+    Example:
+        from metrics import metrics
+        with metrics.timer("serper_request_seconds"):
+            ...
+        metrics.inc("fetch_bytes_total", len(body))
+        metrics.set_gauge("queue_depth", q.qsize(), stage="llm")
+        metrics.write_files()
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[str, Dict[_LabelKey, float]] = {}
+        self.gauges: Dict[str, Dict[_LabelKey, float]] = {}
+        self.histograms: Dict[str, Dict[_LabelKey, _Histogram]] = {}
+        self.started = time.time()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.counters.clear()
+            self.gauges.clear()
+            self.histograms.clear()
+            self.started = time.time()
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + value
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        with self._lock:
+            self.gauges.setdefault(name, {})[_label_key(labels)] = value
+
+    def add_gauge(self, name: str, delta: float, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.gauges.setdefault(name, {})
+            series[key] = series.get(key, 0) + delta
+
+    def observe(self, name: str, value: float, buckets=DEFAULT_BUCKETS, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self.histograms.setdefault(name, {})
+            if key not in series:
+                series[key] = _Histogram(buckets)
+            series[key].observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels) -> Iterator[None]:
+        """Observes the wall time of the with-block in histogram `name` (even if it raises)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @contextmanager
+    def in_flight(self, name: str, **labels) -> Iterator[None]:
+        """Gauge of how many with-blocks are currently running, e.g. open HTTP requests."""
+        self.add_gauge(name, 1, **labels)
+        try:
+            yield
+        finally:
+            self.add_gauge(name, -1, **labels)
+
+    def record_llm_usage(self, model: str, response) -> None:
+        """Counts tokens in/out and their cost from a google-genai response's usage_metadata."""
+        usage = getattr(response, 'usage_metadata', None)
+        tokens_in = getattr(usage, 'prompt_token_count', None) or 0
+        tokens_out = getattr(usage, 'candidates_token_count', None) or 0
+        price_in, price_out = LLM_PRICING.get(model, (0.0, 0.0))
+        self.inc("llm_tokens_total", tokens_in, model=model, direction="in")
+        self.inc("llm_tokens_total", tokens_out, model=model, direction="out")
+        self.inc("llm_cost_usd_total", (tokens_in * price_in + tokens_out * price_out) / 1_000_000, model=model)
+
+    def to_prometheus(self) -> str:
+        lines = []
+        with self._lock:
+            for name, series in sorted(self.counters.items()):
+                lines.append(f"# TYPE {name} counter")
+                lines.extend(f"{name}{_format_labels(key)} {value:g}" for key, value in series.items())
+            for name, series in sorted(self.gauges.items()):
+                lines.append(f"# TYPE {name} gauge")
+                lines.extend(f"{name}{_format_labels(key)} {value:g}" for key, value in series.items())
+            for name, series in sorted(self.histograms.items()):
+                lines.append(f"# TYPE {name} histogram")
+                for key, hist in series.items():
+                    cumulative = 0
+                    for bound, n in zip(list(hist.buckets) + ["+Inf"], hist.counts):
+                        cumulative += n
+                        lines.append(f"{name}_bucket{_format_labels(key, ('le', str(bound)))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(key)} {hist.sum:g}")
+                    lines.append(f"{name}_count{_format_labels(key)} {hist.count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        def series_dict(series, fn=lambda v: v):
+            return {",".join(f"{k}={v}" for k, v in key) or "total": fn(value) for key, value in series.items()}
+
+        with self._lock:
+            return {
+                "started": self.started,
+                "elapsed_seconds": round(time.time() - self.started, 3),
+                "counters": {name: series_dict(series) for name, series in sorted(self.counters.items())},
+                "gauges": {name: series_dict(series) for name, series in sorted(self.gauges.items())},
+                "histograms": {name: series_dict(series, _Histogram.summary) for name, series in sorted(self.histograms.items())},
+            }
+
+    def write_files(self, prom_path: str = METRICS_PROM, json_path: str = METRICS_JSON) -> None:
+        """Writes the Prometheus text file and the JSON summary, then prints where they went."""
+        with open(prom_path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
+        with open(json_path, 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, indent=2)
+        print(f"Metrics saved to **{prom_path}** and **{json_path}**")
+
+    def print_summary(self) -> None:
+        """One line per timing histogram and counter, enough to see the bottleneck from the console."""
+        summary = self.summary()
+        for name, series in summary["histograms"].items():
+            for labels, h in series.items():
+                print(f"  {name}[{labels}] n={h['count']} mean={h['mean']:.3f}s p50={h['p50']:.3f}s p95={h['p95']:.3f}s")
+        for name, series in summary["counters"].items():
+            for labels, value in series.items():
+                print(f"  {name}[{labels}] = {value:g}")
+
+
+# Process wide registry used by the instrumented functions
+metrics = MetricsRegistry()
@@ -0,0 +1,162 @@
+import json
+import time
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+# --- Configuration ---
+# Cheapest/fastest first. Every pair is asked at the first tier and only moves up when the policy says so.
+MODEL_TIERS = ["gemini-2.5-flash-lite", "gemini-2.5-flash", "gemini-2.5-pro"]
+DEFAULT_MODEL = MODEL_TIERS[0]
+# Per model quotas: rpm = requests per minute (callers wait for a slot), max_calls = calls per run
+# (None = unlimited). A tier whose max_calls is used up is skipped, so escalation spend is capped.
+MODEL_QUOTAS = {
+    "gemini-2.5-flash-lite": {"rpm": 4000, "max_calls": None},
+    "gemini-2.5-flash": {"rpm": 1000, "max_calls": 2000},
+    "gemini-2.5-pro": {"rpm": 150, "max_calls": 200},
+}
+CONFIDENCE_THRESHOLD = 0.7          # verdicts below this (or without a confidence) are escalated
+ESCALATE_ON_PARSE_FAILURE = True
+# Which disagreements with the string heuristics escalate:
+#   md_match_rejected         - check_md_match found the name/number on a non-aggregator page, the LLM said no
+#   url_match_rejected        - URL_similarity_match says the domain is the company's name, the LLM said no
+#   accepted_without_evidence - the LLM said yes but neither heuristic found anything
+CONFLICT_RULES = ["md_match_rejected", "url_match_rejected"]
+# ---------------------
+
+# Takes one slot of a model's quota: False once the run budget is used up
+AcquireFn = Callable[[], bool]
+# A routed call: (model, acquire) -> (raw answer text, parsed verdict as returned by parse_llm_output).
+# acquire must be called before every request actually sent, re-asks and 429 retries included.
+AskFn = Callable[[str, AcquireFn], Tuple[str, Dict[str, Any]]]
+
+
+class ModelQuota:
+    """Rolling one minute request window plus a per-run call budget for one model. Thread safe."""
+
+    def __init__(self, rpm: Optional[int] = None, max_calls: Optional[int] = None):
+        self.rpm = rpm
+        self.max_calls = max_calls
+        self.calls = 0
+        self._recent = deque()
+        self._lock = threading.Lock()
+
+    def exhausted(self) -> bool:
+        return self.max_calls is not None and self.calls >= self.max_calls
+
+    def acquire(self) -> bool:
+        """Blocks until the rpm window has room, False (without waiting) if the run budget is used up."""
+        while True:
+            with self._lock:
+                if self.exhausted():
+                    return False
+                now = time.monotonic()
+                while self._recent and now - self._recent[0] >= 60:
+                    self._recent.popleft()
+                if not self.rpm or len(self._recent) < self.rpm:
+                    self._recent.append(now)
+                    self.calls += 1
+                    return True
+                wait = 60 - (now - self._recent[0])
+            with metrics.timer("llm_quota_wait_seconds"):
+                time.sleep(wait)
+
+
+def heuristic_conflict(verdict: Dict[str, Any], string_match_result: bool, Key_ID_match: bool,
+                       rules: List[str] = CONFLICT_RULES) -> Optional[str]:
+    """The first CONFLICT_RULES rule the verdict breaks, None if it agrees with the heuristics."""
+    accepted = verdict["is_entity1_website"]
+    if "md_match_rejected" in rules and Key_ID_match and not accepted:
+        return "md_match_rejected"
+    if "url_match_rejected" in rules and string_match_result and not accepted:
+        return "url_match_rejected"
+    if "accepted_without_evidence" in rules and accepted and not (Key_ID_match or string_match_result):
+        return "accepted_without_evidence"
+    return None
+
+
+class ModelRouter:
+    """
+    Sends each (company, page) pair to the cheapest model first and escalates up MODEL_TIERS only when
+    the verdict failed to parse, is below the confidence threshold, or conflicts with the string
+    heuristics. The last model asked settles the pair; if an escalated call fails, the previous
+    verdict stands. Quotas are charged per request sent, through the acquire callback ask is given.
+
+    Example:
+        router = ModelRouter.from_json("routing_policy.json")   # or ModelRouter() for the defaults
+        def ask(model, acquire):
+            return generate_verdict(llm_client, prompt, model, acquire)   # (raw answer, parsed verdict)
+        llm_answer, llm_parsed, model, escalation = router.route(ask, string_match_result, Key_ID_match)
+    """
+
+    def __init__(self, tiers: List[str] = None, quotas: Dict[str, Dict[str, Any]] = None,
+                 confidence_threshold: float = CONFIDENCE_THRESHOLD,
+                 escalate_on_parse_failure: bool = ESCALATE_ON_PARSE_FAILURE, conflict_rules: List[str] = None):
+        self.tiers = list(tiers or MODEL_TIERS)
+        quotas = quotas if quotas is not None else MODEL_QUOTAS
+        self.quotas = {model: ModelQuota(**quotas.get(model, {})) for model in self.tiers}
+        self.confidence_threshold = confidence_threshold
+        self.escalate_on_parse_failure = escalate_on_parse_failure
+        self.conflict_rules = list(CONFLICT_RULES if conflict_rules is None else conflict_rules)
+        self._lock = threading.Lock()
+        self.settled = {model: 0 for model in self.tiers}
+        self.escalations: Dict[str, int] = {}
+
+    @classmethod
+    def from_json(cls, path: Optional[str]) -> "ModelRouter":
+        """Policy file with any of: tiers, quotas, confidence_threshold, escalate_on_parse_failure, conflict_rules."""
+        if not path:
+            return cls()
+        with open(path, 'r', encoding='utf-8') as f:
+            policy = json.load(f)
+        return cls(**policy)
+
+    def escalation_reason(self, verdict: Dict[str, Any], string_match_result: bool, Key_ID_match: bool) -> Optional[str]:
+        """Why this verdict should go to the next tier, None if it settles the pair."""
+        if not verdict["parse_success"]:
+            return "parse_failure" if self.escalate_on_parse_failure else None
+        confidence = verdict.get("confidence")
+        if confidence is None or confidence < self.confidence_threshold:
+            return "low_confidence"
+        return heuristic_conflict(verdict, string_match_result, Key_ID_match, self.conflict_rules)
+
+    def route(self, ask: AskFn, string_match_result: bool, Key_ID_match: bool) -> Tuple[str, Dict[str, Any], str, str]:
+        """Returns (raw answer, parsed verdict, model that settled it, escalation reasons joined by ';')."""
+        answer, verdict, settled_by = "ERROR", None, None
+        reasons = []
+        for model in self.tiers:
+            quota = self.quotas[model]
+            if quota.exhausted():
+                metrics.inc("llm_quota_exhausted_total", model=model)
+                continue
+            tier_answer, tier_verdict = ask(model, quota.acquire)
+            failed = tier_answer == "ERROR" or not (tier_verdict or {}).get("parse_success")
+            if failed and verdict is not None and verdict["parse_success"]:
+                # The stronger model's reply is unusable: the last verdict that parsed stands, the
+                # failure only goes on the escalation trail (and the next tier, if any, gets a go)
+                reason = "error" if tier_answer == "ERROR" else "parse_failure"
+                reasons.append(reason)
+                metrics.inc("llm_escalation_failures_total", model=model, reason=reason)
+                continue
+            answer, verdict, settled_by = tier_answer, tier_verdict, model
+            reason = self.escalation_reason(verdict, string_match_result, Key_ID_match)
+            if reason is None:
+                break
+            reasons.append(reason)
+            metrics.inc("llm_escalations_total", model=model, reason=reason)
+            with self._lock:
+                self.escalations[reason] = self.escalations.get(reason, 0) + 1
+        if settled_by is not None:
+            metrics.inc("llm_settled_total", model=settled_by)
+            with self._lock:
+                self.settled[settled_by] += 1
+        return answer, verdict, settled_by or "", ";".join(reasons)
+
+    def summary(self) -> str:
+        with self._lock:
+            settled = ", ".join(f"{model}={n}" for model, n in self.settled.items())
+            escalations = ", ".join(f"{reason}={n}" for reason, n in self.escalations.items()) or "none"
+        calls = ", ".join(f"{model}={quota.calls}" for model, quota in self.quotas.items())
+        return f"model routing: settled {settled}; calls {calls}; escalations {escalations}"
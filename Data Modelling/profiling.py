@@ -0,0 +1,225 @@
+import os
+import sys
+import json
+import time
+import pstats
+import cProfile
+import argparse
+import threading
+import tracemalloc
+from collections import Counter
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional
+
+# --- Configuration ---
+PROFILE_DIR = "profiles"       # each profiled run writes a <script>_<timestamp>/ folder in here
+SAMPLE_INTERVAL = 0.005        # seconds between stack samples in 'sample' mode
+TRACEMALLOC_FRAMES = 1         # stack depth kept per allocation, every extra frame makes allocation heavy code slower
+TOP_N = 40                     # lines in the cpu/memory text reports
+# ---------------------
+
+
+class _StackSampler(threading.Thread):
+    """
+    Low overhead sampling profiler: every interval it records the stack of every other thread.
+    Output is 'collapsed stacks' (one 'a;b;c count' line per distinct stack), which flamegraph.pl
+    and speedscope.app both open.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        super().__init__(name="stack-sampler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        self._stop_event = threading.Event()
+
+    def run(self):
+        own_id = threading.get_ident()
+        while not self._stop_event.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                names = []
+                while frame is not None:
+                    code = frame.f_code
+                    names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                self.stacks[";".join(reversed(names))] += 1
+
+    def stop(self) -> None:
+        self._stop_event.set()
+        self.join()
+
+    def write(self, path: str) -> None:
+        with open(path, 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+
+class Profiler:
+    """
+    Opt-in profiling for a whole run: a CPU profile (cProfile, or a stack sampler), tracemalloc, per
+    stage wall/CPU/memory totals, and trace spans (Chrome trace format, open in chrome://tracing or
+    ui.perfetto.dev). When not started every call is a cheap no-op, so the hooks stay in the code.
+
+    Example:
+        from profiling import profiler
+        profiler.start("Search_scrape_P1", mode="cprofile")
+        with profiler.span("company", company_number="01234567"):
+            with profiler.stage("search"):
+                ...
+        profiler.stop()   # writes profiles/Search_scrape_P1_<timestamp>/
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self) -> None:
+        self.mode = None
+        self.output_dir = None
+        self._cprofile: Optional[cProfile.Profile] = None
+        self._sampler: Optional[_StackSampler] = None
+        self._t0 = 0.0
+        self._events: List[Dict[str, Any]] = []
+        self._stages: Dict[str, Dict[str, float]] = {}
+        self._checkpoint = None
+        self.trace_memory = False
+
+    def start(self, run_name: str, mode: str = "cprofile", profile_dir: str = PROFILE_DIR, trace_memory: bool = True) -> None:
+        """
+        mode is 'cprofile' (exact call counts, slower) or 'sample' (stack sampling, low overhead).
+        trace_memory turns on tracemalloc, which can slow allocation heavy code (pandas .apply) 10x or more.
+        """
+        if mode not in ("cprofile", "sample"):
+            raise ValueError(f"Unknown profile mode '{mode}', use 'cprofile' or 'sample'.")
+        self._reset()
+        self.mode = mode
+        self.output_dir = os.path.join(profile_dir, f"{run_name}_{time.strftime('%Y%m%d_%H%M%S')}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._t0 = time.perf_counter()
+        self.trace_memory = trace_memory
+        if trace_memory:
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+        if mode == "cprofile":
+            self._cprofile = cProfile.Profile()
+            self._cprofile.enable()
+        else:
+            self._sampler = _StackSampler()
+            self._sampler.start()
+        self.enabled = True
+        print(f"[Profile] {mode} profiling on, output in {self.output_dir}")
+
+    def _add_event(self, name: str, start: float, end: float, args: Dict[str, Any]) -> None:
+        event = {"name": name, "ph": "X", "pid": os.getpid(), "tid": threading.get_ident(),
+                 "ts": (start - self._t0) * 1e6, "dur": (end - start) * 1e6, "args": args}
+        with self._lock:
+            self._events.append(event)
+
+    @contextmanager
+    def span(self, name: str, **args) -> Iterator[None]:
+        """Records a trace span (e.g. one company) without stage accounting."""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._add_event(name, start, time.perf_counter(), {k: str(v) for k, v in args.items()})
+
+    @contextmanager
+    def stage(self, name: str, **args) -> Iterator[None]:
+        """A trace span that is also added to the per-stage wall/CPU/memory totals."""
+        if not self.enabled:
+            yield
+            return
+        start, cpu_start = time.perf_counter(), time.thread_time()
+        if self.trace_memory:
+            tracemalloc.reset_peak()  # peak is then this stage's (stages aren't nested in the scripts)
+        mem_start = tracemalloc.get_traced_memory()[0]
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            mem_now, mem_peak = tracemalloc.get_traced_memory()  # (0, 0) when memory tracing is off
+            self._add_event(name, start, end, {k: str(v) for k, v in args.items()})
+            with self._lock:
+                totals = self._stages.setdefault(name, {"calls": 0, "wall_seconds": 0.0, "cpu_seconds": 0.0,
+                                                        "net_alloc_bytes": 0, "peak_traced_bytes": 0})
+                totals["calls"] += 1
+                totals["wall_seconds"] += end - start
+                totals["cpu_seconds"] += time.thread_time() - cpu_start
+                totals["net_alloc_bytes"] += mem_now - mem_start
+                totals["peak_traced_bytes"] = max(totals["peak_traced_bytes"], mem_peak)
+
+    def checkpoint(self, name: str) -> None:
+        """
+        For straight-line scripts (the EDA files): ends the previous checkpoint stage and starts a
+        new one called name, so every section of the script gets a stage without re-indenting it.
+        """
+        if not self.enabled:
+            return
+        if self._checkpoint is not None:
+            self._checkpoint.__exit__(None, None, None)
+        self._checkpoint = self.stage(name)
+        self._checkpoint.__enter__()
+
+    def stop(self) -> Optional[str]:
+        """Stops profiling and writes every report, returns the output folder (None if not enabled)."""
+        if not self.enabled:
+            return None
+        if self._checkpoint is not None:
+            self._checkpoint.__exit__(None, None, None)
+            self._checkpoint = None
+        self.enabled = False
+
+        if self._cprofile is not None:
+            self._cprofile.disable()
+            self._cprofile.dump_stats(os.path.join(self.output_dir, "cpu.pstats"))
+            with open(os.path.join(self.output_dir, "cpu_top.txt"), 'w', encoding='utf-8') as f:
+                stats = pstats.Stats(self._cprofile, stream=f)
+                stats.sort_stats("cumulative").print_stats(TOP_N)
+                stats.sort_stats("tottime").print_stats(TOP_N)
+        if self._sampler is not None:
+            self._sampler.stop()
+            self._sampler.write(os.path.join(self.output_dir, "cpu.folded"))
+
+        if self.trace_memory:
+            snapshot = tracemalloc.take_snapshot()
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+            with open(os.path.join(self.output_dir, "memory_top.txt"), 'w', encoding='utf-8') as f:
+                f.write(f"traced memory at end: {current / 1e6:.1f} MB\n\n")
+                for stat in snapshot.statistics("lineno")[:TOP_N]:
+                    f.write(f"{stat}\n")
+
+        with open(os.path.join(self.output_dir, "stages.json"), 'w', encoding='utf-8') as f:
+            json.dump(self._stages, f, indent=2)
+        with open(os.path.join(self.output_dir, "trace.json"), 'w', encoding='utf-8') as f:
+            json.dump({"traceEvents": self._events, "displayTimeUnit": "ms"}, f)
+
+        print("\n[Profile] Stage totals (wall / cpu / net alloc / peak):")
+        for name, t in sorted(self._stages.items(), key=lambda item: -item[1]["wall_seconds"]):
+            print(f"  {name:<18} calls={t['calls']:<6} wall={t['wall_seconds']:8.2f}s cpu={t['cpu_seconds']:8.2f}s "
+                  f"alloc={t['net_alloc_bytes'] / 1e6:8.1f} MB peak={t['peak_traced_bytes'] / 1e6:8.1f} MB")
+        print(f"[Profile] Reports written to {self.output_dir}")
+        return self.output_dir
+
+
+def add_profile_argument(parser: argparse.ArgumentParser) -> None:
+    """Adds the shared --profile [cprofile|sample], --profile-dir and --profile-no-memory options to a script's parser."""
+    parser.add_argument("--profile", nargs="?", const="cprofile", choices=["cprofile", "sample"], default=None,
+                        help="profile the run (cprofile by default, 'sample' for low overhead stack sampling)")
+    parser.add_argument("--profile-dir", default=PROFILE_DIR)
+    parser.add_argument("--profile-no-memory", action="store_true", help="skip tracemalloc (it slows allocation heavy code a lot)")
+
+
+def start_from_args(args: argparse.Namespace, run_name: str) -> None:
+    """Starts the shared profiler if the script was run with --profile."""
+    if args.profile:
+        profiler.start(run_name, mode=args.profile, profile_dir=args.profile_dir, trace_memory=not args.profile_no_memory)
+
+
+# Process wide profiler used by the stage hooks, disabled unless a script starts it
+profiler = Profiler()
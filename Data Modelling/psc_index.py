@@ -0,0 +1,226 @@
+import os
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import itertools
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from ch_ingest import zip_members, open_member, member_name, Member, WORKERS
+
+# --- Configuration ---
+PSC_INDEX_DB = "psc_index.sqlite"
+INCLUDE_CEASED = False      # ceased PSCs no longer run the company, leave them out of the evidence
+MAX_NAMES = 10              # names returned per company (a few companies list hundreds of PSCs)
+INSERT_BATCH = 50_000          # rows parsed and held in memory at a time, per process
+# ---------------------
+
+# One PSC row in the index: (company_number, name, kind)
+PscRow = Tuple[str, str, str]
+
+
+def match_name(data: Dict[str, Any]) -> Optional[str]:
+    """
+    The name as a website would write it. Individuals get 'forename surname' from name_elements
+    ('Mr John Michael Smith' -> 'John Smith'), companies and other entities keep their registered name.
+    Statements ('no PSC', 'PSC details not confirmed') and the snapshot's totals record have no name.
+    """
+    elements = data.get("name_elements")
+    if elements and elements.get("surname"):
+        name = " ".join(part for part in (elements.get("forename"), elements.get("surname")) if part)
+    else:
+        name = data.get("name")
+    name = " ".join(name.split()) if name else None
+    return name or None
+
+
+def parse_psc_line(line: str, include_ceased: bool = INCLUDE_CEASED) -> Optional[PscRow]:
+    """One line of the PSC snapshot ({"company_number": .., "data": {..}}) as an index row, or None to skip it."""
+    try:
+        record = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    data = record.get("data") or {}
+    number = (record.get("company_number") or "").strip()
+    if not number or (data.get("ceased_on") and not include_ceased):
+        return None
+    name = match_name(data)
+    if not name:
+        return None
+    return number.zfill(8), name, data.get("kind", "")
+
+
+def iter_psc_rows(member: Member, include_ceased: bool = INCLUDE_CEASED) -> Iterator[PscRow]:
+    with open_member(member) as text:
+        for line in text:
+            row = parse_psc_line(line, include_ceased)
+            if row:
+                yield row
+
+
+def _bulk_db(path: str) -> sqlite3.Connection:
+    if os.path.exists(path):
+        os.remove(path)
+    db = sqlite3.connect(path)
+    # A throwaway build file: no journal or fsyncs, and the index is created after the bulk load
+    db.execute("PRAGMA journal_mode = OFF")
+    db.execute("PRAGMA synchronous = OFF")
+    db.execute("CREATE TABLE psc (company_number TEXT NOT NULL, name TEXT NOT NULL, kind TEXT)")
+    return db
+
+
+def _insert_rows(db: sqlite3.Connection, rows: Iterator[PscRow], progress: Optional[Callable[[int], None]] = None) -> int:
+    """Inserts rows INSERT_BATCH at a time, so only one batch is ever held in memory. Returns the rows inserted."""
+    inserted = 0
+    for batch in iter(lambda: list(itertools.islice(rows, INSERT_BATCH)), []):
+        db.executemany("INSERT INTO psc VALUES (?, ?, ?)", batch)
+        inserted += len(batch)
+        if progress:
+            progress(len(batch))
+    return inserted
+
+
+def _index_member(member: Member, include_ceased: bool, part_path: str) -> int:
+    # Worker process: indexes one member into its own part file, so only a batch at a time is in
+    # memory and nothing but the row count is sent back
+    db = _bulk_db(part_path)
+    try:
+        rows = _insert_rows(db, iter_psc_rows(member, include_ceased))
+        db.commit()
+    finally:
+        db.close()
+    return rows
+
+
+def build_index(patterns: List[str], db_path: str = PSC_INDEX_DB, include_ceased: bool = INCLUDE_CEASED,
+                workers: int = WORKERS) -> int:
+    """
+    Streams the PSC snapshot (the .txt JSON-lines file or its zip parts) into a sqlite table indexed
+    by company number. Zip parts are parsed in parallel processes, each into its own part file that
+    this one copies in and deletes; with a single file the lines are streamed straight into the
+    table. Either way rows are inserted INSERT_BATCH at a time. Returns the rows indexed.
+    """
+    members = zip_members(patterns, suffixes=(".txt", ".json", ".jsonl"))
+    tmp_path = db_path + ".tmp"
+    db = _bulk_db(tmp_path)
+    db.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT)")
+
+    rows = 0
+
+    def progress(n: int) -> None:
+        nonlocal rows
+        rows += n
+        print(f"  {rows:,} PSC rows indexed...", end="\r")
+
+    workers = min(workers, len(members))
+    if workers <= 1:
+        for member in members:
+            _insert_rows(db, iter_psc_rows(member, include_ceased), progress)
+    else:
+        part_paths = [f"{tmp_path}.part{i}" for i in range(len(members))]
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for part_path, n in zip(part_paths, pool.map(_index_member, members, [include_ceased] * len(members),
+                                                             part_paths)):
+                    db.execute("ATTACH DATABASE ? AS part", (part_path,))
+                    db.execute("INSERT INTO psc SELECT * FROM part.psc")
+                    db.commit()  # DETACH can't run inside the insert's transaction
+                    db.execute("DETACH DATABASE part")
+                    os.remove(part_path)
+                    progress(n)
+        finally:
+            for part_path in part_paths:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+
+    db.execute("CREATE INDEX psc_company ON psc (company_number)")
+    db.executemany("INSERT INTO meta VALUES (?, ?)", [
+        ("sources", json.dumps([member_name(member) for member in members])),
+        ("include_ceased", json.dumps(include_ceased)),
+        ("built", time.strftime('%Y-%m-%d %H:%M:%S')),
+    ])
+    db.commit()
+    db.close()
+    os.replace(tmp_path, db_path)
+    print()
+    return rows
+
+
+class PscIndex:
+    """
+    Read side of the PSC index: the names of a company's people (and entities) with significant
+    control, one indexed sqlite lookup per company instead of loading the multi-GB snapshot.
+    Thread safe, so the orchestrator's stages can share one instance.
+
+    Example:
+        psc = PscIndex.load()             # None until psc_index.py has built psc_index.sqlite
+        if psc:
+            psc.add_evidence(company_data)  # company_data['psc_names'] = ['John Smith', 'ACME HOLDINGS LIMITED']
+    """
+
+    def __init__(self, db_path: str = PSC_INDEX_DB):
+        self.db_path = db_path
+        self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.hits = 0
+
+    @classmethod
+    def load(cls, db_path: str = PSC_INDEX_DB) -> Optional["PscIndex"]:
+        if not db_path or not os.path.exists(db_path):
+            return None
+        return cls(db_path)
+
+    def names(self, company_number: str, limit: int = MAX_NAMES) -> List[str]:
+        number = str(company_number).strip().zfill(8)
+        with self._lock:
+            rows = self._db.execute("SELECT DISTINCT name FROM psc WHERE company_number = ? ORDER BY name LIMIT ?",
+                                    (number, limit)).fetchall()
+            self.lookups += 1
+            self.hits += bool(rows)
+        return [row[0] for row in rows]
+
+    def add_evidence(self, company_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Sets company_data['psc_names'] (used by create_llm_prompt and check_md_match) and returns it."""
+        company_data['psc_names'] = self.names(company_data['company_number'])
+        return company_data
+
+    def summary(self) -> str:
+        with self._lock:
+            return f"PSC index: {self.hits}/{self.lookups} companies with PSC names"
+
+    def close(self) -> None:
+        self._db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index the Companies House PSC snapshot (JSON lines) by company number.")
+    parser.add_argument("paths", nargs="*", help="persons-with-significant-control snapshot .txt or its zip part(s), globs allowed")
+    parser.add_argument("--db", default=PSC_INDEX_DB)
+    parser.add_argument("--include-ceased", action="store_true", help="keep PSCs that have ceased")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="processes parsing zip parts in parallel")
+    parser.add_argument("--lookup", nargs="*", metavar="COMPANY_NUMBER", help="query an existing index instead of building one")
+    args = parser.parse_args()
+
+    if args.lookup is not None:
+        psc = PscIndex.load(args.db)
+        if psc is None:
+            print(f"Error: no PSC index at {args.db}", file=sys.stderr)
+            sys.exit(1)
+        for number in args.lookup:
+            print(f"{number}: {psc.names(number)}")
+        return
+
+    if not args.paths:
+        parser.error("give the PSC snapshot file(s) to index")
+    start = time.perf_counter()
+    rows = build_index(args.paths, args.db, args.include_ceased, args.workers)
+    print(f"✅ {rows:,} PSC rows indexed to **{args.db}** ({os.path.getsize(args.db) / 1e6:.0f} MB) "
+          f"in {time.perf_counter() - start:.0f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,270 @@
+import heapq
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from Scrape_Utils import ScrapeToMarkdown, UrlCoalescer, normalise_url, recurse_score, extract_markdown_links
+from host_cache import get_host, AGGREGATOR_HOSTS
+from metrics import metrics
+
+# --- Configuration ---
+MAX_DEPTH = 2            # levels of embedded links below a search result (1 = only the link the LLM reported)
+MAX_FETCHES = 300        # embedded pages fetched per run, across all companies
+MAX_LLM_CALLS = 300      # validation LLM calls per run, across all companies
+MAX_PER_COMPANY = 4      # expansions per company, so one company with a long link list can't eat the budget
+WORKERS = 4              # frontier items expanded concurrently
+DEPTH_PENALTY = 0.5      # score multiplier per level, so a shallow link beats a deeper one of similar score
+# Speculative prefetch: while a page is with the LLM, fetch the outbound links it is most likely to report
+PREFETCH_PER_PAGE = 2    # links prefetched per aggregator page (other pages only prefetch name-like domains)
+PREFETCH_WORKERS = 4
+PREFETCH_MAX_FETCHES = 300   # speculative fetches per run, capped apart from MAX_FETCHES (a hit still spends one of those)
+PREFETCH_SKIP_DOMAINS = ['facebook.com', 'twitter.com', 'x.com', 'linkedin.com', 'instagram.com', 'youtube.com',
+                         'google.com', 'gov.uk', 'wikipedia.org']
+# ---------------------
+
+# validate(company_data, url, markdown) -> result dict with at least is_official_website / parse_success
+ValidateFn = Callable[[Dict[str, Any], str, str], Dict[str, Any]]
+
+
+class RecursionBudget:
+    """Run-wide cost ceiling for recursion: fetches and LLM calls. Thread safe."""
+
+    def __init__(self, max_fetches: int = MAX_FETCHES, max_llm_calls: int = MAX_LLM_CALLS):
+        self.limits = {"fetch": max_fetches, "llm": max_llm_calls}
+        self.spent = {"fetch": 0, "llm": 0}
+        self._lock = threading.Lock()
+
+    def try_spend(self, kind: str) -> bool:
+        with self._lock:
+            if self.spent[kind] >= self.limits[kind]:
+                return False
+            self.spent[kind] += 1
+        metrics.inc("recursion_spend_total", kind=kind)
+        return True
+
+    def exhausted(self) -> bool:
+        with self._lock:
+            return any(self.spent[kind] >= self.limits[kind] for kind in self.limits)
+
+    def summary(self) -> str:
+        with self._lock:
+            return ", ".join(f"{kind} {self.spent[kind]}/{self.limits[kind]}" for kind in self.limits)
+
+
+class CompanyFrontier:
+    """
+    Best-first queue of embedded links for one company. Links are scored with recurse_score (0 means
+    skip) times DEPTH_PENALTY per level, and each normalised URL is only queued once.
+    """
+
+    def __init__(self, company_name: str, visited: Optional[set] = None):
+        self.company_name = company_name
+        self.visited = visited if visited is not None else set()
+        self._heap: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._order = itertools.count()
+
+    def push(self, url: str, parent_url: str, depth: int) -> bool:
+        key = normalise_url(url)
+        if key in self.visited:
+            metrics.inc("frontier_skipped_total", reason="visited")
+            return False
+        score = recurse_score(url, parent_url, self.company_name) * DEPTH_PENALTY ** (depth - 1)
+        if score <= 0:
+            metrics.inc("frontier_skipped_total", reason="score")
+            return False
+        self.visited.add(key)
+        heapq.heappush(self._heap, (-score, next(self._order),
+                                    {"url": url, "parent_url": parent_url, "depth": depth, "score": round(score, 3)}))
+        return True
+
+    def pop(self) -> Dict[str, Any]:
+        return heapq.heappop(self._heap)[2]
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+
+class SpeculativePrefetcher:
+    """
+    Starts fetching the embedded links the LLM is likely to report while the LLM is still judging the
+    page: the best scored external links on aggregator pages, and links whose domain matches the
+    company name (recurse_score 2.0) on any page. Fetches go through a UrlCoalescer, so when the
+    recursion later asks for the same URL it gets the prefetched page, or waits for the one in flight.
+    At most max_fetches pages are prefetched per run, and release() drops a company's pages once the
+    recursion is done with it, so the run doesn't hold every prefetched page in memory.
+
+    Example:
+        prefetcher = SpeculativePrefetcher()
+        prefetcher.start(scraped_url, markdown_content, company_name)   # before the LLM call
+        ...
+        engine = RecursionEngine(validate, scrape=prefetcher.fetch)
+        engine.expand(company_data, seeds)
+        prefetcher.release(company_name)
+        prefetcher.close()
+    """
+
+    def __init__(self, scrape: Callable[[str], Optional[str]] = ScrapeToMarkdown, per_page: int = PREFETCH_PER_PAGE,
+                 workers: int = PREFETCH_WORKERS, max_fetches: int = PREFETCH_MAX_FETCHES):
+        self.scrape = scrape
+        self.per_page = per_page
+        self.max_fetches = max_fetches
+        self.coalescer = UrlCoalescer()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self._lock = threading.Lock()
+        self._held: Dict[str, Tuple[str, set]] = {}  # normalised URL -> (url, companies that may still ask for it)
+        self.prefetched = set()  # normalised URLs fetched speculatively
+        self.used = set()        # ... of which the recursion later asked for
+        self.capped = 0          # candidates skipped because max_fetches was reached
+
+    def candidates(self, page_url: str, markdown_content: str, company_name: str) -> List[str]:
+        """The links worth prefetching from one page, best first."""
+        on_aggregator = get_host(page_url) in AGGREGATOR_HOSTS
+        scored = {}
+        for link in extract_markdown_links(markdown_content):
+            url = link["url"]
+            if any(domain in get_host(url) for domain in PREFETCH_SKIP_DOMAINS):
+                continue
+            score = recurse_score(url, page_url, company_name)
+            key = normalise_url(url)
+            if (score >= 2.0 or (on_aggregator and score > 0)) and score > scored.get(key, (0.0, url))[0]:
+                scored[key] = (score, url)
+        best = sorted(scored.values(), key=lambda pair: -pair[0])[:self.per_page]
+        return [url for _, url in best]
+
+    def start(self, page_url: str, markdown_content: str, company_name: str) -> List[str]:
+        """Queues background fetches for the page's candidates, returns the URLs queued."""
+        queued = []
+        for url in self.candidates(page_url, markdown_content, company_name):
+            key = normalise_url(url)
+            with self._lock:
+                if key in self._held:
+                    # Already prefetched for a company still in progress, this one shares it
+                    self._held[key][1].add(company_name)
+                    continue
+                if len(self.prefetched) >= self.max_fetches:
+                    self.capped += 1
+                    metrics.inc("prefetch_capped_total")
+                    continue
+                self._held[key] = (url, {company_name})
+                self.prefetched.add(key)
+            metrics.inc("prefetch_started_total")
+            self._pool.submit(self.coalescer.get, url, self.scrape)
+            queued.append(url)
+        return queued
+
+    def fetch(self, url: str) -> Optional[str]:
+        """Scrape function for the RecursionEngine: the prefetched page if there is one, else a normal fetch."""
+        key = normalise_url(url)
+        with self._lock:
+            hit = key in self._held
+            if hit:
+                self.used.add(key)
+        metrics.inc("prefetch_lookups_total", result="hit" if hit else "miss")
+        return self.coalescer.get(url, self.scrape)
+
+    def release(self, company_name: str) -> int:
+        """
+        Call once the recursion has finished with a company: evicts the pages prefetched for it that no
+        other unfinished company shares. Returns the pages evicted.
+        """
+        with self._lock:
+            done = []
+            for key, (url, companies) in self._held.items():
+                companies.discard(company_name)
+                if not companies:
+                    done.append(key)
+            urls = [self._held.pop(key)[0] for key in done]
+        for url in urls:
+            self.coalescer.forget(url)
+        if urls:
+            metrics.inc("prefetch_evicted_total", len(urls))
+        return len(urls)
+
+    def summary(self) -> str:
+        with self._lock:
+            capped = f", {self.capped} skipped at the cap of {self.max_fetches}" if self.capped else ""
+            return f"prefetched {len(self.prefetched)} links, {len(self.used)} used by the recursion{capped}"
+
+    def close(self) -> None:
+        # Queued speculative fetches nobody asked for are cancelled; the ones already running are
+        # waited for, so no fetch thread outlives the run
+        self._pool.shutdown(wait=True, cancel_futures=True)
+
+
+class RecursionEngine:
+    """
+    Explores embedded links best-first within a run-wide budget. For each company the seeds (links the
+    LLM reported on search result pages) go into a CompanyFrontier; the best WORKERS items are scraped
+    and validated concurrently, rejected pages add their own outbound links one level deeper, and the
+    company stops at the first confirmed official website, MAX_PER_COMPANY expansions or MAX_DEPTH.
+
+    Example:
+        engine = RecursionEngine(lambda c, url, md: validate_embedded_link(c, url, md, llm_client))
+        rows = engine.expand(company_data, [(embedded_url, scraped_url)])
+        engine.close()
+    """
+
+    def __init__(self, validate: ValidateFn, scrape: Callable[[str], Optional[str]] = ScrapeToMarkdown,
+                 budget: Optional[RecursionBudget] = None, max_depth: int = MAX_DEPTH,
+                 max_per_company: int = MAX_PER_COMPANY, workers: int = WORKERS):
+        self.validate = validate
+        self.scrape = scrape
+        self.budget = budget or RecursionBudget()
+        self.max_depth = max_depth
+        self.max_per_company = max_per_company
+        self.workers = workers
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="recurse")
+        self.visited: Dict[str, set] = {}  # company number -> normalised URLs already queued
+
+    def _expand_one(self, company_data: Dict[str, Any], item: Dict[str, Any]) -> Optional[Tuple[Dict[str, Any], Optional[str]]]:
+        """Scrapes and validates one link. Returns (validation result, markdown) or None if out of budget."""
+        if not self.budget.try_spend("fetch"):
+            return None
+        markdown = self.scrape(item["url"])
+        if not markdown:
+            print(f"    [Warn] Failed to scrape embedded URL: {item['url']}")
+            return {"is_official_website": False, "official_url": None, "reasoning": "SCRAPE_FAILED",
+                    "parse_success": False}, None
+        if not self.budget.try_spend("llm"):
+            return None
+        return self.validate(company_data, item["url"], markdown), markdown
+
+    def expand(self, company_data: Dict[str, Any], seeds: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        seeds are (embedded_url, page it was found on) pairs. Returns one dict per expanded link:
+        the frontier item (url, parent_url, depth, score) merged with its validation result.
+        """
+        frontier = CompanyFrontier(company_data['company_name'],
+                                   self.visited.setdefault(company_data['company_number'], set()))
+        for url, parent_url in seeds:
+            if url:
+                frontier.push(url, parent_url, 1)
+
+        results = []
+        while len(frontier) and len(results) < self.max_per_company and not self.budget.exhausted():
+            wave = [frontier.pop() for _ in range(min(self.workers, len(frontier), self.max_per_company - len(results)))]
+            for item in wave:
+                print(f" [Recursion] Checking (depth {item['depth']}, score {item['score']}): {item['url']}")
+            outcomes = list(self._pool.map(lambda item: self._expand_one(company_data, item), wave))
+
+            found = False
+            for item, outcome in zip(wave, outcomes):
+                if outcome is None:
+                    metrics.inc("recursion_budget_exhausted_total")
+                    continue
+                result, markdown = outcome
+                results.append({**item, **result})
+                if result.get("is_official_website"):
+                    found = True
+                elif markdown and item["depth"] < self.max_depth:
+                    for link in extract_markdown_links(markdown):
+                        frontier.push(link["url"], item["url"], item["depth"] + 1)
+            if found:
+                break
+        if self.budget.exhausted() and len(frontier):
+            print(f"    [Warn] Recursion budget used up ({self.budget.summary()}).")
+        return results
+
+    def close(self) -> None:
+        self._pool.shutdown(wait=True)
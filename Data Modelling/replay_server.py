@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import random
+import hashlib
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urlparse, parse_qs
+
+import requests
+
+from Scrape_Utils import normalise_url, REQUEST_HEADERS, MAX_HTML_BYTES, CHUNK_SIZE
+
+# --- Configuration ---
+FIXTURE_DIR = "replay_fixtures"     # serper/<key>.json, pages/<key>.body and pages/index.jsonl
+PORT = 8765
+LIVE_SERPER_URL = "https://google.serper.dev/search"
+# ---------------------
+
+# Usage:
+#   1. Record: python replay_server.py --record, then run the scripts with
+#        SERPER_URL=http://127.0.0.1:8765/search PAGE_REPLAY_URL=http://127.0.0.1:8765
+#      Every Serper call and page is forwarded to the real service and saved under FIXTURE_DIR.
+#   2. Replay: python replay_server.py --latency-ms 300 --jitter-ms 200 --error-rate 0.02 --rate-limit-rate 0.01
+#      and run the scripts with the same two environment variables, no quota or network used.
+
+
+def _key(text: str) -> str:
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()
+
+
+def search_key(payload: Dict[str, Any]) -> str:
+    """Fixture key for a Serper request: the query fields that change the result, case/space normalised."""
+    fields = {k: " ".join(str(payload.get(k, "")).lower().split()) for k in ("q", "location", "gl")}
+    return _key(json.dumps(fields, sort_keys=True))
+
+
+class FixtureStore:
+    """
+    Recorded Serper responses and pages on disk. Thread safe, pages are keyed on normalise_url.
+    The page index is append-only JSON lines (a re-recorded page's later line wins), so recording
+    costs the same per page however many are already stored.
+    """
+
+    def __init__(self, root: str = FIXTURE_DIR):
+        self.root = root
+        self.serper_dir = os.path.join(root, "serper")
+        self.pages_dir = os.path.join(root, "pages")
+        os.makedirs(self.serper_dir, exist_ok=True)
+        os.makedirs(self.pages_dir, exist_ok=True)
+        self.index_path = os.path.join(self.pages_dir, "index.jsonl")
+        self._lock = threading.Lock()
+        self.page_index: Dict[str, Dict[str, Any]] = {}
+        # Fixtures recorded before the index was append-only
+        legacy_path = os.path.join(self.pages_dir, "index.json")
+        if os.path.exists(legacy_path):
+            with open(legacy_path, 'r', encoding='utf-8') as f:
+                self.page_index.update(json.load(f))
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # a line cut short by a crash mid-record
+                    self.page_index[entry.pop("key")] = entry
+
+    def get_search(self, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.serper_dir, search_key(payload) + ".json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def put_search(self, payload: Dict[str, Any], response: Dict[str, Any]) -> None:
+        with open(os.path.join(self.serper_dir, search_key(payload) + ".json"), 'w', encoding='utf-8') as f:
+            json.dump(response, f, ensure_ascii=False)
+
+    def get_page(self, url: str) -> Optional[Tuple[int, str, bytes]]:
+        """(status, content type, body) of a recorded page, None if it was never recorded."""
+        entry = self.page_index.get(normalise_url(url))
+        if entry is None:
+            return None
+        with open(os.path.join(self.pages_dir, entry["file"]), 'rb') as f:
+            return entry["status"], entry["content_type"], f.read()
+
+    def put_page(self, url: str, status: int, content_type: str, body: bytes) -> None:
+        key = normalise_url(url)
+        file_name = _key(key) + ".body"
+        with open(os.path.join(self.pages_dir, file_name), 'wb') as f:
+            f.write(body)
+        entry = {"url": url, "file": file_name, "status": status, "content_type": content_type}
+        with self._lock:
+            self.page_index[key] = entry
+            with open(self.index_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps({"key": key, **entry}) + "\n")
+
+    def recorded_urls(self):
+        return [entry["url"] for entry in self.page_index.values() if entry["status"] == 200]
+
+
+class ReplayConfig:
+    """
+    Fault injection knobs, applied to every request the server answers. Each request draws from its own
+    generator, seeded by the seed, the query or URL and how often it has been asked for, so a seeded run
+    gets the same latencies and faults whichever order the server threads handle the requests in.
+    """
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0, rate_limit_rate: float = 0,
+                 record: bool = False, synthesize: bool = False, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate            # share of requests answered with a 503
+        self.rate_limit_rate = rate_limit_rate  # share of requests answered with a 429
+        self.record = record
+        self.synthesize = synthesize            # invent search results (from recorded pages) for unknown queries
+        self.seed = seed
+        self._fault_seed = seed if seed is not None else random.randrange(2**32)
+        self._seen: Dict[str, int] = {}        # request key -> times requested, so a retry draws afresh
+        self._lock = threading.Lock()
+
+    def request_rng(self, key: str) -> random.Random:
+        """The generator for one request, key being e.g. 'search:<search_key>' or 'page:<normalised url>'."""
+        with self._lock:
+            attempt = self._seen[key] = self._seen.get(key, 0) + 1
+        return random.Random(f"{self._fault_seed}:{key}:{attempt}")
+
+    def delay(self, rng: random.Random) -> float:
+        jitter = rng.uniform(-self.jitter_ms, self.jitter_ms) if self.jitter_ms else 0
+        return max(0.0, self.latency_ms + jitter) / 1000
+
+
+class ReplayHandler(BaseHTTPRequestHandler):
+    """POST /search is the Serper stand-in, GET /page?url=... serves a recorded page, GET /__stats the counters."""
+
+    server_version = "ReplayServer/1.0"
+
+    def log_message(self, format, *args):
+        pass  # thousands of requests per run, the counters in /__stats are more useful
+
+    def _count(self, name: str) -> None:
+        with self.server.stats_lock:
+            self.server.stats[name] = self.server.stats.get(name, 0) + 1
+
+    def _send(self, status: int, body: bytes, content_type: str = "application/json") -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _inject_faults(self, kind: str, key: str) -> bool:
+        """Sleeps for the configured latency, then maybe answers with an injected error. True if it did."""
+        config: ReplayConfig = self.server.config
+        rng = config.request_rng(f"{kind}:{key}")
+        time.sleep(config.delay(rng))
+        roll = rng.random()
+        if roll < config.rate_limit_rate:
+            self._count(f"{kind}_429_injected")
+            self._send(429, b'{"message": "Too Many Requests (injected)"}')
+            return True
+        if roll < config.rate_limit_rate + config.error_rate:
+            self._count(f"{kind}_503_injected")
+            self._send(503, b'{"message": "Service Unavailable (injected)"}')
+            return True
+        return False
+
+    def do_POST(self):
+        if urlparse(self.path).path != "/search":
+            self._send(404, b'{"message": "not found"}')
+            return
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        self._count("search_requests")
+        if self._inject_faults("search", search_key(payload)):
+            return
+
+        store: FixtureStore = self.server.store
+        response = store.get_search(payload)
+        if response is None and self.server.config.record:
+            live = requests.post(LIVE_SERPER_URL, json=payload, timeout=30,
+                                 headers={"X-API-KEY": self.headers.get("X-API-KEY", ""), "Content-Type": "application/json"})
+            if live.status_code != 200:
+                self._send(live.status_code, live.content)
+                return
+            response = live.json()
+            store.put_search(payload, response)
+            self._count("search_recorded")
+        if response is None and self.server.config.synthesize:
+            response = self._synthesize_search(payload)
+            self._count("search_synthesized")
+        if response is None:
+            self._count("search_missing")
+            self._send(404, json.dumps({"message": "no recorded response for this query"}).encode('utf-8'))
+            return
+        self._send(200, json.dumps(response).encode('utf-8'))
+
+    def _synthesize_search(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        # Deterministic per query (and seed): the same company always gets the same three recorded pages
+        urls = self.server.recorded_urls
+        if not urls:
+            return {"organic": []}
+        picker = random.Random(f"{self.server.config.seed}:{search_key(payload)}")
+        picks = picker.sample(urls, min(3, len(urls)))
+        return {"searchParameters": payload,
+                "organic": [{"title": f"Result {i + 1}", "link": url, "position": i + 1} for i, url in enumerate(picks)]}
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        if parsed.path == "/__stats":
+            with self.server.stats_lock:
+                self._send(200, json.dumps(self.server.stats, indent=2).encode('utf-8'))
+            return
+        if parsed.path != "/page":
+            self._send(404, b'{"message": "not found"}')
+            return
+        url = parse_qs(parsed.query).get("url", [""])[0]
+        self._count("page_requests")
+        if self._inject_faults("page", normalise_url(url)):
+            return
+
+        store: FixtureStore = self.server.store
+        page = store.get_page(url)
+        if page is None and self.server.config.record:
+            page = self._record_page(url)
+        if page is None:
+            self._count("page_missing")
+            self._send(404, b"not recorded", "text/plain")
+            return
+        status, content_type, body = page
+        self._send(status, body, content_type or "text/html")
+
+    def _record_page(self, url: str) -> Optional[Tuple[int, str, bytes]]:
+        try:
+            with requests.get(url, headers=REQUEST_HEADERS, timeout=15, stream=True) as response:
+                body = bytearray()
+                for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                    body += chunk
+                    if len(body) >= MAX_HTML_BYTES:
+                        del body[MAX_HTML_BYTES:]
+                        break
+                page = (response.status_code, response.headers.get("Content-Type", ""), bytes(body))
+        except requests.exceptions.RequestException as e:
+            # Connection level failures aren't recorded, the client sees a 502 this time only
+            print(f"Error recording {url}: {e}")
+            self._count("page_record_errors")
+            return 502, "text/plain", str(e).encode('utf-8')
+        self.server.store.put_page(url, *page)
+        self._count("page_recorded")
+        return page
+
+
+def make_server(store: FixtureStore, config: ReplayConfig, host: str = "127.0.0.1", port: int = PORT) -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), ReplayHandler)
+    server.daemon_threads = True
+    server.store = store
+    server.config = config
+    server.recorded_urls = store.recorded_urls()
+    server.stats = {}
+    server.stats_lock = threading.Lock()
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Serper + website stand-in that records and replays traffic.")
+    parser.add_argument("--fixtures", default=FIXTURE_DIR)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--record", action="store_true", help="forward misses to the live services and save them")
+    parser.add_argument("--synthesize", action="store_true", help="answer unknown queries with recorded pages (load tests)")
+    parser.add_argument("--latency-ms", type=float, default=0, help="added to every response")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="latency is uniform in latency +/- jitter")
+    parser.add_argument("--error-rate", type=float, default=0, help="share of requests answered with a 503")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="share of requests answered with a 429")
+    parser.add_argument("--seed", type=int, default=None, help="makes latency and fault injection reproducible")
+    args = parser.parse_args()
+
+    store = FixtureStore(args.fixtures)
+    config = ReplayConfig(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                          args.record, args.synthesize, args.seed)
+    server = make_server(store, config, args.host, args.port)
+    base = f"http://{args.host}:{args.port}"
+    print(f"{'Recording' if args.record else 'Replaying'} on {base} ({len(store.page_index)} pages recorded)")
+    print(f"  export SERPER_URL={base}/search PAGE_REPLAY_URL={base}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(server.stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
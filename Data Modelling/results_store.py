@@ -0,0 +1,208 @@
+import io
+import os
+import sys
+import gzip
+import json
+import time
+import hashlib
+import argparse
+from typing import Any, Dict, Iterator, List, Tuple
+
+from Scrape_Utils import make_result_filename
+
+# zstd is optional - without it .zst files can't be read or written, but .jsonl.gz and plain .jsonl still work
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --- Configuration ---
+ZSTD_LEVEL = 10        # good ratio on markdown and still fast, 19+ is much slower for a few % more
+FORMAT_VERSION = 1
+# ---------------------
+
+# Record layout, one JSON object per line:
+#   {"type": "header", "version": 1}
+#   {"type": "page", "hash": "<sha1 of markdown>", "markdown_content": "..."}          each page once
+#   {"type": "trial", "trial_number": .., "ground_truth_data": {..}, "search_query_used": "..",
+#    "scraped_results": [{"position": .., "title": "..", "link": "..", "page": "<hash>"}]}
+# A page record is always written before the first trial that references it, so the file can be
+# read in one streaming pass. 'filename' isn't stored, it's rebuilt from position + link on read.
+
+
+def page_hash(markdown_content: str) -> str:
+    return hashlib.sha1(markdown_content.encode('utf-8')).hexdigest()
+
+
+def is_store_path(path: str) -> bool:
+    return path.endswith(('.jsonl', '.jsonl.zst', '.jsonl.gz'))
+
+
+def _open_text(path: str, mode: str):
+    """Opens a .jsonl / .jsonl.gz / .jsonl.zst file as text, mode is 'r' or 'w'."""
+    if path.endswith('.zst'):
+        if zstandard is None:
+            raise ImportError("reading/writing .zst files needs the 'zstandard' package (pip install zstandard)")
+        raw = open(path, mode + 'b')
+        if mode == 'w':
+            stream = zstandard.ZstdCompressor(level=ZSTD_LEVEL).stream_writer(raw, closefd=True)
+        else:
+            stream = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+        return io.TextIOWrapper(stream, encoding='utf-8')
+    if path.endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+class ResultsStoreWriter:
+    """
+    Writes trials in the compact store format. Page content is de-duplicated by hash, so an endole
+    listing that comes up for 30 companies is stored once.
+
+    Example:
+        with ResultsStoreWriter("scraper_results.jsonl.zst") as writer:
+            for trial in all_trials_data:
+                writer.write_trial(trial)
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = None
+        self._seen_pages = set()
+        self.trials_written = 0
+        self.pages_written = 0
+        self.page_refs = 0
+
+    def __enter__(self):
+        self._file = _open_text(self.path, 'w')
+        self._write({"type": "header", "version": FORMAT_VERSION})
+        return self
+
+    def __exit__(self, *exc):
+        self._file.close()
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(json.dumps(record, ensure_ascii=False, separators=(',', ':')) + "\n")
+
+    def write_page(self, markdown_content: str) -> str:
+        """Stores a page (if it isn't stored already) and returns its hash."""
+        digest = page_hash(markdown_content)
+        self.page_refs += 1
+        if digest not in self._seen_pages:
+            self._seen_pages.add(digest)
+            self._write({"type": "page", "hash": digest, "markdown_content": markdown_content})
+            self.pages_written += 1
+        return digest
+
+    def write_trial(self, trial: Dict[str, Any]) -> None:
+        """Takes a trial in the Search_scrape_P1 structure (markdown inlined in each scraped result)."""
+        results = []
+        for result in trial.get('scraped_results', []):
+            results.append({
+                "position": result['position'],
+                "title": result.get('title'),
+                "link": result['link'],
+                "page": self.write_page(result['markdown_content']),
+            })
+        record = {key: value for key, value in trial.items() if key != 'scraped_results'}
+        self._write({"type": "trial", **record, "scraped_results": results})
+        self.trials_written += 1
+
+
+def _iter_records(path: str) -> Iterator[Dict[str, Any]]:
+    with _open_text(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_trials(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Streams trials from a store file in the original Search_scrape_P1 structure (markdown_content
+    and filename filled back in). Only the page texts are held in memory, not the trials.
+    """
+    pages: Dict[str, str] = {}
+    for record in _iter_records(path):
+        kind = record.get("type")
+        if kind == "page":
+            pages[record["hash"]] = record["markdown_content"]
+        elif kind == "trial":
+            record.pop("type")
+            record["scraped_results"] = [{
+                "position": result["position"],
+                "title": result.get("title"),
+                "link": result["link"],
+                "filename": make_result_filename(result["position"], result["link"]),
+                "markdown_content": pages[result["page"]],
+            } for result in record["scraped_results"]]
+            yield record
+
+
+def iter_pages(path: str) -> Iterator[Tuple[str, str]]:
+    """Yields (hash, markdown_content) for every unique page in a store file, trials aren't rebuilt."""
+    for record in _iter_records(path):
+        if record.get("type") == "page":
+            yield record["hash"], record["markdown_content"]
+
+
+def load_trials(path: str) -> List[Dict[str, Any]]:
+    """Reads every trial, same result as json.load on the equivalent scraper_results JSON file."""
+    return list(iter_trials(path))
+
+
+def load_scrape_results(path: str) -> List[Dict[str, Any]]:
+    """Loads trials from either format: a store file (.jsonl[.zst|.gz]) or a legacy pretty-printed .json file."""
+    if is_store_path(path):
+        return load_trials(path)
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_scrape_results(all_trials_data: List[Dict[str, Any]], path: str) -> None:
+    """Saves trials in the format the extension asks for: store for .jsonl[.zst|.gz], legacy JSON otherwise."""
+    if is_store_path(path):
+        with ResultsStoreWriter(path) as writer:
+            for trial in all_trials_data:
+                writer.write_trial(trial)
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(all_trials_data, f, indent=2, ensure_ascii=False)
+
+
+def convert(input_path: str, output_path: str) -> None:
+    """Converts between formats (either direction) and prints the size and load time of both files."""
+    start = time.perf_counter()
+    all_trials_data = load_scrape_results(input_path)
+    input_load = time.perf_counter() - start
+
+    save_scrape_results(all_trials_data, output_path)
+
+    start = time.perf_counter()
+    reloaded = load_scrape_results(output_path)
+    output_load = time.perf_counter() - start
+    if reloaded != all_trials_data:
+        # Only expected when the input had fields the store rebuilds differently (e.g. a stale filename)
+        print("[Warn] Round trip of the converted file doesn't match the input exactly.")
+
+    in_size, out_size = os.path.getsize(input_path), os.path.getsize(output_path)
+    print(f"✅ Converted {len(all_trials_data)} trials: {input_path} -> {output_path}")
+    print(f"  size: {in_size / 1024:.0f} KB -> {out_size / 1024:.0f} KB ({in_size / out_size if out_size else 0:.1f}x smaller)")
+    print(f"  load: {input_load * 1000:.0f} ms -> {output_load * 1000:.0f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert scrape results between legacy JSON and the compact store format.")
+    parser.add_argument("input", help="e.g. scraper_results_Random_CH.json")
+    parser.add_argument("output", nargs="?", help="defaults to the input name with .jsonl.zst")
+    args = parser.parse_args()
+
+    output = args.output or os.path.splitext(args.input)[0] + ".jsonl.zst"
+    try:
+        convert(args.input, output)
+    except FileNotFoundError:
+        print(f"Error: {args.input} not found.", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
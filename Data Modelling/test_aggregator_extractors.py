@@ -0,0 +1,59 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from aggregator_extractors import extract_listed_website
+
+ENDOLE_URL = "https://open.endole.co.uk/insight/company/04644721-mapleleaf-property-developments-limited"
+
+# The contact block of a scraped endole page (scraper_results_Random_CH.json)
+ENDOLE_PAGE = """ContactCredit ReportFinancialsPeopleOwnershipLatest ActivityMutual CompaniesDocumentsRepayment History
+# Mapleleaf Property Developments Limited
+Mapleleaf Property Developments Limited is an active company incorporated on 22 January 2003.
+Stockton-On-Tees
+Durham
+TS21 3LY
+England
+[Companies in TS21 3LY](//open.endole.co.uk/explorer/postcode/ts21-3ly)
+Telephone
+Unreported
+Email
+Unreported
+Website
+{website}
+See All Contacts
+People
+Officers
+3
+"""
+
+
+def test_endole_listed_website():
+    page = ENDOLE_PAGE.format(website="[Mapleleaf-land-house.com](http://www.mapleleaf-land-house.com)")
+    found = extract_listed_website(ENDOLE_URL, page, "04644721")
+    assert found["host"] == "open.endole.co.uk"
+    assert found["website"] == "http://www.mapleleaf-land-house.com"
+    assert "no LLM call" in found["reasoning"]
+
+
+def test_endole_nothing_on_record():
+    found = extract_listed_website(ENDOLE_URL, ENDOLE_PAGE.format(website="Unreported"), "04644721")
+    assert found["website"] is None
+
+
+def test_endole_link_back_to_an_aggregator_is_left_to_the_llm():
+    page = ENDOLE_PAGE.format(website="[Endole](https://open.endole.co.uk/insight/company/04644721)")
+    assert extract_listed_website(ENDOLE_URL, page, "04644721") is None
+
+
+def test_page_must_be_about_the_company():
+    page = ENDOLE_PAGE.format(website="Unreported")
+    assert extract_listed_website("https://open.endole.co.uk/insight/company/01234567-other-ltd", page, "01234567") is not None
+    assert extract_listed_website("https://open.endole.co.uk/insight/company/01234567-other-ltd", page, "07654321") is None
+
+
+def test_labelled_aggregators_and_unknown_hosts():
+    page = "Acme Ltd\nCompany number 01234567\n**Website:** acme.co.uk\n"
+    assert extract_listed_website("https://www.bizdb.co.uk/company/acme", page, "01234567")["website"] == "http://acme.co.uk"
+    assert extract_listed_website("https://companycheck.co.uk/company/01234567", "Website\n\nn/a", "01234567")["website"] is None
+    assert extract_listed_website("https://www.acme.co.uk/about", page, "01234567") is None
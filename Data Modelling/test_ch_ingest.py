@@ -0,0 +1,59 @@
+import os
+import sys
+import zipfile
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from ch_ingest import expand_paths, ingest_to_parquet, read_companies, sample_companies, zip_members
+
+# CH headers have stray leading spaces, which ch_ingest strips
+HEADER = "CompanyName, CompanyNumber,RegAddress.PostCode\n"
+
+
+def rows(start, count):
+    return "".join(f"COMPANY {i} LTD,{i:08d},AB{i % 9} 1CD\n" for i in range(start, start + count))
+
+
+@pytest.fixture
+def download(tmp_path):
+    """The multi-part zip layout: two parts, one CSV member each, plus a stray non-CSV member."""
+    for part, start in ((1, 0), (2, 40)):
+        with zipfile.ZipFile(tmp_path / f"BasicCompanyData-2025-10-01-part{part}_2.zip", "w") as zf:
+            zf.writestr(f"BasicCompanyData-2025-10-01-part{part}_2.csv", HEADER + rows(start, 40))
+            zf.writestr("readme.txt", "not data")
+    return str(tmp_path / "BasicCompanyData-*-part*.zip")
+
+
+def test_members_and_paths(download, tmp_path):
+    members = zip_members([download])
+    assert [name for _, name in members] == ["BasicCompanyData-2025-10-01-part1_2.csv", "BasicCompanyData-2025-10-01-part2_2.csv"]
+    plain = str(tmp_path / "plain.csv")
+    assert zip_members([plain]) == [(plain, None)]
+    assert expand_paths([download, download, plain]) == sorted(p for p, _ in members) + [plain]
+
+
+def test_read_companies(download):
+    df = read_companies([download], workers=2, chunk_rows=7)
+    assert list(df.columns) == ["CompanyName", "CompanyNumber", "RegAddress.PostCode"]
+    assert len(df) == 80 and df["CompanyNumber"].iloc[0] == "00000000"  # strings, leading zeros kept
+    assert list(read_companies([download], workers=1, columns=["CompanyNumber"]).columns) == ["CompanyNumber"]
+
+
+def test_sample_is_reproducible_and_without_repeats(download):
+    sample = sample_companies([download], n=10, seed=3, workers=2, chunk_rows=7)
+    assert len(sample) == 10 and sample["CompanyNumber"].is_unique
+    assert "_sample_key" not in sample
+    again = sample_companies([download], n=10, seed=3, workers=1, chunk_rows=13)
+    assert sample["CompanyNumber"].tolist() == again["CompanyNumber"].tolist()
+    assert len(sample_companies([download], n=500, seed=3, workers=1)) == 80
+
+
+def test_parquet_store(download, tmp_path):
+    pytest.importorskip("pyarrow")
+    store = str(tmp_path / "store")
+    counts = ingest_to_parquet([download], store, workers=2, chunk_rows=7)
+    assert sorted(counts.values()) == [40, 40]
+    df = pd.read_parquet(store)
+    assert len(df) == 80 and df["CompanyNumber"].str.len().eq(8).all()
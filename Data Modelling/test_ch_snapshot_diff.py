@@ -0,0 +1,72 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# The snapshot diff lives with the data preparation scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data Preparation"))
+from CH_Snapshot_Diff import diff_snapshots, latest_hash_index
+
+HEADER = "CompanyName, CompanyNumber,CompanyStatus,RegAddress.PostCode,Accounts.NextDueDate\n"
+
+
+def write_snapshot(path, companies):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(HEADER + "".join(",".join(row) + "\n" for row in companies))
+    return str(path)
+
+
+@pytest.fixture
+def snapshots(tmp_path):
+    old = write_snapshot(tmp_path / "BasicCompanyDataAsOneFile-2025-09-01.csv", [
+        ("ACME LTD", "1234", "Active", "AB1 2CD", "2026-01-01"),
+        ("BETA LTD", "00002345", "Active", "EF3 4GH", "2026-01-01"),
+        ("GAMMA LTD", "00003456", "Active", "IJ5 6KL", "2026-01-01"),
+        ("DELTA LTD", "00004567", "Active", "MN7 8OP", "2026-01-01"),
+    ])
+    new = write_snapshot(tmp_path / "BasicCompanyDataAsOneFile-2025-10-01.csv", [
+        ("ACME LTD", "00001234", "Active", "AB1 2CD", "2027-01-01"),       # only a filing date moved
+        ("BETA LTD", "00002345", "Liquidation", "EF3 4GH", "2026-01-01"),  # status changed
+        ("DELTA LTD", "00004567", "Active", " MN7 8OP ", "2026-01-01"),    # same after stripping
+        ("EPSILON LTD", "00005678", "Active", "QR9 0ST", "2026-01-01"),    # new
+    ])
+    return old, new
+
+
+COLUMNS = ["CompanyName", "CompanyStatus", "RegAddress.PostCode"]
+
+
+def test_add_change_remove_counts(snapshots, tmp_path):
+    old, new = snapshots
+    diff_dir = str(tmp_path / "diffs")
+    result = diff_snapshots(new, old, diff_dir, COLUMNS, chunk_rows=2)
+    assert result["snapshot"] == "2025-10-01"
+    assert result["counts"] == {"added": 1, "changed": 1, "unchanged": 2, "removed": 1}
+
+    changed = pd.read_csv(result["changed_csv"], dtype=str)
+    assert changed.set_index("CompanyNumber")["change"].to_dict() == {"00002345": "changed", "00005678": "added"}
+    assert pd.read_csv(result["removed_csv"], dtype=str)["CompanyNumber"].tolist() == ["00003456"]
+
+
+def test_saved_index_is_next_months_previous(snapshots, tmp_path):
+    old, new = snapshots
+    diff_dir = str(tmp_path / "diffs")
+    first = diff_snapshots(old, None, diff_dir, COLUMNS)
+    assert first["counts"] == {"added": 4, "changed": 0, "unchanged": 0, "removed": 0}
+    assert latest_hash_index(diff_dir, "2025-10-01") == first["hash_index"]
+    assert latest_hash_index(diff_dir, "2025-09-01") is None
+
+    from_index = diff_snapshots(new, first["hash_index"], diff_dir, COLUMNS)
+    assert from_index["counts"] == diff_snapshots(new, old, str(tmp_path / "csv"), COLUMNS)["counts"]
+
+
+def test_all_columns_sees_filing_changes_and_rejects_mismatched_index(snapshots, tmp_path):
+    old, new = snapshots
+    diff_dir = str(tmp_path / "diffs")
+    result = diff_snapshots(new, old, diff_dir, None)
+    assert result["counts"]["changed"] == 2  # ACME's next due date counts now
+    index = diff_snapshots(old, None, str(tmp_path / "first"), COLUMNS)["hash_index"]
+    with pytest.raises(ValueError):
+        diff_snapshots(new, index, diff_dir, None)
@@ -0,0 +1,86 @@
+import os
+import sys
+
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from company_triage import DEFAULT_HIT_RATE, HitRates, triage, triage_chunk
+from results_store import save_scrape_results
+
+TODAY = pd.Timestamp("2025-10-01")
+
+
+def company(number, status="Active", account="SMALL", category="Private Limited Company", sic="62020 - Software",
+            incorporated="01/01/2015", accounts="31/12/2024"):
+    return {"CompanyName": f"COMPANY {number} LTD", "CompanyNumber": number, "CompanyStatus": status,
+            "CompanyCategory": category, "Accounts.AccountCategory": account, "SICCode.SicText_1": sic,
+            "IncorporationDate": incorporated, "Accounts.LastMadeUpDate": accounts}
+
+
+def test_hit_rates_are_smoothed():
+    rates = HitRates()
+    assert rates.rate("62020") == DEFAULT_HIT_RATE
+    rates.add(["62020"], True)
+    rates.add(["62020"], True)
+    rates.add(["56101"], False)
+    assert DEFAULT_HIT_RATE < rates.rate("62020") < 1    # two hits don't make it 100%
+    assert rates.rate("56101") < rates.overall()
+    assert rates.rate("62090") == rates.tables()[1]["62"]  # unseen code falls back to its division
+    assert rates.rate("") == min([rates.overall(), *rates.tables()[0].values()])
+
+
+def test_filters_count_each_drop_once():
+    chunk = pd.DataFrame([
+        company("00000001"),
+        company("00000002", status="Dissolved", account="DORMANT"),
+        company("00000003", account="DORMANT"),
+        company("00000004", category="Limited Partnership"),
+        company("00000005", sic="99999 - Dormant Company"),
+        company("00000006", incorporated="01/08/2025", accounts=""),
+        company("00000007", accounts="31/12/2020"),
+        company("00000008", accounts=""),
+        company("00000009"),
+    ])
+    kept, dropped = triage_chunk(chunk, HitRates().tables(), TODAY, {"00000009"})
+    assert kept["CompanyNumber"].tolist() == ["00000001"]
+    assert dropped == {"already_searched": 1, "status": 1, "account_category": 1, "company_category": 1,
+                       "dormant_sic": 1, "too_new": 1, "stale_accounts": 2}
+
+
+def test_ranking_uses_history(tmp_path):
+    results = str(tmp_path / "results.json")
+    save_scrape_results([
+        {"trial_number": i, "ground_truth_data": {"company_number": str(i), "sic_code_no": sic}, "scraped_results": []}
+        for i, sic in enumerate(["62020", "62020", "62020", "56101", "56101"], start=1)
+    ], results)
+    analysis = str(tmp_path / "analysis.csv")
+    pd.DataFrame({"company_number": ["1", "2", "4"], "llm_is_entity1_website": [True, True, False]}).to_csv(analysis, index=False)
+    rates = HitRates.from_history([results], [analysis])
+    assert (rates.companies, rates.hits) == (5, 2)
+    assert rates.searched == {f"{i:08d}" for i in range(1, 6)}
+    assert rates.rate("62020") > rates.rate("56101")
+
+    rows = [company(f"{i:08d}", sic="56101 - Restaurants") for i in range(10, 40)]
+    rows += [company(f"{i:08d}") for i in range(40, 50)]
+    rows += [company("00000001")]  # searched before
+    csv = str(tmp_path / "companies.csv")
+    pd.DataFrame(rows).to_csv(csv, index=False)
+    top, stats = triage([csv], rates, top_n=10, workers=1, chunk_rows=7, seed=1)
+    assert sorted(top["CompanyNumber"]) == [f"{i:08d}" for i in range(40, 50)]
+    assert (stats["rows"], stats["kept"], stats["dropped"]["already_searched"]) == (41, 40, 1)
+    again, _ = triage([csv], rates, top_n=10, workers=1, chunk_rows=13, seed=1)
+    assert again["CompanyNumber"].tolist() == top["CompanyNumber"].tolist()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_ties_are_broken_reproducibly(tmp_path, workers):
+    paths = []
+    for part in range(2):
+        path = str(tmp_path / f"part{part}.csv")
+        pd.DataFrame([company(f"{part}{i:07d}") for i in range(50)]).to_csv(path, index=False)
+        paths.append(path)
+    first, _ = triage(paths, HitRates(), top_n=15, workers=workers, seed=5)
+    second, _ = triage(paths, HitRates(), top_n=15, workers=1, seed=5)
+    assert first["CompanyNumber"].tolist() == second["CompanyNumber"].tolist()
+    assert len(set(first["CompanyNumber"])) == 15
@@ -0,0 +1,79 @@
+import os
+import sys
+from urllib.parse import urlparse
+
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+# The streaming EDA engine lives with the data exploration scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "Data Exploration"))
+from crawl_eda_engine import scan
+
+
+def pandas_summary(df):
+    """The original whole-file Common_Crawl_EDA computation, as the reference."""
+    df = df.dropna(subset=['url', 'content'])
+    total_pages = len(df)
+    total_words = df['content'].apply(lambda x: len(str(x).split())).sum()
+    total_chars = df['content'].apply(lambda x: len(str(x))).sum()
+    pages_per_website = df.groupby('parent_url').size()
+    return {
+        'total_pages': total_pages,
+        'total_words': total_words,
+        'total_characters': total_chars,
+        'average_words_per_page': total_words / total_pages if total_pages else 0,
+        'average_chars_per_page': total_chars / total_pages if total_pages else 0,
+        'top_domains': df['url'].apply(lambda x: urlparse(str(x)).netloc).value_counts().head(10).to_dict(),
+        'duplicate_pages': df.duplicated(subset=['url']).sum(),
+        'unique_websites': df['parent_url'].nunique(),
+        'info_pages_count': df['is_info_page'].sum(),
+        'short_pages_count': df['content'].apply(lambda x: len(str(x).split()) < 50).sum(),
+        'website_distribution_summary': {
+            'max_pages_per_site': pages_per_website.max(),
+            'min_pages_per_site': pages_per_website.min(),
+            'median_pages_per_site': pages_per_website.median(),
+            'mean_pages_per_site': pages_per_website.mean(),
+        },
+    }
+
+
+@pytest.fixture
+def crawl(tmp_path):
+    rng = np.random.default_rng(7)
+    n = 3000
+    # Site i gets a share of pages proportional to i, so the top domain counts don't tie
+    sites = rng.choice(12, size=n, p=np.arange(1, 13) / 78)
+    urls = [f"https://www.site{s}.co.uk/page{rng.integers(0, 400)}" for s in sites]
+    urls[10] = "site3.co.uk/no-scheme"  # urlparse gives no netloc without a scheme
+    words = rng.integers(0, 120, size=n)
+    content = [" ".join(["word"] * w) + ("\n\tend" if w % 7 == 0 else "") for w in words]
+    df = pd.DataFrame({
+        "url": urls,
+        "content": content,
+        "parent_url": [f"https://www.site{s}.co.uk" for s in sites],
+        "is_info_page": rng.random(n) < 0.2,
+    })
+    df.loc[rng.choice(n, 40, replace=False), "content"] = np.nan
+    df.loc[rng.choice(n, 30, replace=False), "parent_url"] = np.nan
+    df.loc[5, "url"] = np.nan
+    paths = [str(tmp_path / "df2024-a.csv"), str(tmp_path / "df2024-b.csv")]
+    df.iloc[:1700].to_csv(paths[0], index=False)
+    df.iloc[1700:].to_csv(paths[1], index=False)
+    return paths, pd.concat([pd.read_csv(path) for path in paths], ignore_index=True)
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_matches_pandas_summary(crawl, workers):
+    paths, df = crawl
+    expected = pandas_summary(df)
+    total = scan(paths, chunk_rows=250, workers=workers)
+    summary = total.summary()
+    assert total.rows_read == len(df)
+    assert summary.keys() == expected.keys()
+    for key in ('total_pages', 'total_words', 'total_characters', 'duplicate_pages', 'unique_websites',
+                'info_pages_count', 'short_pages_count', 'top_domains', 'website_distribution_summary'):
+        assert summary[key] == expected[key], key
+    assert summary['average_words_per_page'] == pytest.approx(expected['average_words_per_page'])
+    assert summary['average_chars_per_page'] == pytest.approx(expected['average_chars_per_page'])
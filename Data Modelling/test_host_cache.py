@@ -0,0 +1,78 @@
+import os
+import ssl
+import sys
+import socket
+
+import pytest
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from host_cache import HostNegativeCache, classify_exception, classify_status, get_host
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.exceptions.HTTPError(response=response)
+
+
+@pytest.mark.parametrize("exc", [
+    requests.exceptions.TooManyRedirects(),
+    requests.exceptions.ChunkedEncodingError(),
+    requests.exceptions.InvalidURL(),
+    requests.exceptions.ContentDecodingError(),
+    requests.exceptions.MissingSchema(),
+    OSError("disk full"),
+    ValueError("bad page"),
+])
+def test_page_level_errors_dont_blame_the_host(exc):
+    assert classify_exception(exc) is None
+
+
+@pytest.mark.parametrize("exc", [
+    requests.exceptions.ConnectionError("refused"),
+    requests.exceptions.SSLError("bad certificate"),
+    ConnectionResetError(),
+    ssl.SSLError(),
+])
+def test_connection_failures(exc):
+    assert classify_exception(exc) == "connection"
+
+
+def test_aiohttp_connector_errors():
+    aiohttp = pytest.importorskip("aiohttp")
+    assert classify_exception(aiohttp.ServerDisconnectedError()) == "connection"
+    assert classify_exception(aiohttp.ClientPayloadError("truncated")) is None
+
+
+def test_timeouts_dns_and_status():
+    assert classify_exception(requests.exceptions.ReadTimeout()) == "timeout"
+    assert classify_exception(socket.timeout()) == "timeout"
+    wrapped = requests.exceptions.ConnectionError("failed")
+    wrapped.__cause__ = socket.gaierror(-2, "Name or service not known")
+    assert classify_exception(wrapped) == "dns"
+    assert classify_exception(http_error(403)) == "forbidden"
+    assert classify_exception(http_error(404)) is None
+    assert [classify_status(s) for s in (401, 429, 503, 410)] == ["forbidden", "rate_limited", "server_error", None]
+
+
+def test_backoff_skips_host_until_success(tmp_path):
+    cache = HostNegativeCache(str(tmp_path / "hosts.json"))
+    url = "https://www.example.co.uk/about"
+    assert get_host(url) == "example.co.uk"
+    cache.record_exception(url, requests.exceptions.TooManyRedirects())
+    assert not cache.should_skip(url)
+    cache.record_exception(url, requests.exceptions.ConnectionError("refused"))
+    assert cache.should_skip("http://example.co.uk/contact")
+    assert cache.failure_class(url) == "connection"
+    cache.save()
+    assert HostNegativeCache.load(cache.path).should_skip(url)
+    cache.record_success(url)
+    assert not cache.should_skip(url)
+
+
+def test_aggregators_are_deprioritised_not_skipped(tmp_path):
+    cache = HostNegativeCache(str(tmp_path / "hosts.json"))
+    url = "https://open.endole.co.uk/insight/company/01234567"
+    assert not cache.should_skip(url)
+    assert cache.priority(url) == 1
@@ -0,0 +1,62 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from llm_schema import MATCH_SCHEMA, REJECTION_SCHEMA, ask_structured, parse_structured, validate
+
+VALID = {"is_entity1_website": True, "official_url": "https://acme.co.uk", "found_embedded_link": False,
+         "embedded_url": None, "confidence": 0.9, "reasoning": "name and number match"}
+
+
+def reply(**changes):
+    return json.dumps({**VALID, **changes})
+
+
+def test_valid_reply_parses():
+    assert parse_structured(reply(), MATCH_SCHEMA) == (VALID, None)
+    assert parse_structured("```json\n" + reply() + "\n```", MATCH_SCHEMA) == (VALID, None)
+
+
+def test_schema_violations():
+    assert validate({k: v for k, v in VALID.items() if k != "reasoning"}, MATCH_SCHEMA) == "missing required field 'reasoning'"
+    assert validate({**VALID, "is_entity1_website": "yes"}, MATCH_SCHEMA) == "is_entity1_website must be a boolean"
+    assert validate({**VALID, "confidence": 1.5}, MATCH_SCHEMA) == "confidence must be between 0 and 1"
+    assert validate({**VALID, "confidence": True}, MATCH_SCHEMA) == "confidence must be a number"
+    assert validate({**VALID, "reasoning": None}, MATCH_SCHEMA) == "reasoning must not be null"
+    rejection = {"should_reject": True, "rejection_reasons": ["ok", 3], "reasoning": ""}
+    assert validate(rejection, REJECTION_SCHEMA) == "rejection_reasons[1] must be a string"
+    value, error = parse_structured("Sure! Here is the JSON", MATCH_SCHEMA)
+    assert value is None and error.startswith("reply is not valid JSON")
+
+
+def test_invalid_reply_is_reasked_with_the_error():
+    prompts = []
+    replies = iter([reply(confidence=7), reply()])
+
+    def generate(prompt):
+        prompts.append(prompt)
+        return next(replies)
+
+    answer, value, error = ask_structured(generate, "Is this the website?", MATCH_SCHEMA)
+    assert (value, error) == (VALID, None)
+    assert len(prompts) == 2
+    assert prompts[1].startswith("Is this the website?")
+    assert "confidence must be between 0 and 1" in prompts[1]
+
+
+def test_reask_limit_and_call_errors():
+    calls = []
+
+    def generate(prompt):
+        calls.append(prompt)
+        return "not json"
+
+    answer, value, error = ask_structured(generate, "prompt", MATCH_SCHEMA, max_reasks=2)
+    assert value is None and error and len(calls) == 3
+    calls.clear()
+    assert ask_structured(generate, "prompt", MATCH_SCHEMA, max_reasks=0)[1] is None and len(calls) == 1
+
+    failed = []
+    answer, value, error = ask_structured(lambda p: failed.append(p) or "ERROR", "prompt", MATCH_SCHEMA)
+    assert answer == "ERROR" and value is None and len(failed) == 1  # failed calls aren't re-asked
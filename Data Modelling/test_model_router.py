@@ -0,0 +1,102 @@
+import os
+import sys
+import json
+import types
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import Matching_P1
+from model_router import ModelRouter
+
+TIERS = ["lite", "flash", "pro"]
+
+
+def verdict(confidence=None, accepted=False, parse_success=True):
+    return {"is_entity1_website": accepted, "official_url": None, "found_embedded_link": False,
+            "embedded_url": None, "reasoning": "", "confidence": confidence, "parse_success": parse_success}
+
+
+def router():
+    return ModelRouter(tiers=TIERS, quotas={}, conflict_rules=[])
+
+
+def test_malformed_escalation_keeps_parsed_low_confidence_verdict():
+    replies = {
+        "lite": ('{"is_entity1_website": true, "confidence": 0.5}', verdict(0.5, accepted=True)),
+        "flash": ("not json at all", verdict(parse_success=False)),
+        "pro": ("ERROR", verdict(parse_success=False)),
+    }
+    answer, parsed, model, escalation = router().route(lambda model, acquire: replies[model], False, False)
+    assert model == "lite"
+    assert answer == replies["lite"][0]
+    assert parsed["parse_success"] and parsed["is_entity1_website"]
+    assert escalation == "low_confidence;parse_failure;error"
+
+
+def test_escalated_verdict_that_parses_replaces_the_lower_tier():
+    replies = {
+        "lite": ("lite reply", verdict(0.5, accepted=True)),
+        "flash": ("flash reply", verdict(0.9, accepted=False)),
+    }
+    answer, parsed, model, escalation = router().route(lambda model, acquire: replies[model], False, False)
+    assert (answer, model, escalation) == ("flash reply", "flash", "low_confidence")
+    assert not parsed["is_entity1_website"]
+
+
+def test_first_tier_parse_failure_escalates():
+    replies = {
+        "lite": ("garbage", verdict(parse_success=False)),
+        "flash": ("flash reply", verdict(0.95)),
+    }
+    _, parsed, model, escalation = router().route(lambda model, acquire: replies[model], False, False)
+    assert (model, escalation) == ("flash", "parse_failure")
+    assert parsed["parse_success"]
+
+
+class ScriptedModels:
+    """generate_content stand-in replying (or raising) from a script, one entry per request sent."""
+
+    def __init__(self, script):
+        self.script = list(script)
+        self.requests = 0
+
+    def generate_content(self, model, contents, config=None):
+        self.requests += 1
+        reply = self.script.pop(0)
+        if isinstance(reply, Exception):
+            raise reply
+        return types.SimpleNamespace(text=reply, usage_metadata=None)
+
+
+def scripted_client(script):
+    return types.SimpleNamespace(models=ScriptedModels(script))
+
+
+VALID = json.dumps({"is_entity1_website": True, "official_url": "https://acme.co.uk", "found_embedded_link": False,
+                    "embedded_url": None, "confidence": 0.95, "reasoning": "name and postcode on the page"})
+
+
+def test_reask_and_429_retry_each_take_a_quota_slot(monkeypatch):
+    monkeypatch.setattr(Matching_P1, "LLM_RATE_LIMIT_WAIT", 0)
+    client = scripted_client(["not json", RuntimeError("429 RESOURCE_EXHAUSTED"), VALID])
+    quotas = {"lite": {"max_calls": 10}}
+    routed = ModelRouter(tiers=["lite"], quotas=quotas, conflict_rules=[])
+    _, parsed, model, escalation = Matching_P1.route_llm_answer(client, routed, "prompt", False, False)
+    assert (model, escalation, parsed["parse_success"]) == ("lite", "", True)
+    assert client.models.requests == 3
+    assert routed.quotas["lite"].calls == 3
+
+
+def test_max_calls_stops_the_reask():
+    client = scripted_client(["not json", VALID])
+    routed = ModelRouter(tiers=["lite"], quotas={"lite": {"max_calls": 1}}, conflict_rules=[])
+    answer, parsed, _, _ = Matching_P1.route_llm_answer(client, routed, "prompt", False, False)
+    assert client.models.requests == 1
+    assert routed.quotas["lite"].calls == 1
+    assert answer == "ERROR" and not parsed["parse_success"]
+
+
+def test_exhausted_tier_is_skipped_without_asking():
+    routed = ModelRouter(tiers=["lite", "flash"], quotas={"lite": {"max_calls": 0}}, conflict_rules=[])
+    asked = []
+    routed.route(lambda model, acquire: (asked.append(model), ("reply", verdict(0.9)))[1], False, False)
+    assert asked == ["flash"]
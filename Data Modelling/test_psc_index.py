@@ -0,0 +1,69 @@
+import os
+import sys
+import json
+import zipfile
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from Matching_P1 import check_md_match
+from psc_index import PscIndex, build_index, parse_psc_line
+
+
+def psc_line(number, name=None, forename=None, surname=None, kind="individual-person-with-significant-control", ceased_on=None):
+    data = {"kind": kind}
+    if name:
+        data["name"] = name
+    if surname:
+        data["name_elements"] = {"forename": forename, "surname": surname}
+    if ceased_on:
+        data["ceased_on"] = ceased_on
+    return json.dumps({"company_number": number, "data": data})
+
+
+def test_parse_psc_line():
+    assert parse_psc_line(psc_line("1234", "Mr John Michael Smith", "John", "Smith")) == ("00001234", "John Smith", "individual-person-with-significant-control")
+    assert parse_psc_line(psc_line("01234567", "ACME HOLDINGS  LIMITED", kind="corporate-entity-person-with-significant-control"))[1] == "ACME HOLDINGS LIMITED"
+    assert parse_psc_line(psc_line("01234567", "Jane Doe", ceased_on="2020-01-01")) is None
+    assert parse_psc_line(json.dumps({"company_number": "01234567", "data": {"kind": "persons-with-significant-control-statement"}})) is None
+    assert parse_psc_line("not json") is None
+
+
+def test_index_round_trip(tmp_path):
+    lines = [psc_line("01234567", forename="Zoe", surname="Young"), psc_line("01234567", forename="Adam", surname="Ash"),
+             psc_line("01234567", forename="Adam", surname="Ash"), psc_line("07654321", "BETA GROUP LTD")]
+    path = tmp_path / "psc.zip"
+    with zipfile.ZipFile(path, "w") as zf:
+        zf.writestr("psc-snapshot-part1.txt", "\n".join(lines[:2]) + "\n")
+        zf.writestr("psc-snapshot-part2.txt", "\n".join(lines[2:]) + "\n")
+    db_path = str(tmp_path / "psc.sqlite")
+    assert build_index([str(path)], db_path, workers=2) == 4
+
+    psc = PscIndex.load(db_path)
+    company = psc.add_evidence({"company_number": "1234567"})
+    assert company["psc_names"] == ["Adam Ash", "Zoe Young"]  # de-duplicated, stable order
+    assert psc.names("01234567", limit=1) == ["Adam Ash"]
+    assert psc.names("99999999") == []
+    psc.close()
+    assert PscIndex.load(str(tmp_path / "missing.sqlite")) is None
+
+
+def test_psc_name_alone_is_not_a_match():
+    page = "Meet our founder John Smith, who started the business in 1998."
+    assert not check_md_match(page, "ACME WIDGETS LIMITED", "AB1 2CD", ["John Smith"])
+
+
+def test_psc_name_only_matches_whole_words():
+    page = "Acme Widgets is run by Joann Leeds."
+    assert not check_md_match(page, "ACME WIDGETS LIMITED", "AB1 2CD", ["Ann Lee"])
+
+
+def test_psc_name_with_trading_name_is_a_match():
+    page = "Acme Widgets is run by John Smith."
+    assert check_md_match(page, "ACME WIDGETS LIMITED", "AB1 2CD", ["John Smith"])
+    assert not check_md_match(page, "ACME WIDGETS LIMITED", "AB1 2CD")
+    # Aggregator listings are still excluded
+    assert not check_md_match(page + " Source: open.endole.co.uk", "ACME WIDGETS LIMITED", "AB1 2CD", ["John Smith"])
+
+
+def test_company_name_or_postcode_still_match_without_psc():
+    assert check_md_match("Welcome to Acme Widgets Limited", "ACME WIDGETS LIMITED", "AB1 2CD")
+    assert check_md_match("Find us at AB1 2CD", "ACME WIDGETS LIMITED", "AB1 2CD")
@@ -0,0 +1,52 @@
+import os
+import sys
+import json
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from results_store import ResultsStoreWriter, iter_pages, load_scrape_results, save_scrape_results
+from Scrape_Utils import make_result_filename
+
+LISTING = "# Acme Ltd\nWebsite\nUnreported"
+
+
+def result(position, link, markdown_content):
+    return {"position": position, "title": f"Result {position}", "link": link,
+            "filename": make_result_filename(position, link), "markdown_content": markdown_content}
+
+
+def trials():
+    shared = "https://open.endole.co.uk/insight/company/01234567-acme-ltd"
+    return [
+        {"trial_number": 1, "ground_truth_data": {"company_name": "ACME LTD", "company_number": "01234567"},
+         "search_query_used": "ACME LTD 01234567",
+         "scraped_results": [result(1, "https://www.acme.co.uk/", "# Acme\nWelcome, café"), result(2, shared, LISTING)]},
+        {"trial_number": 2, "ground_truth_data": {"company_name": "ACME HOLDINGS LTD", "company_number": "07654321"},
+         "search_query_used": "ACME HOLDINGS LTD 07654321",
+         "scraped_results": [result(1, shared, LISTING)]},
+        {"trial_number": 3, "ground_truth_data": {"company_name": "EMPTY LTD", "company_number": "00000001"},
+         "search_query_used": "EMPTY LTD 00000001", "scraped_results": []},
+    ]
+
+
+@pytest.mark.parametrize("name", ["results.json", "results.jsonl", "results.jsonl.gz", "results.jsonl.zst"])
+def test_round_trip(tmp_path, name):
+    if name.endswith(".zst"):
+        pytest.importorskip("zstandard")
+    path = str(tmp_path / name)
+    save_scrape_results(trials(), path)
+    assert load_scrape_results(path) == trials()
+
+
+def test_pages_are_stored_once(tmp_path):
+    path = str(tmp_path / "results.jsonl")
+    with ResultsStoreWriter(path) as writer:
+        for trial in trials():
+            writer.write_trial(trial)
+    assert (writer.trials_written, writer.pages_written, writer.page_refs) == (3, 2, 3)
+    assert sorted(markdown for _, markdown in iter_pages(path)) == sorted(["# Acme\nWelcome, café", LISTING])
+    with open(path, encoding="utf-8") as f:
+        records = [json.loads(line) for line in f]
+    assert records[0] == {"type": "header", "version": 1}
+    assert "filename" not in records[-2]["scraped_results"][0]  # rebuilt from position + link on read
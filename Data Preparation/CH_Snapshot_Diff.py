@@ -0,0 +1,164 @@
+import os
+import re
+import sys
+import glob
+import argparse
+from typing import Iterator, List, Optional
+
+import pandas as pd
+
+# --- Configuration ---
+DIFF_DIR = "ch_diffs"           # <snapshot>.hashes.csv index plus the changed/removed lists per snapshot
+CHUNK_ROWS = 200_000
+# Only the fields that feed search and matching are hashed, so routine filings (next due dates,
+# mortgage counts, confirmation statements) don't send a company back through the pipeline.
+# --all-columns hashes every field instead.
+HASH_COLUMNS = [
+    "CompanyName", "CompanyStatus",
+    "RegAddress.AddressLine1", "RegAddress.AddressLine2", "RegAddress.PostTown", "RegAddress.PostCode",
+    "SICCode.SicText_1", "SICCode.SicText_2", "SICCode.SicText_3", "SICCode.SicText_4",
+]
+# ---------------------
+
+
+def snapshot_name(path: str) -> str:
+    """The snapshot date from a CH file name (BasicCompanyDataAsOneFile-2025-10-01.csv), else the file stem."""
+    match = re.search(r'(\d{4}-\d{2}-\d{2})', os.path.basename(path))
+    return match.group(1) if match else os.path.splitext(os.path.basename(path))[0]
+
+
+def read_snapshot(path: str, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """The snapshot in chunks of strings, with the stray leading spaces stripped from CH headers (' CompanyNumber')."""
+    for chunk in pd.read_csv(path, chunksize=chunk_rows, dtype=str, keep_default_na=False):
+        chunk.columns = chunk.columns.str.strip()
+        chunk["CompanyNumber"] = chunk["CompanyNumber"].str.strip().str.zfill(8)
+        yield chunk
+
+
+def row_hashes(chunk: pd.DataFrame, columns: Optional[List[str]]) -> pd.Series:
+    """64-bit hash of each company's hashed fields, indexed by CompanyNumber."""
+    fields = chunk.drop(columns=["CompanyNumber"]) if columns is None else chunk.reindex(columns=columns)
+    fields = fields.fillna("").apply(lambda column: column.str.strip())
+    hashes = pd.util.hash_pandas_object(fields, index=False)
+    hashes.index = chunk["CompanyNumber"].to_numpy()
+    return hashes
+
+
+def _columns_label(columns: Optional[List[str]]) -> str:
+    return "all" if columns is None else ",".join(columns)
+
+
+def save_hash_index(hashes: pd.Series, path: str, columns: Optional[List[str]]) -> None:
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        # The hashes are only comparable between snapshots hashed over the same fields
+        f.write(f"# columns: {_columns_label(columns)}\n")
+        hashes.rename_axis("CompanyNumber").rename("row_hash").to_csv(f, header=True)
+    os.replace(tmp_path, path)
+
+
+def load_hash_index(path: str, columns: Optional[List[str]], chunk_rows: int = CHUNK_ROWS) -> pd.Series:
+    """A saved <snapshot>.hashes.csv index, or the hashes of a full snapshot CSV."""
+    if not path.endswith(".hashes.csv"):
+        print(f"Hashing previous snapshot {path}...")
+        return pd.concat([row_hashes(chunk, columns) for chunk in read_snapshot(path, chunk_rows)])
+
+    with open(path, 'r', encoding='utf-8') as f:
+        label = f.readline().strip().removeprefix("# columns: ")
+    if label != _columns_label(columns):
+        raise ValueError(f"{path} was hashed over different columns ({label}), diff against the full snapshot CSV instead")
+    index = pd.read_csv(path, comment="#", dtype={"CompanyNumber": str, "row_hash": "uint64"})
+    return pd.Series(index["row_hash"].to_numpy(), index=index["CompanyNumber"].to_numpy())
+
+
+def latest_hash_index(diff_dir: str, before: str) -> Optional[str]:
+    """The newest saved index older than the snapshot being diffed."""
+    paths = [path for path in sorted(glob.glob(os.path.join(diff_dir, "*.hashes.csv")))
+             if os.path.basename(path)[:-len(".hashes.csv")] < before]
+    return paths[-1] if paths else None
+
+
+def diff_snapshots(new_path: str, previous: Optional[str], diff_dir: str = DIFF_DIR,
+                   columns: Optional[List[str]] = HASH_COLUMNS, chunk_rows: int = CHUNK_ROWS) -> dict:
+    """
+    Compares a new snapshot with the previous one by CompanyNumber and row hash in one chunked pass.
+    Writes to diff_dir:
+      changed_companies_<snapshot>.csv - full rows (stripped headers) of added and changed companies,
+                                         plus a 'change' column; feed it to Search_scrape_P1 --companies
+      removed_companies_<snapshot>.csv - company numbers no longer in the register
+      <snapshot>.hashes.csv            - this snapshot's hash index, the 'previous' for next month
+    With no previous snapshot every company counts as added.
+    """
+    snapshot = snapshot_name(new_path)
+    os.makedirs(diff_dir, exist_ok=True)
+    old = load_hash_index(previous, columns, chunk_rows) if previous else pd.Series(dtype="uint64")
+    old = old[~old.index.duplicated(keep="last")]
+
+    changed_path = os.path.join(diff_dir, f"changed_companies_{snapshot}.csv")
+    tmp_path = changed_path + ".tmp"
+    counts = {"added": 0, "changed": 0, "unchanged": 0}
+    new_hashes = []
+    with open(tmp_path, 'w', encoding='utf-8', newline='') as f:
+        for i, chunk in enumerate(read_snapshot(new_path, chunk_rows)):
+            hashes = row_hashes(chunk, columns)
+            new_hashes.append(hashes)
+            known = hashes.index.isin(old.index)
+            # Compare known companies only: reindexing in the new ones would turn the uint64 hashes into floats
+            differs = known.copy()
+            differs[known] = old.reindex(hashes.index[known]).to_numpy() != hashes.to_numpy()[known]
+            change = pd.Series("unchanged", index=chunk.index)
+            change[~known] = "added"
+            change[differs] = "changed"
+            for kind in counts:
+                counts[kind] += int((change == kind).sum())
+            rows = chunk[change != "unchanged"].assign(change=change[change != "unchanged"])
+            rows.to_csv(f, header=(i == 0), index=False)
+            print(f"  {sum(counts.values())} companies compared...")
+    os.replace(tmp_path, changed_path)
+
+    new = pd.concat(new_hashes) if new_hashes else pd.Series(dtype="uint64")
+    new = new[~new.index.duplicated(keep="last")]
+    removed = old.index.difference(new.index)
+    removed_path = os.path.join(diff_dir, f"removed_companies_{snapshot}.csv")
+    pd.Series(removed, name="CompanyNumber").to_csv(removed_path, index=False)
+    index_path = os.path.join(diff_dir, f"{snapshot}.hashes.csv")
+    save_hash_index(new, index_path, columns)
+
+    counts["removed"] = len(removed)
+    return {"snapshot": snapshot, "previous": previous, "counts": counts,
+            "changed_csv": changed_path, "removed_csv": removed_path, "hash_index": index_path}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Diff a Companies House snapshot against the previous one, so only added "
+                                                 "and changed companies are searched and matched again.")
+    parser.add_argument("snapshot", help="new BasicCompanyDataAsOneFile CSV")
+    parser.add_argument("--previous", help="previous snapshot CSV or its .hashes.csv index "
+                                           "(default: the newest older index in --diff-dir)")
+    parser.add_argument("--diff-dir", default=DIFF_DIR)
+    parser.add_argument("--all-columns", action="store_true", help="hash every field, not just HASH_COLUMNS")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    args = parser.parse_args()
+
+    previous = args.previous or latest_hash_index(args.diff_dir, snapshot_name(args.snapshot))
+    print(f"Diffing {args.snapshot} against {previous or 'nothing (first snapshot)'}...")
+    try:
+        result = diff_snapshots(args.snapshot, previous, args.diff_dir,
+                                None if args.all_columns else HASH_COLUMNS, args.chunk_rows)
+    except ValueError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    counts = result["counts"]
+    total = counts["added"] + counts["changed"] + counts["unchanged"]
+    churn = (counts["added"] + counts["changed"]) / total if total else 0
+    print(f"\nSnapshot {result['snapshot']}: {total} companies")
+    print(f"  added {counts['added']}, changed {counts['changed']}, removed {counts['removed']}, "
+          f"unchanged {counts['unchanged']} ({churn:.1%} to re-run)")
+    print(f"✅ Changed companies saved to **{result['changed_csv']}**")
+    print(f"   Removed companies saved to **{result['removed_csv']}**")
+    print(f"   Hash index saved to **{result['hash_index']}**")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,114 @@
+import os
 import re
+import codecs
+import csv
+import argparse
+import threading
 import requests
 import pandas as pd
 import tldextract
 from bs4 import BeautifulSoup
 from urllib.parse import urljoin
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 
 # Regex for UK-style company numbers (6–8 digits, sometimes prefixed)
 COMPANY_REGEX = re.compile(r"(?:Company\s*(?:No\.?|Number)?\s*[:\-]?\s*)(\d{6,8})", re.IGNORECASE)
 
-# --- Load website list ---
-websites = pd.read_csv("/Users/mm25873/Documents/Practice Project 1/TrustpilotData/trustpilot_companies.csv")["website"].dropna().unique().tolist()
+WEBSITES_CSV = "/Users/mm25873/Documents/Practice Project 1/TrustpilotData/trustpilot_companies.csv"
+OUTPUT_CSV = "/Users/mm25873/Documents/Practice Project 1/TrustpilotData/scraped_company_numbers.csv"
 
-results = []
+# --- Concurrent mode configuration ---
+MAX_WORKERS = 64        # sites crawled in parallel
+MAX_LINKS_PER_SITE = 5  # "about/contact/legal" pages tried per site after the homepage
+PROGRESS_CSV = OUTPUT_CSV.replace(".csv", "_progress.csv")  # every site attempted, so a run can resume
+# -------------------------------------
 
-def get_html(url):
+_thread_local = threading.local()
+
+
+def _get_session():
+    # requests.Session isn't thread safe, so each worker thread keeps its own (and its own connection pool)
+    if not hasattr(_thread_local, "session"):
+        _thread_local.session = requests.Session()
+    return _thread_local.session
+
+
+# --- Download limits ---
+HTML_CONTENT_TYPES = ("text/html", "application/xhtml+xml", "text/plain")
+MAX_HTML_BYTES = 2_000_000  # stop reading a page after this many bytes
+CHUNK_SIZE = 16 * 1024
+SCAN_OVERLAP = 128  # characters carried between chunks so a number split across two chunks is still found
+
+
+def _open_html_stream(url, session=None):
+    """Starts a streamed GET, returns the response only if it is a 200 HTML response (else None)."""
+    headers = {"User-Agent": "Mozilla/5.0"}
+    r = (session or requests).get(url, headers=headers, timeout=10, stream=True)
+    content_type = r.headers.get("Content-Type", "").split(";")[0].strip().lower()
+    if r.status_code != 200 or (content_type and content_type not in HTML_CONTENT_TYPES):
+        r.close()
+        return None
+    return r
+
+
+def _iter_text_chunks(r, max_bytes=MAX_HTML_BYTES):
+    """Decodes a streamed response chunk by chunk, stopping at max_bytes."""
     try:
-        headers = {"User-Agent": "Mozilla/5.0"}
-        r = requests.get(url, headers=headers, timeout=10)
-        if r.status_code == 200:
-            return r.text
+        decoder = codecs.getincrementaldecoder(r.encoding or "utf-8")(errors="replace")
+    except LookupError:  # bogus charset in the Content-Type header
+        decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    read = 0
+    for chunk in r.iter_content(chunk_size=CHUNK_SIZE):
+        read += len(chunk)
+        yield decoder.decode(chunk)
+        if read >= max_bytes:
+            return
+    yield decoder.decode(b"", final=True)
+
+
+def get_html(url, session=None, max_bytes=MAX_HTML_BYTES):
+    try:
+        r = _open_html_stream(url, session)
+        if r is None:
+            return None
+        with r:
+            return "".join(_iter_text_chunks(r, max_bytes))
     except Exception:
         return None
-    return None
+
+
+def scan_for_company_number(url, session=None, keep_html=False, max_bytes=MAX_HTML_BYTES):
+    """
+    Streams a page and runs COMPANY_REGEX on each chunk as it arrives, closing the
+    connection as soon as a number is found.
+
+    Returns:
+        (company_number or None, html read so far or None). The html is only kept if
+        keep_html is True (the homepage needs it for link discovery).
+    """
+    try:
+        r = _open_html_stream(url, session)
+        if r is None:
+            return None, None
+        with r:
+            parts = []
+            tail = ""
+            for text in _iter_text_chunks(r, max_bytes):
+                if keep_html:
+                    parts.append(text)
+                window = tail + text
+                for match in COMPANY_REGEX.finditer(window):
+                    # A match running up to the end of the window may be cut short by the chunk
+                    # boundary (e.g. '012345' of '01234567'), leave it for the next window.
+                    if match.end() < len(window):
+                        return match.group(1), ("".join(parts) if keep_html else None)
+                tail = window[-SCAN_OVERLAP:]
+            # End of body, whatever is left in the tail is complete
+            num = find_company_number(tail)
+            return num, ("".join(parts) if keep_html else None)
+    except Exception:
+        return None, None
 
 def find_company_number(text):
     match = COMPANY_REGEX.search(text)
@@ -40,28 +126,121 @@ def get_useful_links(base_url, html):
                 useful.append(full)
     return list(set(useful))
 
-for site in tqdm(websites[:1000]):  # limit for testing
-    homepage = f"http://{site}" if not site.startswith("http") else site
-    html = get_html(homepage)
-    if not html:
-        continue
 
-    # Try homepage
-    num = find_company_number(html)
+def scrape_site(site, max_links=None, session=None):
+    """
+    Looks for a company number on a site's homepage, then on its useful links.
+    Stops as soon as a number is found, and tries at most max_links linked pages.
+
+    Returns:
+        A dict with website, company_number and source_url (company_number/source_url are None if not found).
+    """
+    homepage = f"http://{site}" if not site.startswith("http") else site
+    # Try homepage (the html is kept in case we need its links)
+    num, html = scan_for_company_number(homepage, session, keep_html=True)
     if num:
-        results.append({"website": site, "company_number": num, "source_url": homepage})
-        continue
+        return {"website": site, "company_number": num, "source_url": homepage}
+
+    if not html:
+        return {"website": site, "company_number": None, "source_url": None}
 
     # Try linked pages
     links = get_useful_links(homepage, html)
+    if max_links is not None:
+        links = links[:max_links]
     for link in links:
-        sub_html = get_html(link)
-        if not sub_html:
-            continue
-        num = find_company_number(sub_html)
+        num, _ = scan_for_company_number(link, session)
         if num:
-            results.append({"website": site, "company_number": num, "source_url": link})
-            break
+            return {"website": site, "company_number": num, "source_url": link}
+
+    return {"website": site, "company_number": None, "source_url": None}
+
+
+def load_completed_sites(progress_csv):
+    """Returns the set of sites already attempted in a previous (possibly interrupted) run."""
+    if not os.path.exists(progress_csv):
+        return set()
+    done = pd.read_csv(progress_csv, usecols=["website"])["website"].astype(str)
+    return set(done)
+
+
+def run_serial(websites, output_csv):
+    """Original behaviour: one site at a time, every useful link, results written at the end."""
+    results = []
+    for site in tqdm(websites):
+        result = scrape_site(site)
+        if result["company_number"]:
+            results.append(result)
+
+    pd.DataFrame(results).to_csv(output_csv, index=False)
+    print(f"✅ Saved {len(results)} company numbers")
+
+
+def run_concurrent(websites, output_csv, progress_csv=PROGRESS_CSV, max_workers=MAX_WORKERS, max_links=MAX_LINKS_PER_SITE):
+    """
+    Crawls many sites in parallel. Each finished site is appended straight away to
+    progress_csv (found or not) and, if a number was found, to output_csv.
+    Re-running with the same files skips every site already in progress_csv.
+    """
+    done = load_completed_sites(progress_csv)
+    todo = [site for site in websites if site not in done]
+    print(f"{len(done)} sites already done, {len(todo)} to go.")
+
+    fields = ["website", "company_number", "source_url"]
+    write_header_out = not os.path.exists(output_csv)
+    write_header_progress = not os.path.exists(progress_csv)
+    found = 0
+
+    with open(output_csv, "a", newline="", encoding="utf-8") as out_f, \
+         open(progress_csv, "a", newline="", encoding="utf-8") as progress_f:
+        out_writer = csv.DictWriter(out_f, fieldnames=fields)
+        progress_writer = csv.DictWriter(progress_f, fieldnames=fields)
+        if write_header_out:
+            out_writer.writeheader()
+        if write_header_progress:
+            progress_writer.writeheader()
+
+        def work(site):
+            return scrape_site(site, max_links=max_links, session=_get_session())
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = {executor.submit(work, site): site for site in todo}
+            for future in tqdm(as_completed(futures), total=len(futures)):
+                site = futures[future]
+                try:
+                    result = future.result()
+                except Exception:
+                    result = {"website": site, "company_number": None, "source_url": None}
+
+                # Only this (main) thread writes, so no locking is needed
+                if result["company_number"]:
+                    out_writer.writerow(result)
+                    out_f.flush()
+                    found += 1
+                progress_writer.writerow(result)
+                progress_f.flush()
+
+    print(f"✅ Saved {found} new company numbers to {output_csv}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scrape company numbers from the Trustpilot website list.")
+    parser.add_argument("--concurrent", action="store_true", help="crawl sites in parallel with incremental, resumable output")
+    parser.add_argument("--limit", type=int, default=1000, help="number of sites to process (0 for all)")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument("--max-links", type=int, default=MAX_LINKS_PER_SITE)
+    args = parser.parse_args()
+
+    # --- Load website list ---
+    websites = pd.read_csv(WEBSITES_CSV)["website"].dropna().unique().tolist()
+    if args.limit:
+        websites = websites[:args.limit]  # limit for testing
+
+    if args.concurrent:
+        run_concurrent(websites, OUTPUT_CSV, max_workers=args.workers, max_links=args.max_links)
+    else:
+        run_serial(websites, OUTPUT_CSV)
+
 
-pd.DataFrame(results).to_csv("/Users/mm25873/Documents/Practice Project 1/TrustpilotData/scraped_company_numbers.csv", index=False)
-print(f"✅ Saved {len(results)} company numbers")
+if __name__ == "__main__":
+    main()